@@ -1,6 +1,55 @@
-from .embedding_generator import generate_embeddings_csv
-from .llm_client import give_answer
-from .kg_builder import build_kg_from_input
-from .kg_query import give_query_answer_kg
-from .rag_answer import give_query_answer_rag # never used
-from .judge_texts import judge
+# Public names are imported lazily (PEP 562): `import main` loads no models, torch or litellm.
+# Each submodule is imported the first time one of its names is accessed.
+import importlib
+import logging
+
+# Progress logs are opt-in: nothing is printed unless the caller configures logging
+# (e.g. with `enable_logging()`)
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+_EXPORTS = {
+    "generate_embeddings_csv": ".embedding_generator",
+    "generate_embeddings_store": ".embedding_generator",
+    "update_embeddings_store": ".embedding_generator",
+    "give_answer": ".llm_client",
+    "give_answers": ".llm_client",
+    "agive_answer": ".llm_client",
+    "agive_answers": ".llm_client",
+    "give_answer_stream": ".llm_client",
+    "build_kg_from_input": ".kg_builder",
+    "build_kg_map_reduce": ".kg_builder",
+    "compile_kg": ".kg_store",
+    "load_kg": ".kg_store",
+    "KGRegistry": ".kg_registry",
+    "KGGraph": ".kg_graph",
+    "RerankService": ".rerank_service",
+    "pack_context": ".context_packer",
+    "PipelineResult": ".tracing",
+    "enable_logging": ".tracing",
+    "give_query_answer_kg": ".kg_query",
+    "give_query_answer_rag": ".rag_answer",  # never used
+    "judge": ".judge_texts",
+    "run_evaluation": ".evaluation",
+    "VectorStore": ".vector_store",
+    "load_store": ".vector_store",
+    "convert_csv_to_store": ".vector_store",
+    "build_index": ".ann_index",
+    "open_index": ".ann_index",
+    "build_bm25_index": ".bm25_index",
+    "AnswerCache": ".answer_cache",
+    "RetrievalServer": ".retrieval_server",
+    "warmup": ".models",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
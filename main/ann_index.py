@@ -0,0 +1,623 @@
+"""
+ann_index.py
+
+Pluggable nearest-neighbour indexes over a `VectorStore`, in pure NumPy.
+
+- `ExactIndex`: brute-force dot product + `argpartition`. The default, and always
+  used for small corpora.
+- `SubsetIndex`: brute-force search over a subset of chunks, e.g. the chunks of the
+  events a query was routed to (see `open_subset_index`).
+- `IVFIndex`: inverted-file index. Chunks are grouped under spherical k-means
+  centroids and a query only scans the `nprobe` closest lists.
+- `QuantizedIndex`: scans compact codes of the chunk matrix instead of the float
+  vectors, int8 (4x smaller) or one sign bit per dimension (32x smaller), then
+  rescores a shortlist with the full-precision vectors.
+
+An IVF index is persisted next to the embeddings (`ivf.npz` in the store directory)
+and picked up by `open_index` once the corpus is large enough to benefit from it.
+Persisted indexes record the store fingerprint they were built for and are ignored
+as stale once the store changes.
+Quantized codes are persisted as `int8.npz` / `binary.npz`: only the codes are held in
+RAM, while the float matrix stays memory-mapped and only the shortlisted rows are read.
+Binary codes, once built, are used by `open_index` for any corpus size. int8 codes save
+memory but not time (NumPy has no fast int8 matrix product, so the codes are widened to
+float32 block by block), and are only used when asked for with `mode="int8"`.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from . import tracing
+
+IVF_FILE = "ivf.npz"
+QUANTIZED_FILES = {"int8": "int8.npz", "binary": "binary.npz"}
+
+# Shortlist size, as a multiple of k, rescored at full precision per quantization mode
+DEFAULT_RESCORE = {"int8": 4, "binary": 50}
+
+# Quantized codes `open_index` uses in "auto" mode: int8 scans are no faster than exact search
+AUTO_QUANTIZED = ("binary",)
+
+# Below this many chunks a full scan is as fast as probing lists, so exact search is used
+ANN_MIN_CHUNKS = 50_000
+
+# Rows assigned to centroids per matrix product, to bound memory on large stores
+_ASSIGN_BATCH = 65_536
+
+# Rows of codes scored per step; small blocks keep the widened int8 rows in cache
+_SCORE_BATCH = 2_048
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Selects the indices of the k highest scores per row, best first.
+
+    Args:
+        scores (np.ndarray): (n_queries, n_items) score matrix.
+        k (int): Number of items to keep per row.
+
+    Returns:
+        np.ndarray: (n_queries, min(k, n_items)) indices sorted by descending score.
+    """
+    n_items = scores.shape[1]
+    k = min(k, n_items)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+
+    # argpartition is O(n) per row; only the k survivors are sorted
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class ExactIndex:
+    """
+    Brute-force search over every chunk in the store.
+
+    Args:
+        store (VectorStore): The store to search.
+    """
+
+    kind = "exact"
+
+    def __init__(self, store):
+        self.store = store
+
+    def search(self, query_embeddings: np.ndarray, k: int) -> tuple:
+        """
+        Finds the k most similar chunks for each query.
+
+        Args:
+            query_embeddings (np.ndarray): (n_queries, dim) normalized query matrix.
+            k (int): Number of neighbours per query.
+
+        Returns:
+            tuple[list[np.ndarray], list[np.ndarray]]: Per-query chunk indices and scores, best first.
+        """
+        scores = self.store.similarities(np.atleast_2d(query_embeddings)).T
+        tracing.add("chunks_scored", scores.size)
+        indices = top_k_indices(scores, k)
+        top_scores = np.take_along_axis(scores, indices, axis=1)
+        return list(indices), list(top_scores)
+
+
+class SubsetIndex:
+    """
+    Brute-force search restricted to a subset of the store's chunks (e.g. one event's sources).
+
+    The subset's rows are gathered once, so a search costs O(len(chunk_ids)) rather than
+    O(len(store)). Returned indices are chunk indices of the full store.
+
+    Args:
+        store (VectorStore): The store to search.
+        chunk_ids (np.ndarray): Chunk indices to search over.
+    """
+
+    kind = "subset"
+
+    def __init__(self, store, chunk_ids: np.ndarray):
+        self.store = store
+        self.chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        embeddings = np.asarray(store.embeddings[self.chunk_ids], dtype=np.float32)
+        if not store.normalized:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        self.embeddings = embeddings
+
+    def search(self, query_embeddings: np.ndarray, k: int) -> tuple:
+        """Same as `ExactIndex.search`, over the subset only."""
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        query_embeddings = query_embeddings / np.maximum(
+            np.linalg.norm(query_embeddings, axis=1, keepdims=True), 1e-12)
+        scores = query_embeddings @ self.embeddings.T
+        tracing.add("chunks_scored", scores.size)
+        local = top_k_indices(scores, k)
+        top_scores = np.take_along_axis(scores, local, axis=1)
+        return [self.chunk_ids[row] for row in local], list(top_scores)
+
+
+class IVFIndex:
+    """
+    Inverted-file index with spherical k-means coarse centroids.
+
+    Attributes:
+        centroids (np.ndarray): (nlist, dim) unit-norm centroids.
+        list_offsets (np.ndarray): (nlist + 1,) offsets of each list into `list_ids`.
+        list_ids (np.ndarray): Chunk indices grouped by list, ascending within a list.
+        nprobe (int): Number of lists scanned per query. Higher is slower but more accurate.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, store, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_ids: np.ndarray, nprobe: int = 8):
+        self.store = store
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(cls, store, nlist: int = None, n_iter: int = 20, sample_size: int = None,
+              nprobe: int = 8, seed: int = 0) -> "IVFIndex":
+        """
+        Trains coarse centroids on a sample of the store and assigns every chunk to a list.
+
+        Args:
+            store (VectorStore): A store with normalized embeddings.
+            nlist (int): Number of lists. Default is about 4 * sqrt(count).
+            n_iter (int): k-means iterations. Default is 20.
+            sample_size (int): Training sample size. Default is 256 * nlist.
+            nprobe (int): Default number of lists scanned per query.
+            seed (int): Random seed for sampling and initialization.
+
+        Returns:
+            IVFIndex: The built index.
+
+        Raises:
+            ValueError: If the store is empty or its embeddings are not normalized.
+        """
+        if not store.normalized:
+            raise ValueError("IVF indexes require a store with normalized embeddings.")
+        count = len(store)
+        if count == 0:
+            raise ValueError("Cannot build an index over an empty store.")
+
+        nlist = min(nlist or max(1, int(4 * np.sqrt(count))), count)
+        sample_size = min(sample_size or 256 * nlist, count)
+        rng = np.random.default_rng(seed)
+
+        sample_ids = np.sort(rng.choice(count, sample_size, replace=False))
+        sample = np.asarray(store.embeddings[sample_ids], dtype=np.float32)
+        centroids = _spherical_kmeans(sample, nlist, n_iter, rng)
+
+        assignments = np.empty(count, dtype=np.int64)
+        for start in range(0, count, _ASSIGN_BATCH):
+            block = np.asarray(store.embeddings[start:start + _ASSIGN_BATCH], dtype=np.float32)
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        list_ids = np.argsort(assignments, kind='stable')
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+        return cls(store, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def search(self, query_embeddings: np.ndarray, k: int, nprobe: int = None) -> tuple:
+        """
+        Finds approximately the k most similar chunks for each query.
+
+        Args:
+            query_embeddings (np.ndarray): (n_queries, dim) normalized query matrix.
+            k (int): Number of neighbours per query.
+            nprobe (int): Lists scanned per query. Defaults to `self.nprobe`.
+
+        Returns:
+            tuple[list[np.ndarray], list[np.ndarray]]: Per-query chunk indices and scores, best first.
+        """
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = top_k_indices(query_embeddings @ self.centroids.T, nprobe)
+
+        all_indices, all_scores = [], []
+        for query, lists in zip(query_embeddings, probes):
+            ids = np.concatenate([
+                self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists
+            ])
+            ids.sort()  # ascending row order keeps memory-mapped reads sequential
+            scores = (self.store.embeddings[ids] @ query).astype(np.float32, copy=False)
+            tracing.add("chunks_scored", len(ids))
+            top = top_k_indices(scores[None, :], k)[0]
+            all_indices.append(ids[top])
+            all_scores.append(scores[top])
+
+        return all_indices, all_scores
+
+    def save(self, store_dir: str = None) -> str:
+        """
+        Persists the index next to the embeddings.
+
+        Args:
+            store_dir (str): Store directory. Defaults to the store's own path.
+
+        Returns:
+            str: Path of the written index file.
+        """
+        store_dir = store_dir or self.store.path
+        if store_dir is None:
+            raise ValueError("In-memory stores need an explicit store_dir to save an index.")
+
+        path = os.path.join(store_dir, IVF_FILE)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_ids=self.list_ids, nprobe=self.nprobe, count=len(self.store),
+                 fingerprint=self.store.fingerprint)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, store, nprobe: int = None) -> "IVFIndex":
+        """
+        Loads the IVF index persisted in the store directory.
+
+        Raises:
+            FileNotFoundError: If the store has no IVF index.
+            ValueError: If the index was built for a different store or number of chunks.
+        """
+        path = os.path.join(store.path or "", IVF_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"IVF index not found: {path}")
+
+        with np.load(path) as data:
+            _check_built_for(store, data, f"IVF index at {path}")
+            return cls(store, data["centroids"], data["list_offsets"], data["list_ids"],
+                       nprobe=nprobe or int(data["nprobe"]))
+
+
+def _check_built_for(store, data, what: str) -> None:
+    # Index files written before fingerprints existed match only stores without an id
+    fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+    if int(data["count"]) != len(store) or fingerprint != store.fingerprint:
+        raise ValueError(f"{what} is stale: built for {int(data['count'])} chunks of a different "
+                         f"store version, store has {len(store)}.")
+
+
+# Set bits per byte value, for NumPy versions without np.bitwise_count
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1, dtype=np.int32)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    # Set bits per row of a 2-D unsigned integer array
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+    return _BYTE_POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+class QuantizedIndex:
+    """
+    Brute-force search over quantized codes, with full-precision rescoring of a shortlist.
+
+    - "int8": every dimension is scaled by a per-dimension factor (calibrated on a sample
+      of the store) into [-127, 127]. Queries are scored as `codes @ (scales * queries).T`,
+      all queries of a search in one pass over the codes. The codes are widened to float32
+      a block at a time for the product, so this saves 4x memory at about the cost of an
+      exact scan.
+    - "binary": the sign bit of every dimension, packed 8 per byte. A query's score is
+      `dim - 2 * hamming(query bits, code bits)`.
+
+    The `rescore * k` best candidates by code score are then rescored against the store's
+    float vectors; with a memory-mapped store only those rows are read from disk.
+
+    Attributes:
+        kind (str): "int8" or "binary".
+        codes (np.ndarray): (count, dim) int8 or (count, dim / 8) uint8 codes.
+        scales (np.ndarray | None): (dim,) int8 dequantization factors.
+        rescore (int): Shortlist size as a multiple of k. 0 returns code scores unrescored.
+    """
+
+    def __init__(self, store, kind: str, codes: np.ndarray, scales: np.ndarray = None, rescore: int = None):
+        if kind not in QUANTIZED_FILES:
+            raise ValueError(f"Unknown quantization '{kind}'. Expected 'int8' or 'binary'.")
+        self.store = store
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+        self.rescore = DEFAULT_RESCORE[kind] if rescore is None else rescore
+        # Hamming distances are summed over 64-bit words when the dimension allows it
+        self._words = codes.view(np.uint64) if kind == "binary" and codes.shape[1] % 8 == 0 else codes
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+    @classmethod
+    def build(cls, store, kind: str = "int8", sample_size: int = 100_000, rescore: int = None,
+              seed: int = 0) -> "QuantizedIndex":
+        """
+        Quantizes every chunk vector of a store.
+
+        Args:
+            store (VectorStore): A store with normalized embeddings.
+            kind (str): "int8" or "binary".
+            sample_size (int): Rows used to calibrate the int8 scales.
+            rescore (int): Shortlist multiple. Defaults to `DEFAULT_RESCORE[kind]`.
+            seed (int): Random seed for the calibration sample.
+
+        Returns:
+            QuantizedIndex: The built index.
+
+        Raises:
+            ValueError: If the store is empty, its embeddings are not normalized, or
+                `kind` is unknown.
+        """
+        if kind not in QUANTIZED_FILES:
+            raise ValueError(f"Unknown quantization '{kind}'. Expected 'int8' or 'binary'.")
+        if not store.normalized:
+            raise ValueError("Quantized indexes require a store with normalized embeddings.")
+        count, dim = len(store), store.dim
+        if count == 0:
+            raise ValueError("Cannot build an index over an empty store.")
+
+        scales = None
+        if kind == "int8":
+            rng = np.random.default_rng(seed)
+            sample_ids = np.sort(rng.choice(count, min(sample_size, count), replace=False))
+            sample = np.abs(np.asarray(store.embeddings[sample_ids], dtype=np.float32))
+            scales = (np.maximum(sample.max(axis=0), 1e-6) / 127).astype(np.float32)
+            codes = np.empty((count, dim), dtype=np.int8)
+        else:
+            codes = np.empty((count, (dim + 7) // 8), dtype=np.uint8)
+
+        for start in range(0, count, _ASSIGN_BATCH):
+            block = np.asarray(store.embeddings[start:start + _ASSIGN_BATCH], dtype=np.float32)
+            if kind == "int8":
+                # Values beyond the calibration sample's range are clipped
+                codes[start:start + len(block)] = np.clip(np.rint(block / scales), -127, 127)
+            else:
+                codes[start:start + len(block)] = np.packbits(block > 0, axis=1)
+        return cls(store, kind, codes, scales=scales, rescore=rescore)
+
+    def code_scores(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Approximate (n_queries, count) scores of a query matrix, from the codes alone."""
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        scores = np.empty((len(query_embeddings), len(self.codes)), dtype=np.float32)
+
+        if self.kind == "int8":
+            weights = (query_embeddings * self.scales).T.astype(np.float32)
+            for start in range(0, len(self.codes), _SCORE_BATCH):
+                block = self.codes[start:start + _SCORE_BATCH]
+                scores[:, start:start + len(block)] = (block.astype(np.float32) @ weights).T
+            return scores
+
+        for row, query in enumerate(query_embeddings):
+            bits = np.packbits(query > 0)
+            bits = bits.view(np.uint64) if self._words.dtype == np.uint64 else bits
+            for start in range(0, len(self.codes), _SCORE_BATCH):
+                hamming = _popcount(self._words[start:start + _SCORE_BATCH] ^ bits)
+                scores[row, start:start + len(hamming)] = self.store.dim - 2 * hamming
+        return scores
+
+    def search(self, query_embeddings: np.ndarray, k: int, rescore: int = None) -> tuple:
+        """
+        Finds approximately the k most similar chunks for each query.
+
+        Args:
+            query_embeddings (np.ndarray): (n_queries, dim) normalized query matrix.
+            k (int): Number of neighbours per query.
+            rescore (int): Shortlist multiple. Defaults to `self.rescore`.
+
+        Returns:
+            tuple[list[np.ndarray], list[np.ndarray]]: Per-query chunk indices and scores, best
+                first. Scores are full-precision cosine similarities unless rescoring is off.
+        """
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        rescore = self.rescore if rescore is None else rescore
+
+        approx_scores = self.code_scores(query_embeddings)
+        tracing.add("chunks_scored", approx_scores.size)
+
+        all_indices, all_scores = [], []
+        for query, approx in zip(query_embeddings, approx_scores):
+            if not rescore:
+                top = top_k_indices(approx[None, :], k)[0]
+                all_indices.append(top)
+                all_scores.append(approx[top])
+                continue
+
+            shortlist = top_k_indices(approx[None, :], k * rescore)[0]
+            shortlist.sort()  # ascending row order keeps memory-mapped reads sequential
+            scores = (np.asarray(self.store.embeddings[shortlist], dtype=np.float32) @ query).astype(np.float32)
+            top = top_k_indices(scores[None, :], k)[0]
+            all_indices.append(shortlist[top])
+            all_scores.append(scores[top])
+        return all_indices, all_scores
+
+    def save(self, store_dir: str = None) -> str:
+        """
+        Persists the codes next to the embeddings.
+
+        Args:
+            store_dir (str): Store directory. Defaults to the store's own path.
+
+        Returns:
+            str: Path of the written file.
+        """
+        store_dir = store_dir or self.store.path
+        if store_dir is None:
+            raise ValueError("In-memory stores need an explicit store_dir to save an index.")
+
+        path = os.path.join(store_dir, QUANTIZED_FILES[self.kind])
+        tmp_path = path + ".tmp.npz"
+        arrays = {"codes": self.codes, "rescore": self.rescore, "count": len(self.store),
+                  "fingerprint": self.store.fingerprint}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, store, kind: str, rescore: int = None) -> "QuantizedIndex":
+        """
+        Loads the quantized codes persisted in the store directory.
+
+        Raises:
+            FileNotFoundError: If the store has no codes of this kind.
+            ValueError: If the codes were built for a different store or number of chunks.
+        """
+        path = os.path.join(store.path or "", QUANTIZED_FILES[kind])
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Quantized index not found: {path}")
+
+        with np.load(path) as data:
+            _check_built_for(store, data, f"Quantized index at {path}")
+            scales = data["scales"] if "scales" in data.files else None
+            return cls(store, kind, data["codes"], scales=scales,
+                       rescore=int(data["rescore"]) if rescore is None else rescore)
+
+
+def _spherical_kmeans(X: np.ndarray, nlist: int, n_iter: int, rng) -> np.ndarray:
+    centroids = X[rng.choice(len(X), nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(X @ centroids.T, axis=1)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # Sum members per list with one sort + reduceat instead of a slow np.add.at scatter
+        order = np.argsort(assignments, kind='stable')
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(X[order], starts, axis=0)
+
+        # Re-seed empty lists with random points so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = X[rng.choice(len(X), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+
+def build_index(store, kind: str = "ivf", **params):
+    """
+    Builds an index over a store and persists it in the store directory.
+
+    Args:
+        store: A `VectorStore` or store directory.
+        kind (str): "ivf", "int8", "binary" or "exact". Exact indexes have nothing to persist.
+        **params: Passed to `IVFIndex.build` (nlist, n_iter, sample_size, nprobe, seed) or
+            `QuantizedIndex.build` (sample_size, rescore, seed).
+
+    Returns:
+        The built index.
+    """
+    from .vector_store import as_vector_store
+
+    store = as_vector_store(store)
+    if kind == "exact":
+        return ExactIndex(store)
+    if kind in QUANTIZED_FILES:
+        index = QuantizedIndex.build(store, kind=kind, **params)
+    elif kind == "ivf":
+        index = IVFIndex.build(store, **params)
+    else:
+        raise ValueError(f"Unknown index kind '{kind}'. Expected 'exact', 'ivf', 'int8' or 'binary'.")
+
+    if store.path is not None:
+        index.save()
+    return index
+
+
+def _cached_ivf(store, nprobe: int = None) -> IVFIndex:
+    # Indexes are cached on the store object and reloaded only when the file changes
+    mtime = os.path.getmtime(os.path.join(store.path or "", IVF_FILE))
+    cached = store.index_cache.get(IVFIndex.kind)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, IVFIndex.load(store))
+        store.index_cache[IVFIndex.kind] = cached
+
+    index = cached[1]
+    if nprobe is None or nprobe == index.nprobe:
+        return index
+    return IVFIndex(store, index.centroids, index.list_offsets, index.list_ids, nprobe=nprobe)
+
+
+def _cached_quantized(store, kind: str, rescore: int = None) -> QuantizedIndex:
+    mtime = os.path.getmtime(os.path.join(store.path or "", QUANTIZED_FILES[kind]))
+    cached = store.index_cache.get(kind)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, QuantizedIndex.load(store, kind))
+        store.index_cache[kind] = cached
+
+    index = cached[1]
+    if rescore is None or rescore == index.rescore:
+        return index
+    return QuantizedIndex(store, kind, index.codes, scales=index.scales, rescore=rescore)
+
+
+def open_index(store, mode: str = "auto", nprobe: int = None, rescore: int = None):
+    """
+    Returns the index to search a store with.
+
+    Args:
+        store (VectorStore): The store to search.
+        mode (str): "exact", "ivf", "int8", "binary" or "auto". In "auto" mode persisted
+            binary codes are used if present (int8 codes only with `mode="int8"`, as they
+            are no faster than exact search); otherwise the persisted
+            IVF index is used when the store has at least `ANN_MIN_CHUNKS` chunks; otherwise,
+            or if no index has been built, search is exact.
+        nprobe (int): Overrides the persisted IVF nprobe.
+        rescore (int): Overrides the persisted quantized shortlist multiple.
+
+    Returns:
+        ExactIndex | IVFIndex | QuantizedIndex: The index.
+    """
+    if mode == "exact":
+        return ExactIndex(store)
+
+    has_ivf = store.path is not None and os.path.exists(os.path.join(store.path, IVF_FILE))
+    if mode == "ivf":
+        return _cached_ivf(store, nprobe)
+    if mode in QUANTIZED_FILES:
+        return _cached_quantized(store, mode, rescore)
+    if mode != "auto":
+        raise ValueError(f"Unknown index mode '{mode}'. Expected 'auto', 'exact', 'ivf', 'int8' or 'binary'.")
+
+    for kind in AUTO_QUANTIZED:
+        if store.path is not None and os.path.exists(os.path.join(store.path, QUANTIZED_FILES[kind])):
+            try:
+                return _cached_quantized(store, kind, rescore)
+            except ValueError:
+                # Stale codes are ignored until rebuilt, like a stale IVF index
+                pass
+
+    if has_ivf and len(store) >= ANN_MIN_CHUNKS:
+        try:
+            return _cached_ivf(store, nprobe)
+        except ValueError:
+            # A stale index (store rewritten since it was built) is ignored until rebuilt
+            pass
+    return ExactIndex(store)
+
+
+def open_subset_index(store, chunk_ids) -> SubsetIndex:
+    """
+    Returns an index restricted to the given chunks, cached on the store.
+
+    Args:
+        store (VectorStore): The store to search.
+        chunk_ids: Chunk indices to search over.
+
+    Returns:
+        SubsetIndex: The index.
+    """
+    chunk_ids = np.unique(np.asarray(chunk_ids, dtype=np.int64))
+    key = (SubsetIndex.kind, hashlib.sha1(chunk_ids.tobytes()).hexdigest())
+    if key not in store.index_cache:
+        store.index_cache[key] = SubsetIndex(store, chunk_ids)
+    return store.index_cache[key]
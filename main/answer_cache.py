@@ -0,0 +1,346 @@
+"""
+answer_cache.py
+
+Semantic cache of final answers from the hybrid pipeline, for repeated and reworded questions.
+
+A full `hybrid_kg_rag_pipeline` run makes three LLM calls, about 15 retrievals and 75
+reranks. Operators often ask the same question again, or a small rewording of it. The
+cache answers those from memory.
+
+Entries are grouped by scope, the tuple of KGs a query was routed to. Within a scope,
+a query hits when the cosine similarity between its embedding and that of a cached
+query reaches `threshold`. Because routing comes first, a rewording that names a
+different event can never be answered with another event's answer.
+
+Every entry records a version, a digest of everything the answer depends on:
+- the selected KG (`CompiledKG.digest`)
+- the chunk store (`corpus_version`)
+- the pipeline settings and the LLM model
+When a lookup or insert brings a new version for a scope, the scope's older entries are
+dropped. Changing a KG or the corpus therefore invalidates exactly the answers built on it.
+
+The cache is an in-memory LRU bounded by entry count, with an optional time-to-live.
+`stats` reports the hit rate and the latency saved. Enable it for the process with
+`ANSWER_CACHE_SIZE` (entries; unset or 0 disables it) and `ANSWER_CACHE_THRESHOLD`,
+or pass an `AnswerCache` to the pipeline through `hybrid.answer_cache`.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from . import tracing
+from .rerank_service import normalize_query
+
+# Entries kept by the process-wide cache; 0 disables it
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "0"))
+
+# Minimum cosine similarity between two queries for one to reuse the other's answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Seconds before a cached answer expires; unset keeps answers until evicted or invalidated
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "0")) or None
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def corpus_version(store) -> str:
+    """
+    Identifies the content of a chunk store.
+
+    A store on disk is identified by its manifest, which is rewritten on every commit,
+    and by the manifest's modification time. A store with no directory (e.g. converted from
+    a DataFrame) is identified by the object itself, so it never shares entries with another.
+
+    Args:
+        store (VectorStore): The store.
+
+    Returns:
+        str: Hex digest.
+    """
+    if store.path is not None:
+        manifest_path = os.path.join(store.path, "manifest.json")
+        mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+        identity = [os.path.abspath(store.path), mtime]
+    else:
+        identity = [id(store)]
+    payload = json.dumps([store.manifest, identity], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def answer_version(kg_digest: str, store, **settings) -> str:
+    """
+    Digest of everything a cached answer depends on.
+
+    Args:
+        kg_digest (str): Digest of the KG (or combined KGs) the answer used.
+        store (VectorStore): The chunk store the context was retrieved from.
+        **settings: Pipeline settings that change the answer (LLM model, context budget, ...).
+
+    Returns:
+        str: Hex digest.
+    """
+    payload = json.dumps([kg_digest, corpus_version(store), settings], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CachedAnswer:
+    """
+    One cached pipeline result.
+
+    Attributes:
+        query (str): The query the answer was generated for.
+        embedding (np.ndarray): Its normalized embedding.
+        scope (tuple[str]): KGs the query was routed to.
+        version (str): `answer_version` at generation time.
+        answer (str): The final answer.
+        triples (dict): KG triples the answer used.
+        sub_queries (list[str]): Generated sub-queries.
+        context (list[str]): Retrieved chunks given to the final prompt.
+        cost_ms (float): Wall time of the pipeline run that produced the answer.
+        created (float): Unix time the entry was stored.
+        hits (int): Lookups it answered.
+    """
+
+    def __init__(self, query: str, embedding: np.ndarray, scope: tuple, version: str, answer: str,
+                 triples: dict, sub_queries: list, context: list, cost_ms: float):
+        self.query = query
+        self.embedding = embedding
+        self.scope = scope
+        self.version = version
+        self.answer = answer
+        self.triples = triples
+        self.sub_queries = sub_queries
+        self.context = context
+        self.cost_ms = cost_ms
+        self.created = time.time()
+        self.hits = 0
+
+    def provenance(self, similarity: float) -> dict:
+        """Where a cached answer came from, as recorded on the result that reuses it."""
+        return {
+            "cached_query": self.query,
+            "similarity": round(float(similarity), 4),
+            "kgs": list(self.scope),
+            "version": self.version,
+            "created": self.created,
+            "age_s": round(time.time() - self.created, 3),
+            "hits": self.hits,
+        }
+
+
+class AnswerCache:
+    """
+    In-memory LRU of pipeline answers, looked up by query-embedding similarity.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit. Default is 0.95.
+        max_entries (int): Maximum answers kept before LRU eviction. Default is 1024.
+        ttl (float | None): Seconds after which an answer expires. None keeps answers until
+            they are evicted or invalidated.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that found no answer similar enough.
+        evictions (int): Answers dropped by LRU or TTL.
+        invalidations (int): Answers dropped because their KG, corpus or settings changed.
+        saved_ms (float): Pipeline time avoided by hits, minus their lookup time.
+        overhead_ms (float): Time spent on lookups that missed.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = 1024, ttl: float = None):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}.")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_ms = 0.0
+        self.overhead_ms = 0.0
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._versions = {}
+        self._matrices = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._scopes[entry.scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._scopes[entry.scope]
+        self._matrices.pop(entry.scope, None)
+
+    def _check_version(self, scope: tuple, version: str) -> None:
+        # A new version for a scope makes its older answers unreachable; drop them now
+        if self._versions.get(scope, version) != version:
+            for entry_id in list(self._scopes.get(scope, ())):
+                self._drop(entry_id)
+                self.invalidations += 1
+        self._versions[scope] = version
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        cutoff = time.time() - self.ttl
+        for entry_id in [i for i, e in self._entries.items() if e.created < cutoff]:
+            self._drop(entry_id)
+            self.evictions += 1
+
+    def lookup(self, query: str, embedding: np.ndarray, scope: tuple, version: str,
+               overhead_ms: float = 0.0):
+        """
+        Finds the cached answer of the most similar query in the same scope and version.
+
+        Args:
+            query (str): The new query.
+            embedding (np.ndarray): Its normalized (dim,) embedding.
+            scope (tuple[str]): KGs the query was routed to.
+            version (str): Current `answer_version` for that scope.
+            overhead_ms (float): Time already spent preparing the lookup (e.g. encoding the
+                query), counted against the latency saved.
+
+        Returns:
+            tuple[CachedAnswer, float] | None: The entry and its similarity, or None on a miss.
+        """
+        start = time.perf_counter()
+        scope = tuple(scope)
+        with self._lock:
+            self._check_version(scope, version)
+            self._expire()
+            ids = self._scopes.get(scope)
+            best, similarity = None, 0.0
+            if ids:
+                matrix = self._matrices.get(scope)
+                if matrix is None:
+                    matrix = self._matrices[scope] = np.stack([self._entries[i].embedding for i in ids])
+                scores = matrix @ np.asarray(embedding, dtype=np.float32)
+                top = int(np.argmax(scores))
+                if scores[top] >= self.threshold:
+                    best, similarity = self._entries[ids[top]], float(scores[top])
+
+            elapsed_ms = overhead_ms + (time.perf_counter() - start) * 1000
+            if best is None:
+                self.misses += 1
+                self.overhead_ms += elapsed_ms
+                tracing.add("answer_cache_misses")
+                return None
+
+            self._entries.move_to_end(ids[top])
+            best.hits += 1
+            self.hits += 1
+            self.saved_ms += max(best.cost_ms - elapsed_ms, 0.0)
+            tracing.add("answer_cache_hits")
+            return best, similarity
+
+    def put(self, query: str, embedding: np.ndarray, scope: tuple, version: str, answer: str,
+            triples: dict = None, sub_queries: list = None, context: list = None,
+            cost_ms: float = 0.0) -> CachedAnswer:
+        """
+        Stores an answer, then evicts least-recently-used answers beyond `max_entries`.
+
+        An identical query (after normalization) already cached in the scope is replaced.
+
+        Args:
+            query (str): The query.
+            embedding (np.ndarray): Its normalized (dim,) embedding.
+            scope (tuple[str]): KGs the query was routed to.
+            version (str): `answer_version` the answer was built against.
+            answer (str): The final answer.
+            triples (dict): KG triples the answer used.
+            sub_queries (list[str]): Generated sub-queries.
+            context (list[str]): Retrieved chunks given to the final prompt.
+            cost_ms (float): Wall time of the pipeline run.
+
+        Returns:
+            CachedAnswer: The stored entry.
+        """
+        scope = tuple(scope)
+        entry = CachedAnswer(query, np.asarray(embedding, dtype=np.float32).copy(), scope, version, answer,
+                             dict(triples or {}), list(sub_queries or []), list(context or []), cost_ms)
+        normalized = normalize_query(query)
+        with self._lock:
+            self._check_version(scope, version)
+            for entry_id in list(self._scopes.get(scope, ())):
+                if normalize_query(self._entries[entry_id].query) == normalized:
+                    self._drop(entry_id)
+
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._entries[entry_id] = entry
+            self._scopes.setdefault(scope, []).append(entry_id)
+            self._matrices.pop(scope, None)
+
+            self._expire()
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, kg: str = None) -> int:
+        """
+        Drops cached answers explicitly.
+
+        Args:
+            kg (str): Only drop answers whose scope includes this KG. None drops all of them.
+
+        Returns:
+            int: Answers dropped.
+        """
+        with self._lock:
+            doomed = [i for i, e in self._entries.items() if kg is None or kg in e.scope]
+            for entry_id in doomed:
+                self._drop(entry_id)
+            self.invalidations += len(doomed)
+            return len(doomed)
+
+    def clear(self) -> None:
+        """Removes every answer and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            self._versions.clear()
+            self._matrices.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+            self.saved_ms = self.overhead_ms = 0.0
+
+    def stats(self) -> dict:
+        """Returns the hit rate, the latency saved and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_ms": round(self.saved_ms, 3),
+                "saved_ms_per_hit": round(self.saved_ms / self.hits, 3) if self.hits else 0.0,
+                "overhead_ms_per_miss": round(self.overhead_ms / self.misses, 3) if self.misses else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+            }
+
+
+def get_answer_cache():
+    """Returns the process-wide `AnswerCache`, or None if `ANSWER_CACHE_SIZE` is unset or 0."""
+    global _default_cache
+    if not ANSWER_CACHE_SIZE:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AnswerCache(threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_SIZE,
+                                         ttl=ANSWER_CACHE_TTL)
+        return _default_cache
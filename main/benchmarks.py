@@ -0,0 +1,981 @@
+"""
+benchmarks.py
+
+Offline benchmarks for the retrieval hot paths. Every benchmark returns a list of
+result dicts so runs can be saved as JSON and compared.
+
+`pipelines` runs the real pipeline code end to end against the deterministic stand-in
+models and LLM stub of `offline.py`, on synthetic corpora and KGs, and reports p50/p99
+latency, throughput and peak traced memory per operation.
+
+Usage:
+    python -m main.benchmarks pipelines --chunks 1000 10000 100000 --out bench.json
+    python -m main.benchmarks streaming --chunks 100000 --tokens-per-second 200
+    python -m main.benchmarks answers --chunks 20000 --queries 20 --threshold 0.9 0.95
+    python -m main.benchmarks ann --chunks 200000 --nprobe 1 4 8 16 32
+    python -m main.benchmarks quant --chunks 1000000 --rescore 1 4 10
+    python -m main.benchmarks hybrid --chunks 20000 -k 5 10 20 50
+    python -m main.benchmarks backends --backend torch int8 onnx --threads 4
+    python -m main.benchmarks graph --events 2 16 128 512
+    python -m main.benchmarks startup
+    python -m main.benchmarks triples --kg data/kg/KG_NEP.txt --query "..." [--llm]
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def synthetic_embeddings(n: int, dim: int = 1024, n_clusters: int = 256,
+                         spread: float = 1.0, seed: int = 0) -> np.ndarray:
+    """
+    Generates clustered, L2-normalized float32 vectors that mimic topical chunk embeddings.
+
+    Args:
+        n (int): Number of vectors.
+        dim (int): Vector dimension. Default is 1024 (mxbai-embed-large-v1).
+        n_clusters (int): Number of topics the vectors are drawn around.
+        spread (float): Norm of the within-topic noise relative to the unit topic direction.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: (n, dim) normalized matrix.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    X = centers[rng.integers(0, n_clusters, n)]
+    X = X + (spread / np.sqrt(dim)) * rng.standard_normal((n, dim)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    return X.astype(np.float32, copy=False)
+
+
+def _recall_at_k(approx: list, exact: list) -> float:
+    hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approx, exact))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+
+def benchmark_ann(store=None, n_chunks: int = 100_000, dim: int = 1024, n_queries: int = 200,
+                  k: int = 10, nlist: int = None, nprobes: tuple = (1, 2, 4, 8, 16, 32),
+                  seed: int = 0) -> list:
+    """
+    Measures recall@k and per-query latency of IVF search against exact search.
+
+    Args:
+        store: A `VectorStore` or store directory to benchmark. If omitted, a synthetic
+            in-memory store with `n_chunks` clustered vectors is used.
+        n_chunks (int): Synthetic corpus size.
+        dim (int): Synthetic vector dimension.
+        n_queries (int): Number of queries, sampled as perturbed corpus vectors.
+        k (int): Neighbours per query.
+        nlist (int): IVF lists. Defaults to the `IVFIndex.build` heuristic.
+        nprobes (tuple[int]): nprobe settings to sweep.
+        seed (int): Random seed.
+
+    Returns:
+        list[dict]: One row for exact search and one per nprobe, with recall and latency.
+    """
+    from .ann_index import ExactIndex, IVFIndex
+    from .vector_store import VectorStore, as_vector_store
+
+    if store is None:
+        X = synthetic_embeddings(n_chunks, dim, seed=seed)
+        manifest = {"format_version": 1, "model": "synthetic", "dim": dim,
+                    "dtype": "float32", "normalized": True, "count": n_chunks}
+        store = VectorStore(X, np.zeros(0, dtype=np.uint8), np.zeros(n_chunks + 1, dtype=np.int64), manifest)
+    store = as_vector_store(store)
+
+    rng = np.random.default_rng(seed + 1)
+    base = np.asarray(store.embeddings[rng.choice(len(store), n_queries, replace=False)], dtype=np.float32)
+    queries = base + 0.05 * rng.standard_normal(base.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    results = []
+
+    exact = ExactIndex(store)
+    start = time.perf_counter()
+    exact_ids = [exact.search(q[None, :], k)[0][0] for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+    results.append({"index": "exact", "nprobe": None, "recall_at_k": 1.0,
+                    "ms_per_query": round(exact_ms, 3), "speedup": 1.0})
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(store, nlist=nlist, seed=seed)
+    build_s = time.perf_counter() - start
+
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        approx_ids = [ivf.search(q[None, :], k, nprobe=nprobe)[0][0] for q in queries]
+        ms = (time.perf_counter() - start) * 1000 / n_queries
+        results.append({
+            "index": "ivf", "nlist": ivf.nlist, "nprobe": nprobe,
+            "recall_at_k": round(_recall_at_k(approx_ids, exact_ids), 4),
+            "ms_per_query": round(ms, 3), "speedup": round(exact_ms / ms, 2) if ms else None,
+            "build_s": round(build_s, 2),
+        })
+
+    return results
+
+
+def benchmark_quantization(store=None, n_chunks: int = 100_000, dim: int = 1024, n_queries: int = 200,
+                           k: int = 10, rescores: tuple = (0, 1, 2, 4, 10), seed: int = 0) -> list:
+    """
+    Measures recall@k, latency and code size of int8 and binary search against float32 search.
+
+    Args:
+        store: A `VectorStore` or store directory to benchmark. If omitted, a synthetic
+            in-memory store with `n_chunks` clustered vectors is used.
+        n_chunks (int): Synthetic corpus size.
+        dim (int): Synthetic vector dimension.
+        n_queries (int): Number of queries, sampled as perturbed corpus vectors.
+        k (int): Neighbours per query.
+        rescores (tuple[int]): Shortlist multiples to sweep; 0 ranks by code scores alone.
+        seed (int): Random seed.
+
+    Returns:
+        list[dict]: One row for float32 exact search and one per (mode, rescore), with recall,
+            latency and the resident size of the searched matrix.
+    """
+    from .ann_index import ExactIndex, QuantizedIndex
+    from .vector_store import VectorStore, as_vector_store
+
+    if store is None:
+        X = synthetic_embeddings(n_chunks, dim, seed=seed)
+        manifest = {"format_version": 1, "model": "synthetic", "dim": dim,
+                    "dtype": "float32", "normalized": True, "count": n_chunks}
+        store = VectorStore(X, np.zeros(0, dtype=np.uint8), np.zeros(n_chunks + 1, dtype=np.int64), manifest)
+    store = as_vector_store(store)
+
+    rng = np.random.default_rng(seed + 1)
+    base = np.asarray(store.embeddings[rng.choice(len(store), n_queries, replace=False)], dtype=np.float32)
+    queries = base + 0.05 * rng.standard_normal(base.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    float_mb = len(store) * store.dim * 4 / 2 ** 20
+    exact = ExactIndex(store)
+    start = time.perf_counter()
+    exact_ids = [exact.search(q[None, :], k)[0][0] for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+    results = [{"index": "float32", "rescore": None, "recall_at_k": 1.0, "ms_per_query": round(exact_ms, 3),
+                "speedup": 1.0, "matrix_mb": round(float_mb, 2), "memory_ratio": 1.0}]
+
+    for kind in ("int8", "binary"):
+        start = time.perf_counter()
+        index = QuantizedIndex.build(store, kind=kind, seed=seed)
+        build_s = time.perf_counter() - start
+        for rescore in rescores:
+            start = time.perf_counter()
+            approx_ids = [index.search(q[None, :], k, rescore=rescore)[0][0] for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / n_queries
+            results.append({
+                "index": kind, "rescore": rescore,
+                "recall_at_k": round(_recall_at_k(approx_ids, exact_ids), 4),
+                "ms_per_query": round(ms, 3), "speedup": round(exact_ms / ms, 2) if ms else None,
+                "matrix_mb": round(index.nbytes / 2 ** 20, 2),
+                "memory_ratio": round(index.nbytes / 2 ** 20 / float_mb, 4) if float_mb else None,
+                "build_s": round(build_s, 2),
+            })
+
+    return results
+
+
+def benchmark_hybrid_search(n_chunks: int = 20_000, dim: int = 384, n_queries: int = 100, m: int = 5,
+                            ks: tuple = (5, 10, 20, 50), work_dir: str = None, seed: int = 0) -> list:
+    """
+    Measures rerank recall of dense-only against BM25-fused candidate generation at several k.
+
+    Runs `batch_retrieve_indices` with the offline stand-in models on a synthetic store. The
+    reference is the stand-in reranker's top-m over every chunk of the store, i.e. what an
+    unbounded k would return; chunks tied with the m-th best count as correct.
+
+    Args:
+        n_chunks (int): Synthetic corpus size.
+        dim (int): Stand-in embedding dimension; small values make dense search lossier.
+        n_queries (int): Number of queries.
+        m (int): Reranked chunks kept per query.
+        ks (tuple[int]): Candidates per query to sweep.
+        work_dir (str): Where the store is written. Defaults to a temporary directory.
+        seed (int): Random seed.
+
+    Returns:
+        list[dict]: One row per (mode, k) with recall@m, pairs reranked and latency per query,
+            plus a row with the BM25 index build time and size.
+    """
+    from .bm25_index import build_bm25_index
+    from .offline import HashingEncoder, OverlapReranker, _words, synthetic_queries, synthetic_store
+    from .retrieval import batch_retrieve_indices
+
+    encoder, reranker = HashingEncoder(dim=dim), OverlapReranker()
+    queries = synthetic_queries(n_queries, seed=seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = synthetic_store(os.path.join(work_dir or tmp, f"store_{n_chunks}"), n_chunks, encoder, seed=seed)
+        start = time.perf_counter()
+        index = build_bm25_index(store)
+        results = [{"mode": "bm25_build", "build_s": round(time.perf_counter() - start, 2),
+                    "index_mb": round(index.nbytes / 2 ** 20, 2), "terms": len(index.vocab)}]
+
+        # Reference: the reranker's own top-m over the whole store (ties included)
+        chunk_words = [set(_words(text)) for text in store.texts(range(len(store)))]
+        reference = []
+        for query in queries:
+            query_words = set(_words(query))
+            overlap = np.array([len(query_words & words) for words in chunk_words])
+            reference.append(set(np.flatnonzero(overlap >= np.sort(overlap)[-m]).tolist()))
+
+        for k in ks:
+            for mode, fusion in (("dense", False), ("bm25_fused", True)):
+                start = time.perf_counter()
+                hits = batch_retrieve_indices(queries, store, encoder, reranker, k=k, m=m, fusion=fusion)
+                ms = (time.perf_counter() - start) * 1000 / n_queries
+                recall = np.mean([len({c for c, _ in h} & ref) / m for h, ref in zip(hits, reference)])
+                results.append({"mode": mode, "k": k, "recall_at_m": round(float(recall), 4),
+                                "pairs_per_query": k, "ms_per_query": round(ms, 3)})
+    return results
+
+
+def benchmark_backends(backends: tuple = ("torch", "int8", "onnx"), store=None, n_texts: int = 512,
+                       n_queries: int = 32, batch_size: int = 32, threads: int = None, seed: int = 0) -> list:
+    """
+    Measures encoder and reranker throughput per inference backend, and their parity with fp32.
+
+    Needs the real models (sentence-transformers and torch; onnxruntime and optimum for "onnx").
+
+    Args:
+        backends (tuple[str]): Backends to compare; "torch" (fp32) is always measured first as
+            the reference.
+        store: A `VectorStore` or store directory to sample passages from. If omitted,
+            synthetic passages of varying length are used.
+        n_texts (int): Passages encoded per backend.
+        n_queries (int): Queries used for the rerank and parity measurements (10 pairs each).
+        batch_size (int): Encoder batch size.
+        threads (int): Intra-op threads for every backend. None keeps the runtime default.
+        seed (int): Random seed.
+
+    Returns:
+        list[dict]: One row per backend with `texts_per_second` (plain and length-sorted
+            batches), `pairs_per_second`, the speedups over fp32 and the `parity_check` values.
+    """
+    from .inference import encode_sorted, load_embedding_model, load_reranker, parity_check
+    from .models import EMBEDDING_MODEL_NAME, RERANKER_MODEL_NAME
+    from .offline import synthetic_queries, synthetic_vocabulary
+    from .vector_store import as_vector_store
+
+    rng = np.random.default_rng(seed)
+    if store is not None:
+        store = as_vector_store(store)
+        texts = store.texts(rng.choice(len(store), min(n_texts, len(store)), replace=False))
+    else:
+        vocabulary, _ = synthetic_vocabulary(seed=seed)
+        texts = [" ".join(vocabulary[i] for i in rng.integers(0, len(vocabulary), int(n)))
+                 for n in rng.integers(20, 400, n_texts)]
+    queries = synthetic_queries(n_queries, seed=seed)
+    pairs = [(q, texts[i]) for q in queries for i in rng.choice(len(texts), 10, replace=False)]
+
+    def timed(fn) -> float:
+        fn()  # warm-up (graph building, allocator)
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    models, results = {}, []
+    for backend in ("torch",) + tuple(b for b in backends if b != "torch"):
+        encoder = load_embedding_model(EMBEDDING_MODEL_NAME, backend, "cpu", intra_op=threads)
+        reranker = load_reranker(RERANKER_MODEL_NAME, backend, "cpu", intra_op=threads)
+        if encoder.backend_name != backend:
+            results.append({"backend": backend, "error": f"unavailable, fell back to {encoder.backend_name}"})
+            continue
+        models[backend] = (encoder, reranker)
+
+        def plain():
+            for start in range(0, len(texts), batch_size):
+                encoder.encode(texts[start:start + batch_size], batch_size=batch_size,
+                               normalize_embeddings=True, show_progress_bar=False)
+
+        encode_s = timed(plain)
+        sorted_s = timed(lambda: encode_sorted(encoder, texts, batch_size, normalize_embeddings=True))
+        rerank_s = timed(lambda: reranker.predict(pairs, batch_size=batch_size))
+        row = {"backend": backend, "threads": threads,
+               "texts_per_second": round(len(texts) / encode_s, 1),
+               "texts_per_second_sorted": round(len(texts) / sorted_s, 1),
+               "pairs_per_second": round(len(pairs) / rerank_s, 1)}
+        reference = results[0] if results else row
+        row["encode_speedup"] = round(row["texts_per_second"] / reference["texts_per_second"], 2)
+        row["rerank_speedup"] = round(row["pairs_per_second"] / reference["pairs_per_second"], 2)
+        reference_encoder, reference_reranker = models["torch"]
+        row.update(parity_check(reference_encoder, encoder, reference_reranker, reranker, texts, queries))
+        results.append(row)
+    return results
+
+
+# Child-process probe: times one statement and reports peak RSS (ru_maxrss is KiB on Linux)
+_STARTUP_PROBE = """
+import json, resource, time
+t0 = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+STARTUP_SCENARIOS = {
+    "interpreter": "pass",
+    "import main": "import main",
+    "judge only": "from main import judge",
+    "kg query only": "from main import give_query_answer_kg",
+    "warmup (eager models)": "import main; main.warmup()",
+}
+
+
+def benchmark_startup(scenarios: dict = None, repeats: int = 3) -> list:
+    """
+    Measures import time and peak RSS of the package in fresh interpreters.
+
+    Each scenario runs in its own subprocess, so module caches never leak between them.
+    The "warmup" scenario loads both models and stands in for the old eager import.
+
+    Args:
+        scenarios (dict[str, str]): Name to Python statement. Defaults to `STARTUP_SCENARIOS`.
+        repeats (int): Runs per scenario; the fastest is reported.
+
+    Returns:
+        list[dict]: One row per scenario with seconds and peak RSS in MB, or the error.
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for name, statement in (scenarios or STARTUP_SCENARIOS).items():
+        runs, error = [], None
+        for _ in range(repeats):
+            proc = subprocess.run([sys.executable, "-c", _STARTUP_PROBE.format(statement=statement)],
+                                  cwd=repo_root, capture_output=True, text=True)
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+                break
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        if error:
+            results.append({"scenario": name, "error": error})
+            continue
+        best = min(runs, key=lambda r: r["seconds"])
+        results.append({"scenario": name, "seconds": round(best["seconds"], 4),
+                        "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1)})
+    return results
+
+
+def benchmark_triple_preselection(queries: list, kg_data: dict, ns: tuple = (20, 40, 80),
+                                  llm_selections: list = None, use_llm: bool = False,
+                                  embedding_model=None) -> list:
+    """
+    Compares the KG-extraction prompt built from the full flattened KG with one built from
+    locally pre-selected triples.
+
+    Prompt size is estimated as characters / `llm_client.CHARS_PER_TOKEN`. Triple recall is
+    the fraction of keys chosen by the current LLM-only selection that survive pre-selection.
+
+    Args:
+        queries (list[str]): User queries.
+        kg_data (dict): Nested KG (or a dict of KGs, as in comparative queries).
+        ns (tuple[int]): Pre-selection sizes to evaluate.
+        llm_selections (list[dict]): The LLM-only selection for each query, if already known.
+        use_llm (bool): Run the LLM-only selection when `llm_selections` is not given.
+        embedding_model: Optional encoder for the dense part of the triple score.
+
+    Returns:
+        list[dict]: One row per (query, n), plus a row for the no-LLM fast mode at n=10.
+    """
+    from .hybrid import build_kg_extraction_prompt, extract_json_from_llm_output, flatten_kg
+    from .llm_client import CHARS_PER_TOKEN, give_answer
+    from .triple_index import TripleIndex
+
+    flat_kg = flatten_kg(kg_data)
+    start = time.perf_counter()
+    index = TripleIndex(flat_kg, embedding_model=embedding_model)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for qi, query in enumerate(queries):
+        full_tokens = len(build_kg_extraction_prompt(query, flat_kg)) // CHARS_PER_TOKEN
+
+        selected_keys = None
+        if llm_selections is not None:
+            selected_keys = set(llm_selections[qi] or {})
+        elif use_llm:
+            selected_keys = set(extract_json_from_llm_output(
+                give_answer(build_kg_extraction_prompt(query, flat_kg))) or {})
+
+        for n in tuple(ns) + (10,):
+            start = time.perf_counter()
+            candidates = index.select(query, n=n)
+            select_ms = (time.perf_counter() - start) * 1000
+            tokens = len(build_kg_extraction_prompt(query, candidates)) // CHARS_PER_TOKEN
+            row = {
+                "query": query, "mode": "fast (no LLM)" if n == 10 else "preselect", "n": n,
+                "triples_total": len(flat_kg), "prompt_tokens_full": full_tokens,
+                "prompt_tokens": 0 if n == 10 else tokens,
+                "token_reduction": round(1 - (0 if n == 10 else tokens) / full_tokens, 4),
+                "select_ms": round(select_ms, 3), "index_build_ms": round(build_ms, 3),
+            }
+            if selected_keys:
+                row["triple_recall"] = round(len(selected_keys & candidates.keys()) / len(selected_keys), 4)
+            results.append(row)
+    return results
+
+
+def _measure(op: str, fn, calls: list, trace_memory: bool = True, items_per_call: int = 1,
+             unit: str = "queries", **info) -> dict:
+    """
+    Times `fn(*args)` for every argument tuple in `calls`, then repeats the first call
+    under tracemalloc for the peak memory. Pipeline output printed to stdout is discarded.
+    Throughput is `items_per_call` items (queries or chunks) per second.
+    """
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for args in calls:
+            t0 = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+
+        peak_mb = None
+        if trace_memory and calls:
+            tracemalloc.start()
+            try:
+                fn(*calls[0])
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+
+    ms = np.asarray(latencies) * 1000
+    return dict(op=op, **info, calls=len(calls),
+                p50_ms=round(float(np.percentile(ms, 50)), 3),
+                p99_ms=round(float(np.percentile(ms, 99)), 3),
+                mean_ms=round(float(ms.mean()), 3),
+                throughput_per_s=round(len(calls) * items_per_call / total, 3) if total else None, unit=unit,
+                peak_traced_mb=round(peak_mb, 2) if peak_mb is not None else None)
+
+
+def benchmark_pipelines(sizes: tuple = (1_000, 10_000), n_queries: int = 20, dim: int = 384,
+                        n_kgs: int = 16, csv_max_chunks: int = 10_000, encoder_latency: float = 0.0,
+                        reranker_latency_per_pair: float = 0.0, llm_latency: float = 0.0,
+                        trace_memory: bool = True, work_dir: str = None, seed: int = 0,
+                        schema_path: str = "data/kg/schema.json") -> dict:
+    """
+    Times the embedding, retrieval and answering pipelines end to end, fully offline.
+
+    For each corpus size this builds a synthetic store, then measures:
+    - `generate_embeddings_csv` and `generate_embeddings_store` on a synthetic text file
+      (sizes up to `csv_max_chunks`; one call each)
+    - `retrieve_from_rag`, `give_query_answer_rag_multihop` and `hybrid_kg_rag_pipeline`,
+      once per synthetic query
+
+    Args:
+        sizes (tuple[int]): Corpus sizes in chunks (1k to 1M).
+        n_queries (int): Queries per operation.
+        dim (int): Stand-in embedding dimension.
+        n_kgs (int): Synthetic KGs in the hybrid pipeline's registry.
+        csv_max_chunks (int): Largest corpus the embedding-generation functions are run on.
+        encoder_latency (float): Stand-in encoder seconds per call.
+        reranker_latency_per_pair (float): Stand-in reranker seconds per pair.
+        llm_latency (float): LLM stub seconds per call.
+        trace_memory (bool): Measure peak traced memory (one extra call per operation).
+        work_dir (str): Where stores and corpora are written. Defaults to a temporary directory.
+        seed (int): Random seed; equal seeds give identical corpora, KGs and queries.
+        schema_path (str): KG schema the synthetic KGs follow.
+
+    Returns:
+        dict: `{"meta": {...}, "results": [...]}`, one result row per (operation, size).
+    """
+    from . import hybrid
+    from .embedding_generator import generate_embeddings_csv, generate_embeddings_store
+    from .kg_builder import load_schema
+    from .offline import (HashingEncoder, OverlapReranker, StubLLM, synthetic_queries, synthetic_registry,
+                          synthetic_store, use_offline_models, write_synthetic_text)
+    from .rag_rq import give_query_answer_rag_multihop
+    from .rerank_service import get_rerank_service
+
+    encoder, _, llm = use_offline_models(
+        HashingEncoder(dim=dim, latency=encoder_latency),
+        OverlapReranker(latency_per_pair=reranker_latency_per_pair),
+        StubLLM(latency=llm_latency),
+    )
+    registry, aliases = synthetic_registry(n_kgs, load_schema(schema_path), seed=seed)
+    previous_registry, hybrid.registry = hybrid.registry, registry
+
+    meta = {
+        "seed": seed, "dim": dim, "n_queries": n_queries, "n_kgs": n_kgs,
+        "encoder_latency": encoder_latency, "reranker_latency_per_pair": reranker_latency_per_pair,
+        "llm_latency": llm_latency, "python": platform.python_version(), "numpy": np.__version__,
+        "platform": platform.platform(), "cpu_count": os.cpu_count(),
+    }
+    results = []
+    plain_queries = synthetic_queries(n_queries, seed=seed)
+    event_queries = synthetic_queries(n_queries, aliases=aliases, seed=seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = work_dir or tmp
+        try:
+            for size in sizes:
+                store_dir = os.path.join(root, f"store_{size}")
+                results.append(_measure("synthetic_store", lambda: synthetic_store(store_dir, size, encoder, seed=seed),
+                                        [()], trace_memory=trace_memory, items_per_call=size, unit="chunks",
+                                        chunks=size))
+                store = synthetic_store(store_dir, size, encoder, seed=seed)
+
+                if size <= csv_max_chunks:
+                    text_file = write_synthetic_text(os.path.join(root, f"corpus_{size}.txt"), size, seed=seed)
+                    results.append(_measure(
+                        "generate_embeddings_csv", generate_embeddings_csv,
+                        [(text_file, os.path.join(root, f"emb_{size}.csv"), 100)],
+                        trace_memory=trace_memory, items_per_call=size, unit="chunks", chunks=size))
+                    results.append(_measure(
+                        "generate_embeddings_store",
+                        lambda: generate_embeddings_store(text_file, os.path.join(root, f"gen_{size}"),
+                                                          chunk_size=100, resume=False),
+                        [()], trace_memory=trace_memory, items_per_call=size, unit="chunks", chunks=size))
+
+                # Scores are cached across calls; clear them so every size starts cold
+                get_rerank_service().clear()
+                results.append(_measure("retrieve_from_rag", hybrid.retrieve_from_rag,
+                                        [(q, store) for q in plain_queries], trace_memory=trace_memory, chunks=size))
+                get_rerank_service().clear()
+                results.append(_measure("give_query_answer_rag_multihop", give_query_answer_rag_multihop,
+                                        [(q, store) for q in plain_queries], trace_memory=trace_memory, chunks=size))
+                get_rerank_service().clear()
+                results.append(_measure("hybrid_kg_rag_pipeline", hybrid.hybrid_kg_rag_pipeline,
+                                        [(q, store) for q in event_queries], trace_memory=trace_memory, chunks=size))
+        finally:
+            hybrid.registry = previous_registry
+
+    meta["llm_calls"] = llm.calls
+    meta["rerank"] = get_rerank_service().stats()
+    return {"meta": meta, "results": results}
+
+
+def benchmark_streaming(n_chunks: int = 100_000, n_queries: int = 10, dim: int = 384, n_kgs: int = 16,
+                        output_tokens_per_second: float = 200.0, llm_latency: float = 0.2,
+                        encoder_latency: float = 0.03, reranker_latency_per_pair: float = 0.01,
+                        work_dir: str = None, seed: int = 0, schema_path: str = "data/kg/schema.json") -> dict:
+    """
+    Compares the hybrid pipeline's sequential and streamed sub-query modes end to end.
+
+    The LLM stub generates output at `output_tokens_per_second`, so the sequential mode waits
+    for the whole sub-query list before retrieving, while the streamed mode retrieves during
+    generation. Both modes run the same queries on the same synthetic store, each starting
+    with a cold rerank cache.
+
+    Args:
+        n_chunks (int): Synthetic corpus size.
+        n_queries (int): Queries per mode.
+        dim (int): Stand-in embedding dimension.
+        n_kgs (int): Synthetic KGs in the registry.
+        output_tokens_per_second (float): LLM stub generation speed.
+        llm_latency (float): LLM stub seconds before the first token.
+        encoder_latency (float): Stand-in encoder seconds per call.
+        reranker_latency_per_pair (float): Stand-in reranker seconds per pair.
+        work_dir (str): Where the store is written. Defaults to a temporary directory.
+        seed (int): Random seed.
+        schema_path (str): KG schema the synthetic KGs follow.
+
+    Returns:
+        dict: `{"meta": {...}, "results": [...]}` with one row per mode and a `saved` row
+            (mean and p50 latency saved by streaming, in ms and percent).
+    """
+    from . import hybrid
+    from .kg_builder import load_schema
+    from .offline import (HashingEncoder, OverlapReranker, StubLLM, synthetic_queries, synthetic_registry,
+                          synthetic_store, use_offline_models)
+    from .rerank_service import get_rerank_service
+
+    encoder, _, _ = use_offline_models(
+        HashingEncoder(dim=dim, latency=encoder_latency),
+        OverlapReranker(latency_per_pair=reranker_latency_per_pair),
+        StubLLM(latency=llm_latency, output_tokens_per_second=output_tokens_per_second),
+    )
+    registry, aliases = synthetic_registry(n_kgs, load_schema(schema_path), seed=seed)
+    previous_registry, hybrid.registry = hybrid.registry, registry
+    queries = synthetic_queries(n_queries, aliases=aliases, seed=seed)
+
+    meta = {
+        "seed": seed, "dim": dim, "chunks": n_chunks, "n_queries": n_queries, "n_kgs": n_kgs,
+        "output_tokens_per_second": output_tokens_per_second, "llm_latency": llm_latency,
+        "encoder_latency": encoder_latency, "reranker_latency_per_pair": reranker_latency_per_pair,
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            store = synthetic_store(os.path.join(work_dir or tmp, f"store_{n_chunks}"), n_chunks, encoder, seed=seed)
+            for mode, streamed in (("sequential", False), ("streamed", True)):
+                get_rerank_service().clear()
+                results.append(_measure(
+                    "hybrid_kg_rag_pipeline", lambda q: hybrid.hybrid_kg_rag_pipeline(q, store, stream_sub_queries=streamed),
+                    [(q,) for q in queries], trace_memory=False, mode=mode, chunks=n_chunks))
+        finally:
+            hybrid.registry = previous_registry
+
+    sequential, streamed = results
+    saved = {"op": "saved_by_streaming"}
+    for stat in ("mean_ms", "p50_ms"):
+        saved[stat] = round(sequential[stat] - streamed[stat], 3)
+        saved[stat.replace("_ms", "_pct")] = round(100 * saved[stat] / sequential[stat], 1) if sequential[stat] else None
+    results.append(saved)
+    return {"meta": meta, "results": results}
+
+
+def _rewordings(query: str) -> list:
+    # The query and three rewordings: casing/punctuation, clause order, and an added lead-in
+    head, _, event = query.rstrip("?").partition(" during ")
+    reordered = f"During {event}, {head[0].lower()}{head[1:]}?" if event else f"{query.rstrip('?')}, please?"
+    return [query, query.lower().rstrip("?"), reordered, f"Tell me {query[0].lower()}{query[1:]}"]
+
+
+def benchmark_answer_cache(n_chunks: int = 20_000, n_queries: int = 20, dim: int = 384, n_kgs: int = 16,
+                           thresholds: tuple = (0.9, 0.95), llm_latency: float = 0.05,
+                           encoder_latency: float = 0.01, reranker_latency_per_pair: float = 0.002,
+                           work_dir: str = None, seed: int = 0, schema_path: str = "data/kg/schema.json") -> dict:
+    """
+    Measures the hybrid pipeline's answer cache on a workload of repeated and reworded questions.
+
+    Every synthetic question is asked four times, in shuffled order: verbatim, lower-cased
+    without punctuation, with its clauses swapped, and with a "Tell me" lead-in. The workload
+    runs once without the cache, then once per threshold with a fresh cache.
+
+    Args:
+        n_chunks (int): Synthetic corpus size.
+        n_queries (int): Distinct questions.
+        dim (int): Stand-in embedding dimension.
+        n_kgs (int): Synthetic KGs in the registry.
+        thresholds (tuple[float]): Cache similarity thresholds to compare.
+        llm_latency (float): LLM stub seconds per call.
+        encoder_latency (float): Stand-in encoder seconds per call.
+        reranker_latency_per_pair (float): Stand-in reranker seconds per pair.
+        work_dir (str): Where the store is written. Defaults to a temporary directory.
+        seed (int): Random seed.
+        schema_path (str): KG schema the synthetic KGs follow.
+
+    Returns:
+        dict: `{"meta": {...}, "results": [...]}` with one row per mode: latency percentiles,
+            hit rate, `wrong_hits` (hits answered with a different question's answer), the
+            cache's own `stats`, and the mean latency saved against the uncached run.
+    """
+    from . import hybrid
+    from .answer_cache import AnswerCache
+    from .kg_builder import load_schema
+    from .offline import (HashingEncoder, OverlapReranker, StubLLM, synthetic_queries, synthetic_registry,
+                          synthetic_store, use_offline_models)
+    from .rerank_service import get_rerank_service
+
+    encoder, _, llm = use_offline_models(
+        HashingEncoder(dim=dim, latency=encoder_latency),
+        OverlapReranker(latency_per_pair=reranker_latency_per_pair),
+        StubLLM(latency=llm_latency),
+    )
+    registry, aliases = synthetic_registry(n_kgs, load_schema(schema_path), seed=seed)
+    previous = hybrid.registry, hybrid.answer_cache
+    hybrid.registry = registry
+
+    # (question index, wording) pairs, shuffled so rewordings are interleaved across questions
+    questions = synthetic_queries(n_queries, aliases=aliases, seed=seed)
+    workload = [(i, text) for i, q in enumerate(questions) for text in _rewordings(q)]
+    order = np.random.default_rng(seed).permutation(len(workload))
+    workload = [workload[i] for i in order]
+
+    meta = {
+        "seed": seed, "dim": dim, "chunks": n_chunks, "n_queries": n_queries, "calls": len(workload),
+        "n_kgs": n_kgs, "llm_latency": llm_latency, "encoder_latency": encoder_latency,
+        "reranker_latency_per_pair": reranker_latency_per_pair,
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            store = synthetic_store(os.path.join(work_dir or tmp, f"store_{n_chunks}"), n_chunks, encoder, seed=seed)
+            for threshold in (None,) + tuple(thresholds):
+                cache = AnswerCache(threshold=threshold) if threshold is not None else None
+                hybrid.answer_cache = cache
+                get_rerank_service().clear()
+                llm_calls = llm.calls
+                by_text = {text: i for i, q in enumerate(questions) for text in _rewordings(q)}
+
+                latencies, hits, wrong = [], 0, 0
+                for i, text in workload:
+                    t0 = time.perf_counter()
+                    result = hybrid.hybrid_kg_rag_pipeline(text, store, use_cache=cache is not None)
+                    latencies.append(time.perf_counter() - t0)
+                    if result.cache is not None:
+                        hits += 1
+                        wrong += by_text.get(result.cache["cached_query"]) != i
+
+                ms = np.asarray(latencies) * 1000
+                row = {
+                    "mode": "uncached" if cache is None else "cached", "threshold": threshold,
+                    "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                    "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                    "mean_ms": round(float(ms.mean()), 3),
+                    "hit_rate": round(hits / len(workload), 4), "wrong_hits": wrong,
+                    "llm_calls": llm.calls - llm_calls,
+                }
+                if cache is not None:
+                    row["cache"] = cache.stats()
+                    baseline = results[0]["mean_ms"]
+                    row["saved_mean_ms"] = round(baseline - row["mean_ms"], 3)
+                    row["saved_pct"] = round(100 * row["saved_mean_ms"] / baseline, 1) if baseline else None
+                results.append(row)
+        finally:
+            hybrid.registry, hybrid.answer_cache = previous
+
+    return {"meta": meta, "results": results}
+
+
+def benchmark_kg_graph(event_counts: tuple = (2, 16, 128, 512), n_lookups: int = 200, store: str = None,
+                       seed: int = 0, schema_path: str = "data/kg/schema.json") -> list:
+    """
+    Measures pattern-query latency of the KG graph as the number of events and triples grows.
+
+    For each event count, a registry of synthetic KGs is materialized with `KGGraph`, then
+    each operation is timed over `n_lookups` random events and schema paths:
+    - `value`: one attribute of one event (subject + predicate lookup)
+    - `compare`: one attribute across every event (predicate lookup)
+    - `related_events`: events sharing items with one event (two hops)
+    - `select`: the hybrid pipeline's structured selection for one question and event
+    - `flat_scan_compare`: the `compare` result computed by scanning the combined flattened KG,
+      as the extraction prompt would have to read it
+
+    Args:
+        event_counts (tuple[int]): Registry sizes.
+        n_lookups (int): Calls timed per operation.
+        store (str): "memory" or a `sqlite:///` URL (rebuilt for every size).
+        seed (int): Random seed.
+        schema_path (str): KG schema the synthetic KGs follow.
+
+    Returns:
+        list[dict]: One row per (events, operation) with p50/p99 latency, plus the triple count,
+            build time, and the flattened-KG prompt size the structured selection replaces.
+    """
+    from .kg_builder import load_schema
+    from .kg_graph import KGGraph
+    from .kg_store import combine_kgs
+    from .offline import synthetic_queries, synthetic_registry
+
+    schema = load_schema(schema_path)
+    results = []
+    for n_events in event_counts:
+        registry, aliases = synthetic_registry(n_events, schema, seed=seed)
+        start = time.perf_counter()
+        kg_graph = KGGraph.from_registry(registry, schema=schema, store=store)
+        build_s = time.perf_counter() - start
+
+        rng = np.random.default_rng(seed)
+        names = registry.names
+        paths = sorted(kg_graph.schema)
+        list_paths = sorted(kg_graph.list_fields)
+        events = [names[i] for i in rng.integers(0, len(names), n_lookups)]
+        queries = synthetic_queries(n_lookups, aliases=aliases, seed=seed)
+        # Questions name an attribute of the schema, as operators' structured questions do
+        questions = [f"{q.rstrip('?')} and its {paths[i].rsplit('.', 1)[-1].replace('_', ' ')}?"
+                     for q, i in zip(queries, rng.integers(0, len(paths), n_lookups))]
+        picked = [paths[i] for i in rng.integers(0, len(paths), n_lookups)]
+        picked_lists = [list_paths[i] for i in rng.integers(0, len(list_paths), n_lookups)]
+        flat = combine_kgs({name: registry[name].kg for name in names}).flat()
+
+        def flat_scan(path):
+            suffix = "." + path
+            return {key[:-len(suffix)]: value for key, value in flat.items() if key.endswith(suffix)}
+
+        operations = {
+            "value": lambda i: kg_graph.value(events[i], picked[i]),
+            "compare": lambda i: kg_graph.compare(picked[i]),
+            "related_events": lambda i: kg_graph.related_events(events[i], picked_lists[i]),
+            "select": lambda i: kg_graph.select(questions[i], [events[i]]),
+            "flat_scan_compare": lambda i: flat_scan(picked[i]),
+        }
+        selected_chars = 0
+        for op, fn in operations.items():
+            fn(0)  # the first select builds the path index
+            latencies = []
+            for i in range(n_lookups):
+                t0 = time.perf_counter()
+                out = fn(i)
+                latencies.append(time.perf_counter() - t0)
+                if op == "select":
+                    selected_chars += len(json.dumps(out, default=str))
+            us = np.asarray(latencies) * 1e6
+            results.append({
+                "events": n_events, "triples": len(kg_graph), "build_s": round(build_s, 3), "op": op,
+                "p50_us": round(float(np.percentile(us, 50)), 1), "p99_us": round(float(np.percentile(us, 99)), 1),
+            })
+
+        # Prompt size of the facts for one event: the whole flattened KG vs. the selection
+        one_kg_chars = len(json.dumps(registry[names[0]].kg.flat(), indent=2, default=str))
+        results[-2]["prompt_tokens_flat"] = one_kg_chars // 4
+        results[-2]["prompt_tokens_selected"] = selected_chars // n_lookups // 4
+        kg_graph.close()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pipelines = sub.add_parser("pipelines", help="End-to-end pipeline latency with offline stand-in models.")
+    pipelines.add_argument("--chunks", type=int, nargs="+", default=[1_000, 10_000])
+    pipelines.add_argument("--queries", type=int, default=20)
+    pipelines.add_argument("--dim", type=int, default=384)
+    pipelines.add_argument("--kgs", type=int, default=16)
+    pipelines.add_argument("--csv-max-chunks", type=int, default=10_000)
+    pipelines.add_argument("--encoder-latency", type=float, default=0.0)
+    pipelines.add_argument("--reranker-latency", type=float, default=0.0, help="Seconds per pair.")
+    pipelines.add_argument("--llm-latency", type=float, default=0.0)
+    pipelines.add_argument("--no-memory", action="store_true", help="Skip the traced peak-memory runs.")
+    pipelines.add_argument("--work-dir", default=None)
+    pipelines.add_argument("--seed", type=int, default=0)
+    pipelines.add_argument("--out", default=None, help="Write the JSON report here as well.")
+
+    streaming = sub.add_parser("streaming", help="Hybrid pipeline latency, sequential vs. streamed sub-queries.")
+    streaming.add_argument("--chunks", type=int, default=100_000)
+    streaming.add_argument("--queries", type=int, default=10)
+    streaming.add_argument("--dim", type=int, default=384)
+    streaming.add_argument("--tokens-per-second", type=float, default=200.0, help="LLM stub generation speed.")
+    streaming.add_argument("--llm-latency", type=float, default=0.2, help="LLM stub seconds to first token.")
+    streaming.add_argument("--encoder-latency", type=float, default=0.03)
+    streaming.add_argument("--reranker-latency", type=float, default=0.01, help="Seconds per pair.")
+    streaming.add_argument("--seed", type=int, default=0)
+    streaming.add_argument("--out", default=None, help="Write the JSON report here as well.")
+
+    answers = sub.add_parser("answers", help="Answer-cache hit rate and latency saved on reworded questions.")
+    answers.add_argument("--chunks", type=int, default=20_000)
+    answers.add_argument("--queries", type=int, default=20)
+    answers.add_argument("--dim", type=int, default=384)
+    answers.add_argument("--threshold", type=float, nargs="+", default=[0.9, 0.95])
+    answers.add_argument("--llm-latency", type=float, default=0.05, help="LLM stub seconds per call.")
+    answers.add_argument("--encoder-latency", type=float, default=0.01)
+    answers.add_argument("--reranker-latency", type=float, default=0.002, help="Seconds per pair.")
+    answers.add_argument("--seed", type=int, default=0)
+    answers.add_argument("--out", default=None, help="Write the JSON report here as well.")
+
+    graph = sub.add_parser("graph", help="KG graph pattern-query latency vs. number of events and triples.")
+    graph.add_argument("--events", type=int, nargs="+", default=[2, 16, 128, 512])
+    graph.add_argument("--lookups", type=int, default=200)
+    graph.add_argument("--store", default=None, help="sqlite:/// URL; in memory if omitted.")
+    graph.add_argument("--seed", type=int, default=0)
+
+    ann = sub.add_parser("ann", help="IVF recall@k vs. latency against exact search.")
+    ann.add_argument("--store", default=None, help="Store directory; synthetic data if omitted.")
+    ann.add_argument("--chunks", type=int, default=100_000)
+    ann.add_argument("--dim", type=int, default=1024)
+    ann.add_argument("--queries", type=int, default=200)
+    ann.add_argument("-k", type=int, default=10)
+    ann.add_argument("--nlist", type=int, default=None)
+    ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+
+    quant = sub.add_parser("quant", help="int8 / binary search recall@k and memory vs. float32 search.")
+    quant.add_argument("--store", default=None, help="Store directory; synthetic data if omitted.")
+    quant.add_argument("--chunks", type=int, default=100_000)
+    quant.add_argument("--dim", type=int, default=1024)
+    quant.add_argument("--queries", type=int, default=200)
+    quant.add_argument("-k", type=int, default=10)
+    quant.add_argument("--rescore", type=int, nargs="+", default=[0, 1, 2, 4, 10])
+
+    hybrid = sub.add_parser("hybrid", help="Rerank recall of dense-only vs. BM25-fused candidates per k.")
+    hybrid.add_argument("--chunks", type=int, default=20_000)
+    hybrid.add_argument("--dim", type=int, default=384)
+    hybrid.add_argument("--queries", type=int, default=100)
+    hybrid.add_argument("-m", type=int, default=5)
+    hybrid.add_argument("-k", type=int, nargs="+", default=[5, 10, 20, 50])
+    hybrid.add_argument("--seed", type=int, default=0)
+
+    backends = sub.add_parser("backends", help="Encoder / reranker throughput and parity per inference backend.")
+    backends.add_argument("--backend", nargs="+", default=["torch", "int8", "onnx"])
+    backends.add_argument("--store", default=None, help="Store directory to sample passages from.")
+    backends.add_argument("--texts", type=int, default=512)
+    backends.add_argument("--queries", type=int, default=32)
+    backends.add_argument("--batch-size", type=int, default=32)
+    backends.add_argument("--threads", type=int, default=None)
+
+    startup = sub.add_parser("startup", help="Import time and peak RSS of lazy vs. eager model loading.")
+    startup.add_argument("--repeats", type=int, default=3)
+
+    triples = sub.add_parser("triples", help="Prompt-token reduction and recall of triple pre-selection.")
+    triples.add_argument("--kg", nargs="+", default=["data/kg/KG_NEP.txt"])
+    triples.add_argument("--query", nargs="+", required=True)
+    triples.add_argument("--n", type=int, nargs="+", default=[20, 40, 80])
+    triples.add_argument("--selections", default=None, help="JSON list of LLM-only selections, one per query.")
+    triples.add_argument("--llm", action="store_true", help="Run the LLM-only selection to measure recall.")
+
+    args = parser.parse_args()
+    if args.command == "pipelines":
+        report = benchmark_pipelines(
+            sizes=tuple(args.chunks), n_queries=args.queries, dim=args.dim, n_kgs=args.kgs,
+            csv_max_chunks=args.csv_max_chunks, encoder_latency=args.encoder_latency,
+            reranker_latency_per_pair=args.reranker_latency, llm_latency=args.llm_latency,
+            trace_memory=not args.no_memory, work_dir=args.work_dir, seed=args.seed,
+        )
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+    elif args.command == "streaming":
+        report = benchmark_streaming(
+            n_chunks=args.chunks, n_queries=args.queries, dim=args.dim,
+            output_tokens_per_second=args.tokens_per_second, llm_latency=args.llm_latency,
+            encoder_latency=args.encoder_latency, reranker_latency_per_pair=args.reranker_latency, seed=args.seed,
+        )
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+    elif args.command == "answers":
+        report = benchmark_answer_cache(
+            n_chunks=args.chunks, n_queries=args.queries, dim=args.dim, thresholds=tuple(args.threshold),
+            llm_latency=args.llm_latency, encoder_latency=args.encoder_latency,
+            reranker_latency_per_pair=args.reranker_latency, seed=args.seed,
+        )
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+    elif args.command == "graph":
+        rows = benchmark_kg_graph(tuple(args.events), n_lookups=args.lookups, store=args.store, seed=args.seed)
+        print(json.dumps(rows, indent=2))
+    elif args.command == "triples":
+        from .kg_store import read_kg_source
+
+        kgs = [read_kg_source(path) for path in args.kg]
+        kg = kgs[0] if len(kgs) == 1 else {os.path.basename(p): d for p, d in zip(args.kg, kgs)}
+        selections = None
+        if args.selections:
+            with open(args.selections, 'r', encoding='utf-8') as f:
+                selections = json.load(f)
+        print(json.dumps(benchmark_triple_preselection(args.query, kg, ns=tuple(args.n),
+                                                       llm_selections=selections, use_llm=args.llm), indent=2))
+    elif args.command == "startup":
+        print(json.dumps(benchmark_startup(repeats=args.repeats), indent=2))
+    elif args.command == "ann":
+        rows = benchmark_ann(args.store, n_chunks=args.chunks, dim=args.dim, n_queries=args.queries,
+                             k=args.k, nlist=args.nlist, nprobes=tuple(args.nprobe))
+        print(json.dumps(rows, indent=2))
+    elif args.command == "quant":
+        rows = benchmark_quantization(args.store, n_chunks=args.chunks, dim=args.dim, n_queries=args.queries,
+                                      k=args.k, rescores=tuple(args.rescore))
+        print(json.dumps(rows, indent=2))
+    elif args.command == "hybrid":
+        rows = benchmark_hybrid_search(n_chunks=args.chunks, dim=args.dim, n_queries=args.queries, m=args.m,
+                                       ks=tuple(args.k), seed=args.seed)
+        print(json.dumps(rows, indent=2))
+    elif args.command == "backends":
+        rows = benchmark_backends(tuple(args.backend), store=args.store, n_texts=args.texts,
+                                  n_queries=args.queries, batch_size=args.batch_size, threads=args.threads)
+        print(json.dumps(rows, indent=2))
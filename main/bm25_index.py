@@ -0,0 +1,278 @@
+"""
+bm25_index.py
+
+Persisted BM25 inverted index over the chunks of a vector store, for hybrid retrieval.
+
+Dense retrieval misses chunks that share the query's rare terms (names, ids, numbers)
+but not its overall meaning. `BM25Index` scores chunks lexically with the same
+tokenizer as the KG triple index (`triple_index.tokenize`), and `retrieval` merges its
+candidates with the dense ones by reciprocal-rank fusion before reranking.
+
+The index is stored in compressed-sparse-row form, one postings list per term:
+- `vocab`: the terms, UTF-8, newline-separated
+- `postings_offsets`: where each term's postings start (int64, one per term + 1)
+- `doc_ids`: chunk index of every posting (uint32), ascending within a term
+- `term_freqs`: occurrences of the term in that chunk (uint16, saturated)
+- `doc_lengths`: tokens per chunk (uint32)
+
+It is written as `bm25.npz` in the store directory (or `<name>.bm25.npz` next to a
+legacy CSV) by the embedding generators, and opened with `open_bm25_index`, which
+returns None when the store has no index yet, or one built for a different store
+fingerprint (see `VectorStore.fingerprint`).
+"""
+
+import os
+
+import numpy as np
+
+from . import tracing
+from .triple_index import tokenize
+
+BM25_FILE = "bm25.npz"
+
+# Chunks tokenized per step while building, to bound memory on large stores
+_BUILD_BATCH = 4_096
+
+# Loaded indexes keyed on the index file, reloaded when the file changes
+_INDEX_CACHE = {}
+
+
+class BM25Index:
+    """
+    BM25 scoring over a compressed inverted index.
+
+    Args:
+        vocab (list[str]): Terms, in term-id order.
+        postings_offsets (np.ndarray): Start of each term's postings; the last entry is the total.
+        doc_ids (np.ndarray): Chunk index of every posting.
+        term_freqs (np.ndarray): Term frequency of every posting.
+        doc_lengths (np.ndarray): Tokens per chunk.
+        k1 (float): BM25 term-frequency saturation. Default is 1.2.
+        b (float): BM25 length normalization. Default is 0.75.
+        fingerprint (str): Fingerprint of the store the index was built from, "" if unknown.
+    """
+
+    kind = "bm25"
+
+    def __init__(self, vocab: list, postings_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.2, b: float = 0.75,
+                 fingerprint: str = ""):
+        self.fingerprint = fingerprint
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.postings_offsets = postings_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1, self.b = float(k1), float(b)
+
+        n = len(doc_lengths)
+        doc_freqs = np.diff(postings_offsets).astype(np.float32)
+        self.idf = np.log1p((n - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if n else 0.0
+        self._norm = (self.k1 * (1 - self.b + self.b * doc_lengths / max(avg_length, 1e-6))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the postings and document lengths."""
+        return self.postings_offsets.nbytes + self.doc_ids.nbytes + self.term_freqs.nbytes + self.doc_lengths.nbytes
+
+    @classmethod
+    def build(cls, texts, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """
+        Indexes an iterable of chunk texts; chunk i is the i-th text.
+
+        Args:
+            texts: Iterable of chunk texts.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 length normalization.
+
+        Returns:
+            BM25Index: The index.
+        """
+        vocab = {}
+        term_ids, freqs, lengths = [], [], []
+        for text in texts:
+            tokens = tokenize(text)
+            ids, counts = np.unique(np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens),
+                                                dtype=np.int64, count=len(tokens)), return_counts=True)
+            term_ids.append(ids)
+            freqs.append(counts)
+            lengths.append(len(tokens))
+
+        doc_lengths = np.asarray(lengths, dtype=np.uint32)
+        per_doc = np.fromiter((len(ids) for ids in term_ids), dtype=np.int64, count=len(term_ids))
+        all_terms = np.concatenate(term_ids) if term_ids else np.empty(0, dtype=np.int64)
+        all_freqs = np.concatenate(freqs) if freqs else np.empty(0, dtype=np.int64)
+        all_docs = np.repeat(np.arange(len(term_ids), dtype=np.uint32), per_doc)
+
+        # Group postings by term; the stable sort keeps chunk ids ascending within a term
+        order = np.argsort(all_terms, kind='stable')
+        postings_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_terms, minlength=len(vocab)), out=postings_offsets[1:])
+        return cls(list(vocab), postings_offsets, all_docs[order],
+                   np.minimum(all_freqs[order], np.iinfo(np.uint16).max).astype(np.uint16),
+                   doc_lengths, k1=k1, b=b)
+
+    def scores(self, query: str, chunk_ids: np.ndarray = None) -> np.ndarray:
+        """
+        BM25 score of every chunk for the query.
+
+        Args:
+            query (str): The query (without any encoder instruction prefix).
+            chunk_ids (np.ndarray): Only score these chunks; the result is then in their order.
+
+        Returns:
+            np.ndarray: float32 scores, 0 for chunks sharing no term with the query.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        scanned = 0
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            # A term's postings hold each chunk once, so the scatter has no collisions
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+            scanned += end - start
+        tracing.add("postings_scanned", int(scanned))
+        return scores if chunk_ids is None else scores[chunk_ids]
+
+    def search(self, queries: list, k: int, chunk_ids: np.ndarray = None) -> tuple:
+        """
+        Finds the k best chunks per query by BM25.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): Number of chunks to return per query.
+            chunk_ids (np.ndarray): Restrict the search to these chunks.
+
+        Returns:
+            tuple[list[np.ndarray], list[np.ndarray]]: Per query, chunk indices and scores, best
+                first. Chunks that share no term with the query are never returned.
+        """
+        all_indices, all_scores = [], []
+        for query in queries:
+            scores = self.scores(query, chunk_ids=chunk_ids)
+            matched = np.flatnonzero(scores > 0)
+            top = matched
+            if len(matched) > k:
+                top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            all_indices.append(top if chunk_ids is None else np.asarray(chunk_ids, dtype=np.int64)[top])
+            all_scores.append(scores[top])
+        return all_indices, all_scores
+
+    def save(self, path: str) -> str:
+        """Writes the index to `path` (a `.npz` file), atomically."""
+        tmp_path = path + ".tmp.npz"
+        vocab = np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8)
+        np.savez_compressed(tmp_path, vocab=vocab, postings_offsets=self.postings_offsets,
+                            doc_ids=self.doc_ids, term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+                            k1=self.k1, b=self.b, fingerprint=self.fingerprint)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Reads an index written by `save`.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"BM25 index not found: {path}")
+        with np.load(path) as data:
+            vocab_bytes = data["vocab"].tobytes()
+            vocab = vocab_bytes.decode("utf-8").split("\n") if vocab_bytes else []
+            fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+            return cls(vocab, data["postings_offsets"], data["doc_ids"], data["term_freqs"],
+                       data["doc_lengths"], k1=float(data["k1"]), b=float(data["b"]), fingerprint=fingerprint)
+
+
+def bm25_path(store) -> str:
+    """
+    Where the BM25 index of a store lives.
+
+    Args:
+        store: A `VectorStore`, or the path of a legacy embeddings CSV.
+
+    Returns:
+        str | None: `bm25.npz` in the store directory, `<name>.bm25.npz` next to a legacy CSV,
+            or None for a store with no location on disk.
+    """
+    if isinstance(store, str):
+        return os.path.splitext(store)[0] + ".bm25.npz"
+    if store.path is not None:
+        return os.path.join(store.path, BM25_FILE)
+    source = store.manifest.get("source")
+    return bm25_path(source) if source else None
+
+
+def build_bm25_index(store, path: str = None, k1: float = 1.2, b: float = 0.75) -> BM25Index:
+    """
+    Indexes every chunk of a store and persists the index next to it.
+
+    Args:
+        store: A `VectorStore` or store directory.
+        path (str): Output file. Defaults to `bm25_path(store)`; nothing is written if that is None.
+        k1 (float): BM25 term-frequency saturation.
+        b (float): BM25 length normalization.
+
+    Returns:
+        BM25Index: The built index.
+    """
+    from .vector_store import as_vector_store
+
+    store = as_vector_store(store)
+
+    def texts():
+        for start in range(0, len(store), _BUILD_BATCH):
+            yield from store.texts(range(start, min(start + _BUILD_BATCH, len(store))))
+
+    index = BM25Index.build(texts(), k1=k1, b=b)
+    index.fingerprint = store.fingerprint
+    path = path or bm25_path(store)
+    if path is not None:
+        index.save(path)
+    return index
+
+
+def open_bm25_index(store):
+    """
+    Returns the persisted BM25 index of a store, loading it only when the file changes.
+
+    Returns:
+        BM25Index | None: The index, or None if the store has none or it is stale (built for a
+            different store fingerprint or number of chunks).
+    """
+    path = bm25_path(store)
+    if path is None or not os.path.exists(path):
+        return None
+
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = _INDEX_CACHE.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, BM25Index.load(path))
+        _INDEX_CACHE[key] = cached
+
+    index = cached[1]
+    # A stale index is ignored until rebuilt, like a stale ANN index
+    return index if len(index) == len(store) and index.fingerprint == store.fingerprint else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the BM25 index of a vector store.")
+    parser.add_argument("store", help="Store directory or legacy embeddings CSV")
+    args = parser.parse_args()
+
+    index = build_bm25_index(args.store)
+    print(f"[BM25] Indexed {len(index)} chunks, {len(index.vocab)} terms ({index.nbytes / 2**20:.1f} MiB).")
@@ -0,0 +1,277 @@
+"""
+chunker.py
+
+Token-aware, sentence-respecting chunking of raw text for the embedding store.
+
+The encoders only read the first `max_seq_length` tokens of an input (512 for
+mxbai-embed-large-v1); everything past that is tokenized and then silently dropped, so
+it costs CPU and can never be retrieved. `iter_token_chunks` instead packs whole
+sentences into chunks of at most `max_tokens` tokens, counted with the model's own
+tokenizer:
+- a sentence is only cut (between words) when it alone is longer than a chunk
+- consecutive chunks share up to `overlap_tokens` tokens of trailing sentences
+- every chunk carries its ordinal and its byte offsets in the source file, which the
+  embedding generators record as chunk metadata and use to resume an interrupted run
+
+`ChunkReport` totals the tokens sent to the encoder and the tokens it truncated.
+"""
+
+import re
+
+# Characters-per-token ratio used when the model exposes no tokenizer
+from .llm_client import CHARS_PER_TOKEN
+
+# Input length of the embedding model when it does not declare one
+DEFAULT_MAX_SEQ_LENGTH = 512
+
+# Tokens the encoder adds around every input (e.g. [CLS] and [SEP])
+SPECIAL_TOKENS = 2
+
+# Default tokens shared by consecutive chunks
+DEFAULT_OVERLAP_TOKENS = 64
+
+# Sentences tokenized per tokenizer call
+_COUNT_BATCH = 256
+
+# Text without any sentence boundary is cut once this many bytes are pending
+_MAX_PENDING = 64 * 1024
+
+# End of a sentence (punctuation followed by whitespace) or a paragraph break
+_BOUNDARY_RE = re.compile(rb"(?<=[.!?])\s+|\n\s*\n")
+_WORD_RE = re.compile(rb"\S+")
+
+
+def token_counter(model=None):
+    """
+    Returns a function counting the tokens of a list of texts with the model's tokenizer.
+
+    Args:
+        model: SentenceTransformer-compatible model. Models without a `tokenizer` attribute
+            (and None) fall back to a characters-per-token estimate.
+
+    Returns:
+        callable: `count(texts: list[str]) -> list[int]`, without special tokens.
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return lambda texts: [max(1, len(text) // CHARS_PER_TOKEN) if text else 0 for text in texts]
+    return lambda texts: [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def max_content_tokens(model=None) -> int:
+    """Tokens of text the model actually reads per input: its `max_seq_length` minus special tokens."""
+    max_seq_length = getattr(model, "max_seq_length", None) or DEFAULT_MAX_SEQ_LENGTH
+    return max(1, int(max_seq_length) - SPECIAL_TOKENS)
+
+
+class Chunk:
+    """
+    One chunk of a source file.
+
+    Attributes:
+        text (str): The chunk text, whitespace collapsed.
+        source (str): Source the chunk was read from (e.g. a path relative to the input root).
+        index (int): Ordinal of the chunk within its source.
+        start (int): Byte offset of the chunk's first character in the source.
+        end (int): Byte offset just after its last character.
+        tokens (int): Tokens of the text, as counted by the model's tokenizer.
+    """
+
+    def __init__(self, text: str, source: str, index: int, start: int, end: int, tokens: int):
+        self.text = text
+        self.source = source
+        self.index = index
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+
+    @property
+    def chunk_id(self) -> str:
+        return f"{self.source}#{self.index}"
+
+    def metadata(self) -> dict:
+        """Fields recorded for the chunk in the store."""
+        return {"chunk_id": self.chunk_id, "start": self.start, "end": self.end, "tokens": self.tokens}
+
+
+class ChunkReport:
+    """
+    Tokens encoded and truncated over a run.
+
+    Args:
+        max_tokens (int): Tokens of each input the encoder reads.
+
+    Attributes:
+        chunks (int): Chunks encoded.
+        tokens_encoded (int): Tokens the encoder read.
+        tokens_truncated (int): Tokens dropped because a chunk exceeded `max_tokens`.
+        truncated_chunks (int): Chunks that lost tokens.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.chunks = 0
+        self.tokens_encoded = 0
+        self.tokens_truncated = 0
+        self.truncated_chunks = 0
+
+    def add(self, tokens: int) -> None:
+        """Records one encoded chunk of `tokens` tokens."""
+        self.chunks += 1
+        self.tokens_encoded += min(tokens, self.max_tokens)
+        if tokens > self.max_tokens:
+            self.tokens_truncated += tokens - self.max_tokens
+            self.truncated_chunks += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "max_tokens": self.max_tokens,
+            "tokens_encoded": self.tokens_encoded,
+            "tokens_truncated": self.tokens_truncated,
+            "truncated_chunks": self.truncated_chunks,
+        }
+
+    def __str__(self) -> str:
+        share = self.tokens_truncated / max(self.tokens_encoded + self.tokens_truncated, 1)
+        return (f"{self.chunks} chunks, {self.tokens_encoded} tokens encoded, {self.tokens_truncated} truncated "
+                f"({share:.1%}) in {self.truncated_chunks} chunks")
+
+
+def _trimmed(buf: bytes, a: int, b: int, base: int):
+    # The span of buf[a:b] without surrounding whitespace, as (bytes, start, end) in file offsets
+    while a < b and buf[a:a + 1].isspace():
+        a += 1
+    while b > a and buf[b - 1:b].isspace():
+        b -= 1
+    return (buf[a:b], base + a, base + b) if a < b else None
+
+
+def _iter_sentences(f, offset: int):
+    # Yields (bytes, start, end) sentences of a binary file positioned at `offset`
+    pending, pending_start = b"", offset
+    for line in f:
+        # Only the new line and the whitespace before it can hold a new boundary
+        scan = len(pending.rstrip())
+        pending += line
+        last = 0
+        for match in _BOUNDARY_RE.finditer(pending, scan):
+            if match.end() == len(pending):
+                # The whitespace may continue on the next line; wait for it
+                break
+            span = _trimmed(pending, last, match.start(), pending_start)
+            if span:
+                yield span
+            last = match.end()
+        while len(pending) - last > _MAX_PENDING:
+            # No sentence boundary in sight: cut at the last space before the cap
+            cut = pending.rfind(b" ", last, last + _MAX_PENDING)
+            cut = cut if cut > last else last + _MAX_PENDING
+            span = _trimmed(pending, last, cut, pending_start)
+            if span:
+                yield span
+            last = cut
+        pending, pending_start = pending[last:], pending_start + last
+    span = _trimmed(pending, 0, len(pending), pending_start)
+    if span:
+        yield span
+
+
+def _split_words(sentence: bytes, start: int, max_tokens: int, count_tokens):
+    # Cuts an over-long sentence between words into pieces of at most max_tokens tokens
+    words = list(_WORD_RE.finditer(sentence))
+    counts = count_tokens([w.group().decode("utf-8", errors="replace") for w in words])
+    first, used = 0, 0
+    for i, n in enumerate(counts + [None]):
+        if i == len(words) or (i > first and used + n > max_tokens):
+            a, b = words[first].start(), words[i - 1].end()
+            yield sentence[a:b], start + a, start + b, used, start
+            first, used = i, 0
+        if n is not None:
+            used += n
+
+
+def _iter_counted_sentences(f, offset: int, max_tokens: int, count_tokens):
+    # (bytes, start, end, tokens, sentence start) units, tokenized in batches; over-long
+    # sentences come back as several pieces that share their sentence start
+    batch = []
+
+    def flush():
+        for (sentence, start, end), n in zip(batch, count_tokens([s.decode("utf-8", errors="replace")
+                                                                  for s, _, _ in batch])):
+            if n > max_tokens:
+                yield from _split_words(sentence, start, max_tokens, count_tokens)
+            else:
+                yield sentence, start, end, n, start
+        batch.clear()
+
+    for span in _iter_sentences(f, offset):
+        batch.append(span)
+        if len(batch) == _COUNT_BATCH:
+            yield from flush()
+    yield from flush()
+
+
+def iter_token_chunks(text_file: str, max_tokens: int = None, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                      count_tokens=None, source: str = None, start: tuple = (0, 0)):
+    """
+    Streams sentence-aligned chunks of at most `max_tokens` tokens from a text file.
+
+    Args:
+        text_file (str): Path to the input `.txt` file.
+        max_tokens (int): Token budget per chunk. Defaults to `max_content_tokens()`.
+        overlap_tokens (int): Tokens of trailing sentences repeated at the start of the next
+            chunk. Default is 64; 0 disables overlap.
+        count_tokens (callable): `count(texts) -> list[int]`, see `token_counter`. Defaults to
+            the characters-per-token estimate.
+        source (str): Source name recorded in the chunks. Defaults to `text_file`.
+        start (tuple): Position to resume from, as yielded with an earlier chunk.
+
+    Yields:
+        tuple[Chunk, tuple[int, int, int]]: The chunk and the position of the next one: the
+            byte offset where it starts, its ordinal, and the start of the sentence it starts
+            in (sentences cut between words are re-read whole, so a resumed run cuts them the
+            same way).
+
+    Raises:
+        ValueError: If `overlap_tokens` is not smaller than `max_tokens`.
+    """
+    max_tokens = max_tokens or max_content_tokens()
+    count_tokens = count_tokens or token_counter()
+    source = source if source is not None else text_file
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens}).")
+
+    offset, index, *origin = start
+    origin = origin[0] if origin else offset
+    current, used = [], 0
+
+    def chunk_of(sentences, tokens):
+        text = " ".join(s[0].decode("utf-8", errors="replace") for s in sentences)
+        return Chunk(" ".join(text.split()), source, index, sentences[0][1], sentences[-1][2], tokens)
+
+    with open(text_file, 'rb') as f:
+        f.seek(origin)
+        for sentence in _iter_counted_sentences(f, origin, max_tokens, count_tokens):
+            if sentence[1] < offset:
+                continue
+            n = sentence[3]
+            if current and used + n > max_tokens:
+                chunk = chunk_of(current, used)
+                # Carry trailing sentences over, as long as the next sentence still fits with them
+                budget = min(overlap_tokens, max_tokens - n)
+                carry, carried = [], 0
+                for previous in reversed(current):
+                    if carried + previous[3] > budget:
+                        break
+                    carry.insert(0, previous)
+                    carried += previous[3]
+                current, used = carry, carried
+                index += 1
+                head = carry[0] if carry else sentence
+                yield chunk, (head[1], index, head[4])
+            current.append(sentence)
+            used += n
+
+    if current:
+        yield chunk_of(current, used), (current[-1][2], index + 1, current[-1][2])
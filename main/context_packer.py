@@ -0,0 +1,179 @@
+"""
+context_packer.py
+
+Token-budgeted, redundancy-aware packing of retrieved chunks into a prompt context.
+
+Retrieved chunks arrive as (chunk id, rerank score) hits, possibly the same chunk for
+several queries. `pack_context`:
+1. Merges repeated chunks, keeping each chunk's best score and the query that found it.
+2. Orders chunks deterministically: score descending, then chunk id.
+3. Selects greedily by maximal marginal relevance (MMR) over the store embeddings, so a
+   chunk that repeats an already selected one is passed over, and near-duplicates
+   (cosine similarity above `duplicate_threshold`) are dropped outright.
+4. Stops adding chunks once the token budget is spent. With `trim_sentences`, chunks are
+   cut down to the sentences that share terms with their query first.
+
+Token counts are estimated from character counts, as for the LLM usage fallback.
+"""
+
+import re
+
+import numpy as np
+
+from . import tracing
+from .llm_client import CHARS_PER_TOKEN
+from .triple_index import tokenize
+
+# Default context budget for the final answer prompt, in tokens
+DEFAULT_CONTEXT_TOKENS = 8000
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def trim_to_sentences(text: str, query: str, max_tokens: int = None) -> str:
+    """
+    Keeps the sentences of a chunk that share terms with the query, in their original order.
+
+    Args:
+        text (str): The chunk.
+        query (str): The query the chunk was retrieved for.
+        max_tokens (int): Token cap for the trimmed chunk; the best-matching sentences are kept.
+
+    Returns:
+        str: The trimmed chunk; the leading sentences if no sentence matches the query.
+    """
+    sentences = [s for s in _SENTENCE_RE.split(text) if s.strip()]
+    query_terms = set(tokenize(query))
+    overlap = [len(query_terms & set(tokenize(s))) for s in sentences]
+    if not any(overlap):
+        overlap = [len(sentences) - i for i in range(len(sentences))]
+
+    # Best sentences first (earlier ones on ties), then restored to reading order
+    keep, used = [], 0
+    for i in sorted(range(len(sentences)), key=lambda i: (-overlap[i], i)):
+        if overlap[i] <= 0:
+            break
+        cost = estimate_tokens(sentences[i]) + 1
+        if max_tokens is not None and used + cost > max_tokens:
+            if keep:
+                continue
+            # A single over-long sentence is still better than nothing
+            return sentences[i][:max_tokens * CHARS_PER_TOKEN]
+        keep.append(i)
+        used += cost
+    return " ".join(sentences[i] for i in sorted(keep))
+
+
+class PackedContext:
+    """
+    The chunks chosen for a prompt.
+
+    Attributes:
+        chunks (list[str]): Chunk texts (trimmed if requested), most relevant first.
+        chunk_ids (list[int]): Their store indices.
+        tokens (int): Estimated tokens of all chunks.
+        dropped_duplicates (int): Chunks dropped as near-duplicates of selected ones.
+        dropped_budget (int): Relevant chunks left out because the budget was spent.
+    """
+
+    def __init__(self, chunks: list, chunk_ids: list, tokens: int, dropped_duplicates: int, dropped_budget: int):
+        self.chunks = chunks
+        self.chunk_ids = chunk_ids
+        self.tokens = tokens
+        self.dropped_duplicates = dropped_duplicates
+        self.dropped_budget = dropped_budget
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def join(self, separator: str = "\n") -> str:
+        return separator.join(self.chunks)
+
+
+def pack_context(hits: list, store, queries: list = None, token_budget: int = DEFAULT_CONTEXT_TOKENS,
+                 mmr_lambda: float = 0.7, duplicate_threshold: float = 0.95,
+                 trim_sentences: bool = False, max_chunk_tokens: int = None) -> PackedContext:
+    """
+    Picks and orders retrieved chunks for a prompt within a token budget.
+
+    Args:
+        hits (list[list[tuple[int, float]]] | list[tuple[int, float]]): Per-query (chunk id, score)
+            lists as returned by `batch_retrieve_indices`, or a single such list.
+        store (VectorStore): The store the ids index into.
+        queries (list[str]): The query of each hit list; needed for `trim_sentences`.
+        token_budget (int | None): Maximum estimated tokens of the context. None means unlimited.
+        mmr_lambda (float): Weight of relevance against novelty in MMR (1.0 is relevance only).
+        duplicate_threshold (float): Cosine similarity above which a chunk counts as a duplicate.
+        trim_sentences (bool): Cut chunks to the sentences sharing terms with their query.
+        max_chunk_tokens (int): Token cap per trimmed chunk. Defaults to a quarter of the budget.
+
+    Returns:
+        PackedContext: The selected chunks, most relevant first.
+    """
+    if hits and isinstance(hits[0], tuple):
+        hits = [hits]
+    queries = queries or [""] * len(hits)
+
+    # Best score per chunk, remembering which query found it
+    best = {}
+    for query, query_hits in zip(queries, hits):
+        for chunk_id, score in query_hits:
+            chunk_id = int(chunk_id)
+            if chunk_id not in best or score > best[chunk_id][0]:
+                best[chunk_id] = (float(score), query)
+
+    ids = sorted(best, key=lambda c: (-best[c][0], c))
+    if not ids:
+        return PackedContext([], [], 0, 0, 0)
+
+    with tracing.span("context_packing", candidates=len(ids), token_budget=token_budget) as pack_span:
+        scores = np.array([best[c][0] for c in ids], dtype=np.float32)
+        relevance = (scores - scores.min()) / (scores.max() - scores.min()) if scores.max() > scores.min() \
+            else np.ones_like(scores)
+        vectors = np.asarray(store.embeddings[np.array(ids)], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarity = vectors @ vectors.T
+
+        if trim_sentences and max_chunk_tokens is None and token_budget is not None:
+            max_chunk_tokens = max(1, token_budget // 4)
+
+        chunks, chunk_ids, used = [], [], 0
+        dropped_duplicates = dropped_budget = 0
+        remaining = list(range(len(ids)))
+        max_sim = np.full(len(ids), -np.inf, dtype=np.float32)
+
+        while remaining:
+            if chunk_ids:
+                mmr = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * max_sim[remaining]
+                pick = remaining[int(np.argmax(mmr))]
+            else:
+                pick = remaining[0]
+            remaining.remove(pick)
+
+            if max_sim[pick] >= duplicate_threshold:
+                dropped_duplicates += 1
+                continue
+
+            text = store.text(ids[pick])
+            if trim_sentences:
+                text = trim_to_sentences(text, best[ids[pick]][1], max_tokens=max_chunk_tokens)
+            cost = estimate_tokens(text)
+            if token_budget is not None and used + cost > token_budget:
+                dropped_budget += 1
+                continue
+
+            chunks.append(text)
+            chunk_ids.append(ids[pick])
+            used += cost
+            max_sim = np.maximum(max_sim, similarity[pick])
+
+        pack_span.add("chunks_packed", len(chunks))
+        pack_span.add("context_tokens", used)
+        pack_span.add("chunks_dropped_duplicate", dropped_duplicates)
+        pack_span.add("chunks_dropped_budget", dropped_budget)
+
+    return PackedContext(chunks, chunk_ids, used, dropped_duplicates, dropped_budget)
@@ -2,60 +2,436 @@
 embedding_generator.py
 
 This module provides utilities for generating embeddings from raw text using
-a SentenceTransformer model and saving the results into a CSV file.
+a SentenceTransformer model and saving the results into a binary vector store
+(see `vector_store.py`) or, for legacy callers, a CSV file.
 
-The generated CSV includes:
+`generate_embeddings_store` streams its input (one file or a directory of files),
+appends each encoded batch to the store as it is produced and checkpoints progress,
+so peak memory is bounded by the batch size and interrupted runs resume.
+
+Text is chunked with `chunker.iter_token_chunks`: whole sentences packed up to the
+embedding model's input length, so no chunk is truncated by the encoder. Each chunk's
+id, byte offsets in its source file and token count are stored as its metadata, and
+every run reports the tokens encoded and truncated. Passing `chunk_size` keeps the
+legacy fixed word-count chunks.
+
+Every stored chunk carries a content hash of its text, the model id and the chunking
+parameters. The model id includes the inference backend when it is not plain PyTorch
+(see `inference.py`), so vectors from different backends are never mixed in one
+store. `update_embeddings_store` uses these hashes to re-encode only new or
+changed chunks after the raw corpus changes, and compacts away chunks that disappeared.
+
+Both, and `generate_embeddings_csv`, also write a BM25 inverted index of the chunks next to
+the embeddings (see `bm25_index.py`), which retrieval fuses with the dense candidates.
+
+The legacy CSV includes:
 - `text`: the original chunk of text
 - `embedding`: a stringified list of the embedding vector
 
-Models used:
-- Embedding model: mixedbread-ai/mxbai-embed-large-v1
-- Reranker: cross-encoder/ms-marco-MiniLM-L-6-v2
+Models are loaded lazily through `models.py` on first use. The module attributes
+`embedding_model`, `reranker` and `device` are still available and trigger that load.
 """
 
-import torch
-import pandas as pd
+import hashlib
+import os
+import shutil
+
+import numpy as np
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer, CrossEncoder
 
-# Select GPU if available
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-print(f"[EmbeddingGenerator] Using device: {device}")
+from .bm25_index import BM25_FILE, BM25Index, bm25_path, build_bm25_index
+from .chunker import DEFAULT_OVERLAP_TOKENS, ChunkReport, iter_token_chunks, max_content_tokens, token_counter
+from .inference import encode_sorted
+from .models import EMBEDDING_MODEL_NAME, get_device, get_embedding_model, get_reranker
+from .vector_store import StoreWriter, load_store
+
+# Encoder batches gathered per store commit; they are length-sorted together, so each
+# batch the encoder sees pads to similar lengths
+SORT_BATCHES = 8
+
+# Legacy module attributes, resolved lazily (PEP 562) so importing this module loads nothing
+_LAZY_ATTRS = {
+    "embedding_model": get_embedding_model,
+    "reranker": get_reranker,
+    "device": get_device,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _chunking(embedding_model, chunk_size: int = None, max_tokens: int = None,
+              overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> dict:
+    # Parameters that define the chunks; part of the resume check and of every chunk hash
+    if chunk_size is not None:
+        return {"chunk_size": chunk_size}
+    return {"max_tokens": max_tokens or max_content_tokens(embedding_model), "overlap_tokens": overlap_tokens}
+
+def _model_id(embedding_model) -> str:
+    # Backend-qualified id set by `inference.load_embedding_model`; stand-ins declare their own
+    return getattr(embedding_model, "model_id", None) or EMBEDDING_MODEL_NAME
+
+def _chunking_key(chunking: dict):
+    # Legacy word chunks keep their original hashes
+    if "chunk_size" in chunking:
+        return chunking["chunk_size"]
+    return f"tokens:{chunking['max_tokens']}:{chunking['overlap_tokens']}"
+
+def _iter_source_chunks(path: str, source: str, chunking: dict, count_tokens, start: tuple = (0, 0)):
+    # (text, metadata, tokens, position) of every chunk of a file, with either chunker;
+    # legacy word chunks are not token-counted here (tokens is None)
+    if "chunk_size" in chunking:
+        for text, position in iter_chunks(path, chunking["chunk_size"], start=start):
+            yield text, {}, None, position
+    else:
+        for chunk, position in iter_token_chunks(path, chunking["max_tokens"], chunking["overlap_tokens"],
+                                                 count_tokens=count_tokens, source=source, start=start):
+            yield chunk.text, chunk.metadata(), chunk.tokens, position
+
+def _file_stamps(files: list) -> list:
+    # [size, mtime] of every input file; part of the resume check, so a store is never
+    # resumed (or returned as complete) after its input text was edited
+    stamps = []
+    for path in files:
+        st = os.stat(path)
+        stamps.append([st.st_size, st.st_mtime_ns])
+    return stamps
+
+def _count_missing(count_tokens, texts: list, tokens: list) -> list:
+    # Fills in token counts the chunker did not provide, in one tokenizer call
+    missing = [i for i, n in enumerate(tokens) if n is None]
+    if missing:
+        for i, n in zip(missing, count_tokens([texts[i] for i in missing])):
+            tokens[i] = n
+    return tokens
+
+def chunk_hash(text: str, model: str = EMBEDDING_MODEL_NAME, chunk_size=1000) -> str:
+    """
+    Content hash of a chunk: identical text, model and chunking always give the same vector.
+
+    Args:
+        text (str): The chunk text.
+        model (str): Embedding model id, qualified by its inference backend (e.g.
+            "<name>@int8") unless that is plain PyTorch.
+        chunk_size (int | str): The chunking parameters: words per chunk for legacy chunks,
+            or a key of the token chunker's settings.
+
+    Returns:
+        str: Hex BLAKE2b-128 digest.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{model}\x00{chunk_size}\x00".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def list_input_files(input_path: str) -> list:
+    """
+    Resolves the input of an ingest run into an ordered list of text files.
+
+    Args:
+        input_path (str): A `.txt` file, or a directory searched recursively for `.txt` files.
+
+    Returns:
+        list[str]: File paths in a stable (sorted) order.
+    """
+    if os.path.isfile(input_path):
+        return [input_path]
+
+    files = []
+    for root, _, names in os.walk(input_path):
+        files.extend(os.path.join(root, n) for n in names if n.endswith('.txt'))
+    return sorted(files)
+
+def iter_chunks(text_file: str, chunk_size: int = 1000, start: tuple = (0, 0)):
+    """
+    Streams word chunks from a text file without reading it whole.
+
+    Words are split exactly like `str.split()`, so the chunks match the in-memory chunker.
+    Positions are (byte offset of a line, number of words of that line already consumed),
+    which lets an interrupted run restart right after the last committed chunk.
+
+    Args:
+        text_file (str): Path to the input `.txt` file.
+        chunk_size (int): Number of words per text chunk. Default is 1000.
+        start (tuple[int, int]): Position to resume from. Default is the start of the file.
+
+    Yields:
+        tuple[str, tuple[int, int]]: The chunk text and the position just after it.
+    """
+    line_offset, skip = start
+    words, position = [], start
+
+    with open(text_file, 'rb') as f:
+        f.seek(line_offset)
+        for raw_line in f:
+            line_words = raw_line.decode('utf-8', errors='replace').split()
+            for j in range(skip, len(line_words)):
+                words.append(line_words[j])
+                if len(words) == chunk_size:
+                    yield ' '.join(words), (line_offset, j + 1)
+                    words = []
+            position = (line_offset + len(raw_line), 0)
+            line_offset, skip = position[0], 0
 
-# Load models
-embedding_model = SentenceTransformer('mixedbread-ai/mxbai-embed-large-v1', device=device)
-reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', device=device)
+    if words:
+        yield ' '.join(words), position
 
-def generate_embeddings_csv(text_file: str, csv_file: str, chunk_size: int = 1000, batch_size: int = 32) -> None:
+def generate_embeddings_store(input_path: str, store_dir: str, chunk_size: int = None,
+                              batch_size: int = 32, dtype: str = "float32", resume: bool = True,
+                              max_tokens: int = None, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> str:
+    """
+    Streams a text file or a directory of text files into a binary vector store.
+
+    Input is read incrementally, chunked on the fly and encoded in batches, sorted by length
+    over `SORT_BATCHES` batches at a time. Each group is appended to the store and committed
+    together with a checkpoint, so peak memory is bounded by the batch size and an
+    interrupted run resumes after the last commit.
+    The run's token report (see `chunker.ChunkReport`) is printed and saved in the final
+    checkpoint.
+
+    Args:
+        input_path (str): Path to an input `.txt` file or a directory of them.
+        store_dir (str): Path to the output store directory.
+        chunk_size (int): Legacy fixed number of words per chunk. Default (None) packs whole
+            sentences up to `max_tokens` tokens instead.
+        batch_size (int): Batch size for embedding computation. Default is 32.
+        dtype (str): On-disk dtype, "float32" or "float16". Default is "float32".
+        resume (bool): Continue from the store's checkpoint if one exists. Default is True.
+        max_tokens (int): Tokens per chunk. Defaults to the embedding model's input length.
+        overlap_tokens (int): Tokens of trailing sentences repeated in the next chunk. Default is 64.
+
+    Returns:
+        str: The store directory, with its BM25 index (`bm25.npz`) once complete.
+
+    Raises:
+        ValueError: If resuming a store that was started with different inputs or chunking (an
+            input file's size or modification time changed), or a non-empty store with no checkpoint.
+    """
+    files = list_input_files(input_path)
+    root = input_path if os.path.isdir(input_path) else os.path.dirname(input_path)
+    sources = [os.path.relpath(f, root) for f in files]
+
+    embedding_model = get_embedding_model()
+    model_id = _model_id(embedding_model)
+    chunking = _chunking(embedding_model, chunk_size, max_tokens, overlap_tokens)
+    hash_key = _chunking_key(chunking)
+    params = dict(chunking, sources=sources, stamps=_file_stamps(files))
+    count_tokens = token_counter(embedding_model)
+    report = ChunkReport(max_content_tokens(embedding_model))
+
+    writer = StoreWriter(store_dir, model_id, embedding_model.get_sentence_embedding_dimension(),
+                         dtype=dtype, normalized=True, resume=resume)
+
+    if writer.checkpoint is None and writer.count:
+        raise ValueError(f"Cannot resume {store_dir}: it holds {writer.count} chunks but no checkpoint. "
+                         "Pass resume=False to rebuild it, or use update_embeddings_store.")
+    checkpoint = writer.checkpoint or {"params": params, "file_index": 0, "position": [0, 0], "complete": False}
+    if checkpoint["params"] != params:
+        raise ValueError(f"Cannot resume {store_dir}: it was started with different inputs or chunking. "
+                         "Pass resume=False to rebuild it.")
+    if checkpoint["complete"]:
+        if not os.path.exists(os.path.join(store_dir, BM25_FILE)):
+            build_bm25_index(store_dir)
+        return store_dir
+
+    batch, batch_meta, batch_tokens = [], [], []
+    progress = tqdm(desc="Encoding chunks", unit="chunk", initial=writer.count)
+
+    def flush(next_checkpoint):
+        for n in _count_missing(count_tokens, batch, batch_tokens):
+            report.add(n)
+        if next_checkpoint["complete"]:
+            next_checkpoint["report"] = report.to_dict()
+        vectors = encode_sorted(embedding_model, batch, batch_size, normalize_embeddings=True)
+        writer.append(batch, vectors, metadata=batch_meta, checkpoint=next_checkpoint)
+        progress.update(len(batch))
+        batch.clear()
+        batch_meta.clear()
+        batch_tokens.clear()
+
+    for file_index in range(checkpoint["file_index"], len(files)):
+        start = tuple(checkpoint["position"]) if file_index == checkpoint["file_index"] else (0, 0)
+        for chunk, meta, tokens, position in _iter_source_chunks(files[file_index], sources[file_index],
+                                                                 chunking, count_tokens, start=start):
+            batch.append(chunk)
+            batch_meta.append(dict(meta, source=sources[file_index],
+                                   hash=chunk_hash(chunk, model_id, hash_key)))
+            batch_tokens.append(tokens)
+            if len(batch) == batch_size * SORT_BATCHES:
+                flush({"params": params, "file_index": file_index,
+                       "position": list(position), "complete": False})
+
+    final = {"params": params, "file_index": len(files), "position": [0, 0], "complete": True}
+    if batch:
+        flush(final)
+    else:
+        final["report"] = report.to_dict()
+        writer.append([], np.empty((0, writer.manifest["dim"])), checkpoint=final)
+    progress.close()
+    print(f"[EmbeddingGenerator] {report}.")
+
+    # The lexical index is rebuilt from the finished store, so resumed runs index every chunk
+    build_bm25_index(store_dir)
+    return store_dir
+
+def update_embeddings_store(input_path: str, store_dir: str, chunk_size: int = None,
+                            batch_size: int = 32, dtype: str = "float32",
+                            max_tokens: int = None, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> dict:
+    """
+    Re-embeds only the chunks whose content hash is not already in the store.
+
+    The new store is written next to the old one and swapped in at the end, so a failed
+    run leaves the old store untouched. Vectors of unchanged chunks are copied from the old
+    store; chunks that no longer exist in the input are compacted away. Any ANN index must
+    be rebuilt afterwards with `ann_index.build_index`; the BM25 index is rebuilt here.
+
+    Args:
+        input_path (str): Path to an input `.txt` file or a directory of them.
+        store_dir (str): Store directory to update (created if missing).
+        chunk_size (int): Legacy fixed number of words per chunk. Default (None) packs whole
+            sentences up to `max_tokens` tokens instead.
+        batch_size (int): Batch size for embedding computation. Default is 32.
+        dtype (str): On-disk dtype, "float32" or "float16". Default is "float32".
+        max_tokens (int): Tokens per chunk. Defaults to the embedding model's input length.
+        overlap_tokens (int): Tokens of trailing sentences repeated in the next chunk. Default is 64.
+
+    Returns:
+        dict: Counts of `reused`, `encoded`, `removed` and `total` chunks, and the
+            `tokens_encoded` / `tokens_truncated` of the chunks encoded in this run.
+    """
+    files = list_input_files(input_path)
+    root = input_path if os.path.isdir(input_path) else os.path.dirname(input_path)
+
+    embedding_model = get_embedding_model()
+    model_id = _model_id(embedding_model)
+
+    old_rows, old_hashes = {}, []
+    old_count = 0
+    if os.path.exists(os.path.join(store_dir, "manifest.json")):
+        old = load_store(store_dir)
+        old_count = len(old)
+        # Vectors of another model or backend are re-encoded, never reused
+        if old.model == model_id:
+            old_hashes = [old.metadata(i).get("hash") for i in range(old_count)]
+            for i, digest in enumerate(old_hashes):
+                if digest is not None:
+                    old_rows.setdefault(digest, i)
+
+    chunking = _chunking(embedding_model, chunk_size, max_tokens, overlap_tokens)
+    hash_key = _chunking_key(chunking)
+    count_tokens = token_counter(embedding_model)
+    tokens_report = ChunkReport(max_content_tokens(embedding_model))
+
+    tmp_dir = store_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    writer = StoreWriter(tmp_dir, model_id, embedding_model.get_sentence_embedding_dimension(),
+                         dtype=dtype, normalized=True)
+
+    report = {"reused": 0, "encoded": 0, "removed": 0, "total": 0}
+    reused_hashes = set()
+    batch, batch_meta, batch_tokens = [], [], []
+
+    def flush():
+        vectors = np.empty((len(batch), writer.manifest["dim"]), dtype=np.float32)
+        missing = []
+        for i, meta in enumerate(batch_meta):
+            row = old_rows.get(meta["hash"])
+            if row is None:
+                missing.append(i)
+            else:
+                vectors[i] = old.embeddings[row]
+                reused_hashes.add(meta["hash"])
+        if missing:
+            texts = [batch[i] for i in missing]
+            for n in _count_missing(count_tokens, texts, [batch_tokens[i] for i in missing]):
+                tokens_report.add(n)
+            vectors[missing] = encode_sorted(embedding_model, texts, batch_size, normalize_embeddings=True)
+        writer.append(batch, vectors, metadata=batch_meta)
+        report["encoded"] += len(missing)
+        report["reused"] += len(batch) - len(missing)
+        batch.clear()
+        batch_meta.clear()
+        batch_tokens.clear()
+
+    for path in tqdm(files, desc="Updating store", unit="file"):
+        source = os.path.relpath(path, root)
+        for chunk, meta, tokens, _ in _iter_source_chunks(path, source, chunking, count_tokens):
+            batch.append(chunk)
+            batch_meta.append(dict(meta, source=source, hash=chunk_hash(chunk, model_id, hash_key)))
+            batch_tokens.append(tokens)
+            if len(batch) == batch_size * SORT_BATCHES:
+                flush()
+    if batch:
+        flush()
+    build_bm25_index(tmp_dir)
+
+    # Swap the compacted store in; the old directory is removed only after the swap
+    backup_dir = store_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.rename(store_dir, backup_dir)
+    os.rename(tmp_dir, store_dir)
+    shutil.rmtree(backup_dir, ignore_errors=True)
+
+    report["total"] = writer.count
+    # Old chunks are removed unless their content is still present; duplicates share one hash
+    report["removed"] = old_count - sum(digest in reused_hashes for digest in old_hashes)
+    report["tokens_encoded"] = tokens_report.tokens_encoded
+    report["tokens_truncated"] = tokens_report.tokens_truncated
+    print(f"[EmbeddingGenerator] {report['reused']} chunks reused, {report['encoded']} encoded, "
+          f"{report['removed']} removed ({report['total']} total); {tokens_report}.")
+    return report
+
+def generate_embeddings_csv(text_file: str, csv_file: str, chunk_size: int = None, batch_size: int = 32,
+                            max_tokens: int = None, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> dict:
     """
     Generates sentence embeddings from a text file and saves them into a CSV.
+    Kept for legacy callers; prefer `generate_embeddings_store`.
+
+    The chunks' BM25 index is written next to the CSV as `<name>.bm25.npz`.
 
     Args:
         text_file (str): Path to the input `.txt` file.
         csv_file (str): Path to the output `.csv` file.
-        chunk_size (int): Number of words per text chunk. Default is 1000.
+        chunk_size (int): Legacy fixed number of words per chunk. Default (None) packs whole
+            sentences up to `max_tokens` tokens instead.
         batch_size (int): Batch size for embedding computation. Default is 32.
+        max_tokens (int): Tokens per chunk. Defaults to the embedding model's input length.
+        overlap_tokens (int): Tokens of trailing sentences repeated in the next chunk. Default is 64.
+
+    Returns:
+        dict: The run's token report (see `chunker.ChunkReport`).
     """
-    # Read text from file
-    with open(text_file, 'r', encoding='utf-8') as f:
-        text = f.read()
+    embedding_model = get_embedding_model()
+    chunking = _chunking(embedding_model, chunk_size, max_tokens, overlap_tokens)
+    count_tokens = token_counter(embedding_model)
+    report = ChunkReport(max_content_tokens(embedding_model))
 
-    # Split text into chunks
-    words = text.split()
-    chunks = [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+    chunks, metadata, tokens = [], [], []
+    for chunk, meta, n, _ in _iter_source_chunks(text_file, os.path.basename(text_file), chunking, count_tokens):
+        chunks.append(chunk)
+        metadata.append(meta)
+        tokens.append(n)
 
     embeddings = []
-    for i in tqdm(range(0, len(chunks), batch_size), desc="Encoding chunks"):
-        batch = chunks[i:i + batch_size]
-        batch_emb = embedding_model.encode(batch, normalize_embeddings=True, show_progress_bar=False)
-        embeddings.extend(batch_emb)
+    window = batch_size * SORT_BATCHES
+    for i in tqdm(range(0, len(chunks), window), desc="Encoding chunks"):
+        batch = chunks[i:i + window]
+        for n in _count_missing(count_tokens, batch, tokens[i:i + window]):
+            report.add(n)
+        embeddings.extend(encode_sorted(embedding_model, batch, batch_size, normalize_embeddings=True))
 
-    # Prepare data for CSV
+    # Prepare data for CSV; chunk ids and source offsets are kept next to the text
     data = [
-        {'text': chunk, 'embedding': ','.join(map(str, emb))}
-        for chunk, emb in zip(chunks, embeddings)
+        dict(meta, text=chunk, embedding=','.join(map(str, emb)))
+        for chunk, meta, emb in zip(chunks, metadata, embeddings)
     ]
 
     # Write to CSV
+    import pandas as pd
     df = pd.DataFrame(data)
-    df.to_csv(csv_file, index=False)
\ No newline at end of file
+    df.to_csv(csv_file, index=False)
+    BM25Index.build(chunks).save(bm25_path(csv_file))
+    print(f"[EmbeddingGenerator] {report}.")
+    return report.to_dict()
@@ -0,0 +1,332 @@
+"""
+evaluation.py
+
+Batch evaluation of the answer systems with the AIA-1 judge (`judge_texts.judge`).
+
+For every query of a query set, `run_evaluation`:
+1. Generates the four systems' answers concurrently (at most `max_workers` system calls
+   in flight across all queries).
+2. Shuffles the answers into T1–T4 with a seed derived from the run seed and the query,
+   and records the order, so the judge never sees which system wrote what.
+3. Calls `judge` (at most `judge_concurrency` calls in flight) and parses its ratings
+   back into per-system scores.
+4. Appends the query's record to a JSONL checkpoint as soon as it is finished.
+
+Re-running with the same checkpoint skips the queries already judged, so an interrupted
+sweep resumes where it stopped; queries that failed are retried. `score_table` flattens
+the records into one row per (query, system) and `summarize` averages them per system.
+
+Usage:
+    python -m main.evaluation queries.txt --store embedding_store --out eval.jsonl --seed 0
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .judge_texts import judge
+
+logger = logging.getLogger(__name__)
+
+LABELS = ("T1", "T2", "T3", "T4")
+
+_SCORE_RE = re.compile(r"Text\s*([1-4])\s*\(T[1-4]\)\W*?(\d+(?:\.\d+)?)\s*/\s*10")
+_VERDICT_RE = re.compile(r"\*\*Verdict:\*\*\s*(.+)")
+
+
+def query_id(query: str) -> str:
+    """Stable id of a query, used as its checkpoint key and shuffle seed."""
+    return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()[:12]
+
+
+def load_queries(path: str) -> list:
+    """
+    Reads a query set.
+
+    Args:
+        path (str): A `.json` list, a `.jsonl` file (strings or objects with a `query`
+            field), or a text file with one query per line.
+
+    Returns:
+        list[str]: The queries, in file order, without blanks or repeats.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Query set not found: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".json"):
+            items = json.load(f)
+        elif path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = f.read().splitlines()
+    queries = [item["query"] if isinstance(item, dict) else item for item in items]
+    return list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+
+
+def parse_scores(judgement: str) -> dict:
+    """
+    Parses the ratings out of an AIA-1 adjudication.
+
+    Returns:
+        dict: `label -> score` (e.g. `{"T1": 7.0, ...}`); labels the judge did not rate are None.
+    """
+    scores = dict.fromkeys(LABELS)
+    for number, score in _SCORE_RE.findall(judgement or ""):
+        label = f"T{number}"
+        if scores[label] is None:
+            scores[label] = float(score)
+    return scores
+
+
+def shuffle_order(systems: list, seed: int, qid: str) -> list:
+    """Returns the systems in their T1–T4 order for a query; the same seed and query give the same order."""
+    order = list(systems)
+    random.Random(f"{seed}:{qid}").shuffle(order)
+    return order
+
+
+def default_systems(store="embedding_store") -> dict:
+    """
+    The four systems compared in the paper, as `name -> callable(query) -> answer`.
+
+    - `kg`: the routed KG(s) as the only context (`kg_query`)
+    - `rq_rag`: multi-hop RAG (`rag_rq`)
+    - `hybrid`: KG-guided query decomposition (`hybrid`)
+    - `baseline`: the LLM without any context
+
+    Args:
+        store: Vector store directory (or `VectorStore`) used by the RAG systems.
+    """
+    from . import hybrid
+    from .kg_query import give_query_answer_kg
+    from .llm_client import give_answer
+    from .models import get_embedding_model
+    from .rag_rq import give_query_answer_rag_multihop
+    from .vector_store import as_vector_store
+
+    store = as_vector_store(store)
+
+    def kg_only(query: str) -> str:
+        kg_registry = hybrid._registry()
+        names = kg_registry.route(query, embedding_model=get_embedding_model())
+        data = json.dumps(kg_registry.kg_for(names).to_dict(), indent=2, ensure_ascii=False) if names else ""
+        return give_query_answer_kg(query, data)
+
+    return {
+        "kg": kg_only,
+        "rq_rag": lambda query: give_query_answer_rag_multihop(query, store),
+        "hybrid": lambda query: str(hybrid.hybrid_kg_rag_pipeline(query, store)),
+        "baseline": give_answer,
+    }
+
+
+def read_checkpoint(path: str) -> dict:
+    """
+    Reads the finished records of a checkpoint.
+
+    Returns:
+        dict: `query id -> record` for queries that were judged without error. A torn last
+            line (from an interrupted write) is ignored.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("error") is None:
+                records[record["id"]] = record
+    return records
+
+
+class _Checkpoint:
+    # Appends one record per line; each write is flushed to disk before the next query is reported done
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def run_evaluation(queries: list, checkpoint_path: str, systems: dict = None, store="embedding_store",
+                   seed: int = 0, max_workers: int = 8, judge_concurrency: int = 4, judge_fn=judge) -> list:
+    """
+    Answers and judges a query set, checkpointing every finished query.
+
+    Args:
+        queries (list[str]): The query set.
+        checkpoint_path (str): JSONL file records are appended to; existing finished records
+            are reused.
+        systems (dict): Exactly four `name -> callable(query) -> answer` systems.
+            Defaults to `default_systems(store)`.
+        store: Vector store for the default systems.
+        seed (int): Run seed for the T1–T4 shuffles. Recorded in every record.
+        max_workers (int): Maximum system calls in flight. Default is 8.
+        judge_concurrency (int): Maximum judge calls in flight. Default is 4.
+        judge_fn: Judge with the signature of `judge_texts.judge`.
+
+    Returns:
+        list[dict]: One record per distinct query (by `query_id`), in query order: `id`, `query`, `seed`, `order`
+            (system of T1..T4), `answers`, `judgement`, `scores` (`system -> score`),
+            `verdict`, `seconds`, and `error` if the query failed.
+
+    Raises:
+        ValueError: If there are not exactly four systems.
+    """
+    systems = systems if systems is not None else default_systems(store)
+    if len(systems) != len(LABELS):
+        raise ValueError(f"The judge compares exactly {len(LABELS)} systems, got {len(systems)}.")
+
+    # Queries differing only in whitespace share an id, so only the first of them is evaluated
+    unique = {}
+    for query in queries:
+        unique.setdefault(query_id(query), query)
+    queries = list(unique.values())
+    done = read_checkpoint(checkpoint_path)
+    todo = [q for q in queries if query_id(q) not in done]
+    logger.info("Evaluating %d queries (%d already in %s).", len(todo), len(queries) - len(todo), checkpoint_path)
+
+    checkpoint = _Checkpoint(checkpoint_path)
+    judge_slots = threading.Semaphore(max(1, judge_concurrency))
+    results = dict(done)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as answer_pool:
+
+        def evaluate(query: str) -> dict:
+            qid = query_id(query)
+            start = time.perf_counter()
+            order = shuffle_order(systems, seed, qid)
+            record = {"id": qid, "query": query, "seed": seed, "order": order}
+
+            futures = {name: answer_pool.submit(fn, query) for name, fn in systems.items()}
+            answers, errors = {}, {}
+            for name, future in futures.items():
+                try:
+                    answers[name] = str(future.result())
+                except Exception as e:
+                    errors[name] = f"{type(e).__name__}: {e}"
+            record["answers"] = answers
+
+            if errors:
+                record["error"] = errors
+            else:
+                try:
+                    with judge_slots:
+                        judgement = judge_fn(*(answers[name] for name in order), query)
+                    labelled = parse_scores(judgement)
+                    record["judgement"] = judgement
+                    record["scores"] = {name: labelled[label] for label, name in zip(LABELS, order)}
+                    verdict = _VERDICT_RE.search(judgement or "")
+                    record["verdict"] = verdict.group(1).strip() if verdict else None
+                    if any(score is None for score in record["scores"].values()):
+                        record["error"] = "Could not parse every score from the judgement."
+                except Exception as e:
+                    record["error"] = f"judge: {type(e).__name__}: {e}"
+
+            record["seconds"] = round(time.perf_counter() - start, 3)
+            checkpoint.write(record)
+            if record.get("error") is not None:
+                logger.warning("Query %s failed: %s", qid, record["error"])
+            else:
+                logger.info("Query %s judged: %s", qid, record["scores"])
+            return record
+
+        # Query workers mostly wait on the answer pool and the judge slots
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as query_pool:
+            for record in query_pool.map(evaluate, todo):
+                results[record["id"]] = record
+
+    return [results[query_id(q)] for q in queries]
+
+
+def score_table(records, table_path: str = None) -> list:
+    """
+    Flattens evaluation records into one row per (query, system).
+
+    Args:
+        records (list[dict] | str): Records from `run_evaluation`, or a checkpoint path.
+        table_path (str): Optional CSV file to write the rows to.
+
+    Returns:
+        list[dict]: Rows with `id`, `query`, `system`, `label` (T1..T4), `score` and `seed`.
+    """
+    if isinstance(records, str):
+        records = list(read_checkpoint(records).values())
+    rows = [
+        {"id": r["id"], "query": r["query"], "system": name, "label": label,
+         "score": r["scores"].get(name), "seed": r["seed"]}
+        for r in records if r.get("scores")
+        for label, name in zip(LABELS, r["order"])
+    ]
+    if table_path:
+        with open(table_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=["id", "query", "system", "label", "score", "seed"])
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+
+def summarize(rows: list) -> dict:
+    """
+    Averages score-table rows per system.
+
+    Returns:
+        dict: `system -> {"mean", "n", "wins"}`; a query's best score counts as a win for every
+            system that reached it.
+    """
+    by_query = {}
+    for row in rows:
+        if row["score"] is not None:
+            by_query.setdefault(row["id"], {})[row["system"]] = row["score"]
+
+    summary = {}
+    for scores in by_query.values():
+        best = max(scores.values())
+        for system, score in scores.items():
+            entry = summary.setdefault(system, {"total": 0.0, "n": 0, "wins": 0})
+            entry["total"] += score
+            entry["n"] += 1
+            entry["wins"] += score == best
+    return {system: {"mean": e["total"] / e["n"], "n": e["n"], "wins": e["wins"]}
+            for system, e in sorted(summary.items())}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .tracing import enable_logging
+
+    parser = argparse.ArgumentParser(description="Answer and judge a query set with the four systems.")
+    parser.add_argument("queries", help="Query set (.txt one per line, .json list or .jsonl)")
+    parser.add_argument("--store", default="embedding_store", help="Vector store directory")
+    parser.add_argument("--out", default="evaluation.jsonl", help="JSONL checkpoint / results file")
+    parser.add_argument("--table", default=None, help="Also write the score table to this CSV")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8, help="Maximum system calls in flight")
+    parser.add_argument("--judge-workers", type=int, default=4, help="Maximum judge calls in flight")
+    args = parser.parse_args()
+
+    enable_logging()
+    records = run_evaluation(load_queries(args.queries), args.out, store=args.store, seed=args.seed,
+                             max_workers=args.workers, judge_concurrency=args.judge_workers)
+    print(json.dumps(summarize(score_table(records, table_path=args.table)), indent=2))
@@ -3,18 +3,92 @@ main/hybrid.py
 
 Implements a Hybrid KG-RAG pipeline using structured knowledge graphs and RAG-based retrieval.
 The core function `hybrid_kg_rag_pipeline` synthesizes answers from both sources.
+
+With `stream_sub_queries=True`, the sub-query completion is consumed as a token stream:
+each sub-query is parsed out as soon as its list item closes and handed to a retrieval
+worker, which encodes, searches and reranks whatever has arrived so far in one batch.
+Retrieval then runs while the LLM is still generating the remaining sub-queries.
+
+With an answer cache (`answer_cache` below, or `ANSWER_CACHE_SIZE`), a query that closely
+matches an earlier one is answered from the cache right after KG routing, provided the
+same KGs were selected and neither they nor the corpus have changed since.
+
+With `structured_triples=True`, the KG facts are read with indexed pattern queries over an
+RDF graph of every registered KG (`kg_graph.py`) instead of the KG-extraction prompt; the
+facts then also include the items (aiding countries, agencies, ...) the routed events share.
 """
 
+import ast
+import contextvars
 import json
+import logging
+import queue
 import re
-from .llm_client import give_answer
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import tracing
+from .ann_index import open_index, open_subset_index
+from .answer_cache import answer_version, get_answer_cache
+from .bm25_index import open_bm25_index
+from .context_packer import DEFAULT_CONTEXT_TOKENS, pack_context
+from .kg_registry import KGRegistry
+from .llm_client import get_model, give_answer, give_answer_stream
+from .models import get_embedding_model
+from .rerank_service import get_rerank_service
+from .retrieval import batch_retrieve_indices, search_candidates
+from .tracing import PipelineResult
+from .triple_index import get_triple_index
+from .vector_store import as_vector_store
+
+logger = logging.getLogger(__name__)
 
 # These will be injected later from run.py after loading
+# (nested dicts, CompiledKG objects from `kg_store.load_kg`, or KG file paths)
 usedataNEP = None
 usedataKER = None
 embedding_model = None
 reranker = None
 
+# Optional KGRegistry injected by the caller. Without one, the injected KGs above are
+# registered, or, if none were injected, the KGs in data/kg
+registry = None
+_default_registry = None
+
+# Optional AnswerCache injected by the caller; without one, the process-wide cache is used
+# if ANSWER_CACHE_SIZE enables it
+answer_cache = None
+
+LEGACY_KG_NAMES = {"nepal_earthquake_2015": ["nepal"], "kerala_floods_2018": ["kerala"]}
+
+def _models():
+    # Injected models win; otherwise fall back to the lazily loaded shared ones
+    return (embedding_model if embedding_model is not None else get_embedding_model(),
+            reranker if reranker is not None else get_rerank_service())
+
+def _registry() -> KGRegistry:
+    global _default_registry
+    if registry is not None:
+        return registry
+
+    injected = dict(zip(LEGACY_KG_NAMES, (usedataNEP, usedataKER)))
+    key = tuple(id(kg) for kg in injected.values())
+    if _default_registry is None or _default_registry[0] != key:
+        if any(kg is not None for kg in injected.values()):
+            kg_registry = KGRegistry()
+            for name, kg in injected.items():
+                if kg is not None:
+                    kg_registry.register(name, kg, aliases=LEGACY_KG_NAMES[name])
+        else:
+            kg_registry = KGRegistry.from_directory()
+        _default_registry = (key, kg_registry)
+    return _default_registry[1]
+
+def _answer_cache():
+    return answer_cache if answer_cache is not None else get_answer_cache()
+
 def flatten_kg(d, parent_key='', sep='.'):  # used to flatten JSON KGs
     items = []
     for k, v in d.items():
@@ -25,24 +99,47 @@ def flatten_kg(d, parent_key='', sep='.'):  # used to flatten JSON KGs
             items.append((new_key, v))
     return dict(items)
 
-def retrieve_from_rag(query: str, df, k: int = 10, m: int = 3):
-    embeddings = df['embedding'].apply(lambda emb: np.array(emb.split(','), dtype=np.float32)).tolist()
-    embeddings = np.stack(embeddings)
-
-    query_embedding = embedding_model.encode([query], normalize_embeddings=True)[0]
-    similarities = np.dot(embeddings, query_embedding)
-
-    top_k_indices = np.argsort(similarities)[::-1][:k]
-    top_k_texts = df.iloc[top_k_indices]['text'].tolist()
+def retrieve_from_rag(query: str, store, k: int = 10, m: int = 3):
+    # `store` may be a VectorStore, a store directory or a legacy embeddings DataFrame
+    store = as_vector_store(store)
+
+    encoder, cross_encoder = _models()
+    with tracing.span("encode"):
+        query_embedding = encoder.encode([query], normalize_embeddings=True)
+    # Never retrieve more candidates than the reranker accepts in one request
+    max_pairs = getattr(cross_encoder, "max_pairs", None)
+    if max_pairs is not None:
+        k = max(1, min(k, max_pairs))
+    # Dense candidates, fused with BM25 ones when the store has a lexical index
+    top_k_indices = search_candidates([query], query_embedding, open_index(store), k,
+                                      sparse_index=open_bm25_index(store))
+    top_k_texts = store.texts(top_k_indices[0])
 
     pairs = [(query, text) for text in top_k_texts]
-    scores = reranker.predict(pairs)
+    with tracing.span("rerank") as rerank_span:
+        rerank_span.add("pairs_reranked", len(pairs))
+        scores = cross_encoder.predict(pairs)
 
     sorted_indices = np.argsort(scores)[::-1]
     top_m_texts = [top_k_texts[i] for i in sorted_indices[:m]]
 
     return top_m_texts
 
+def retrieve_hits_batched(queries: list, store, k: int = 10, m: int = 3, chunk_ids=None):
+    # One encode, one matrix product and one union rerank for all sub-queries
+    # chunk_ids: restrict the search to these chunks (e.g. those of the routed events)
+    # Returns per-query (chunk index, rerank score) lists
+    encoder, cross_encoder = _models()
+    store = as_vector_store(store)
+    index = open_subset_index(store, chunk_ids) if chunk_ids is not None else None
+    return batch_retrieve_indices(queries, store, encoder, cross_encoder, k=k, m=m, index=index)
+
+def retrieve_from_rag_batched(queries: list, store, k: int = 10, m: int = 3, chunk_ids=None):
+    # Same as retrieve_hits_batched, but returns the chunk texts
+    store = as_vector_store(store)
+    return [store.texts([chunk_id for chunk_id, _ in hits])
+            for hits in retrieve_hits_batched(queries, store, k=k, m=m, chunk_ids=chunk_ids)]
+
 def extract_json_from_llm_output(llm_output_str: str):
     match = re.search(r"```(?:json)?\s*([\s\S]+?)\s*```", llm_output_str)
     clean_str = match.group(1) if match else llm_output_str
@@ -71,32 +168,116 @@ def extract_json_from_llm_output(llm_output_str: str):
     except (json.JSONDecodeError, IndexError):
         return None
 
-def hybrid_kg_rag_pipeline(initial_query: str, df_embeddings):
-    print("--- PIPELINE START ---")
-    print(f"Initial Query: '{initial_query}'\n")
-
-    target_kg_data = None
-    query_lower = initial_query.lower()
-
-    if "nepal" in query_lower and "kerala" in query_lower:
-        print("✅ KG Selected: Combined Nepal & Kerala KGs for comparison")
-        target_kg_data = {
-            "nepal_earthquake_2015": usedataNEP,
-            "kerala_floods_2018": usedataKER
-        }
-    elif "nepal" in query_lower:
-        print("✅ KG Selected: Nepal Earthquake KG")
-        target_kg_data = usedataNEP
-    elif "kerala" in query_lower:
-        print("✅ KG Selected: Kerala Floods KG")
-        target_kg_data = usedataKER
-    else:
-        print("❌ Could not determine target KG from query. Aborting.")
-        return
+def iter_list_items(pieces, transcript: list = None):
+    """
+    Yields the string items of the first list in a streamed LLM output as soon as each closes.
+
+    Double-quoted (JSON) and single-quoted (Python) items are accepted; text before the list,
+    such as a code fence, is skipped. If no item is found while streaming, the full output
+    is parsed with `extract_json_from_llm_output` at the end.
 
-    flat_kg = flatten_kg(target_kg_data)
+    Args:
+        pieces (iterable[str]): Consecutive pieces of the output (e.g. `give_answer_stream`).
+        transcript (list): Optional list that receives every piece, to recover the raw output.
 
-    kg_extraction_prompt = f"""
+    Yields:
+        str: The list items, in order.
+    """
+    text = ""
+    pos, depth, quote, escape, start = 0, 0, None, False, 0
+    found = False
+    for piece in pieces:
+        if transcript is not None:
+            transcript.append(piece)
+        text += piece
+        while pos < len(text) and depth >= 0:
+            ch = text[pos]
+            if quote is not None:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == quote:
+                    quote = None
+                    if depth == 1:
+                        literal = text[start:pos + 1]
+                        try:
+                            item = json.loads(literal) if literal[0] == '"' else ast.literal_eval(literal)
+                        except (ValueError, SyntaxError):
+                            item = None
+                        if isinstance(item, str) and item.strip():
+                            found = True
+                            yield item
+            elif depth >= 1 and ch in "\"'":
+                quote, start = ch, pos
+            elif ch == '[':
+                depth += 1
+            elif ch == ']' and depth >= 1:
+                depth -= 1
+                if depth == 0:
+                    # The list is complete; the rest of the stream is only drained
+                    depth = -1
+            pos += 1
+
+    if not found:
+        parsed = extract_json_from_llm_output(text)
+        if isinstance(parsed, list):
+            yield from (item for item in parsed if isinstance(item, str) and item.strip())
+
+_END = object()
+
+def retrieve_streamed(sub_queries, store, k: int = 10, m: int = 3, chunk_ids=None) -> tuple:
+    """
+    Retrieves sub-queries while they are still being generated.
+
+    A single worker thread takes every sub-query that has arrived since its last batch and
+    retrieves them together (one encode, one search, one rerank), so batches grow when the
+    generator is faster than retrieval and retrieval starts as soon as the first item is out.
+
+    Args:
+        sub_queries (iterable[str]): Sub-queries, e.g. from `iter_list_items`.
+        store: The vector store.
+        k (int): Dense candidates per sub-query.
+        m (int): Reranked chunks kept per sub-query.
+        chunk_ids: Restrict the search to these chunks.
+
+    Returns:
+        tuple[list[str], list[list[tuple[int, float]]]]: The sub-queries in arrival order and
+            their (chunk index, rerank score) hits.
+    """
+    store = as_vector_store(store)
+    arrivals = queue.Queue()
+    received, hits = [], []
+
+    def worker():
+        done = False
+        while not done:
+            batch = [arrivals.get()]
+            while True:
+                try:
+                    batch.append(arrivals.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _END:
+                batch.pop()
+                done = True
+            if batch:
+                hits.extend(retrieve_hits_batched(batch, store, k=k, m=m, chunk_ids=chunk_ids))
+                received.extend(batch)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # The copied context keeps the worker's encode/search/rerank spans in the caller's trace
+        future = pool.submit(contextvars.copy_context().run, worker)
+        try:
+            for sub_query in sub_queries:
+                arrivals.put(sub_query)
+        finally:
+            arrivals.put(_END)
+        future.result()
+    return received, hits
+
+def build_kg_extraction_prompt(initial_query: str, flat_kg: dict) -> str:
+    return f"""
     You are a data analyst specializing in knowledge graphs. Your task is to identify the 10 most relevant key-value pairs (triples) from the provided JSON data to answer the user's query.
 
     Return ONLY a valid JSON object containing the 10 selected key-value pairs. Do not add explanations, conversational text, or markdown code fences like ```json. The output format must be a raw, valid JSON object. Example: {{"key1": "value1", "key2": "value2"}}
@@ -107,21 +288,9 @@ def hybrid_kg_rag_pipeline(initial_query: str, df_embeddings):
     FLATTENED_KG_DATA:
     {json.dumps(flat_kg, indent=2)}
     """
-    extracted_triples_str = give_answer(kg_extraction_prompt)
-    extracted_triples = extract_json_from_llm_output(extracted_triples_str)
-
-    if extracted_triples is None:
-        print("\n❌ ERROR: Failed to parse/extract JSON from the LLM's KG extraction step.")
-        print("\n--- Raw LLM Output that caused the error ---")
-        print(extracted_triples_str)
-        print("------------------------------------------")
-        return
 
-    print("\n--- Step 1: KG Triple Extraction ---")
-    print("✅ Top 10 relevant triples extracted from KG:")
-    print(json.dumps(extracted_triples, indent=2))
-
-    sub_query_generation_prompt = f"""
+def build_sub_query_prompt(initial_query: str, extracted_triples) -> str:
+    return f"""
     You are a research assistant tasked with breaking down a complex question into smaller, searchable parts. Based on the original query and the key facts extracted from a knowledge graph, generate 15 specific, independent, and self-contained questions designed for a semantic search engine.
 
     The questions should be granular and directly related to the facts. Each question must be a full, standalone sentence. Return ONLY a Python list of strings.
@@ -133,33 +302,9 @@ def hybrid_kg_rag_pipeline(initial_query: str, df_embeddings):
     KEY_KG_FACTS:
     {json.dumps(extracted_triples, indent=2)}
     """
-    sub_queries_str = give_answer(sub_query_generation_prompt)
-    sub_queries = extract_json_from_llm_output(sub_queries_str)
-
-    if sub_queries is None:
-        print("\n❌ ERROR: Failed to parse/extract a list from the LLM's sub-query generation step.")
-        print("\n--- Raw LLM Output that caused the error ---")
-        print(sub_queries_str)
-        print("------------------------------------------")
-        return
-
-    print("\n--- Step 2: Sub-Query Generation ---")
-    print(f"✅ Generated {len(sub_queries)} independent sub-queries:")
-    for i, sq in enumerate(sub_queries):
-        print(f"  {i+1}. {sq}")
 
-    print("\n--- Step 3: Hybrid Retrieval ---")
-    print(f"✅ Performing RAG search for {len(sub_queries)} sub-queries to gather context...")
-
-    all_retrieved_context = set()
-    for sq in sub_queries:
-        retrieved_texts = retrieve_from_rag(sq, df_embeddings, k=10, m=5)
-        all_retrieved_context.update(retrieved_texts)
-
-    final_rag_context = "\n".join(all_retrieved_context)
-    print(f"✅ Retrieved {len(all_retrieved_context)} unique context chunks.")
-
-    final_synthesis_prompt = f"""
+def build_synthesis_prompt(initial_query: str, extracted_triples, final_rag_context: str) -> str:
+    return f"""
     You are an expert intelligence analyst and report writer. Your mission is to synthesize information from two sources—a structured Knowledge Graph (KG) and unstructured text from a Retrieval-Augmented Generation (RAG) system—to provide a comprehensive, detailed, and accurate answer to the user's question.
 
     **CRUCIAL INSTRUCTIONS:**
@@ -181,9 +326,160 @@ def hybrid_kg_rag_pipeline(initial_query: str, df_embeddings):
 
     Now, generate your expert, synthesized response.
     """
-    final_answer = give_answer(final_synthesis_prompt)
 
-    print("\n--- Step 4: Final Answer Synthesis ---")
-    print("✅ Final answer generated.")
-    print("\n--- FINAL HYBRID KG-RAG RESPONSE ---")
-    print(final_answer)
\ No newline at end of file
+def hybrid_kg_rag_pipeline(initial_query: str, df_embeddings, triple_preselect: int = None,
+                           fast_triples: bool = False, context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                           trim_sentences: bool = False, stream_sub_queries: bool = False,
+                           use_cache: bool = True, structured_triples: bool = False) -> PipelineResult:
+    # triple_preselect: send only the top-N locally ranked triples to the KG-extraction prompt
+    # fast_triples: take the top 10 locally ranked triples directly, skipping that LLM call
+    # structured_triples: read the facts with pattern queries over the KG graph (kg_graph.py),
+    #   including items the routed events share, instead of the KG-extraction prompt
+    # context_tokens: token budget of the retrieved context in the synthesis prompt (None: no limit)
+    # trim_sentences: cut retrieved chunks to the sentences sharing terms with their sub-query
+    # stream_sub_queries: retrieve each sub-query as soon as the LLM has streamed it
+    # use_cache: look the query up in the answer cache, and store the new answer in it
+    # Returns a PipelineResult; progress is logged (see tracing.enable_logging), not printed.
+    # An answer reused from the cache has its provenance in `result.cache`
+    with tracing.span("hybrid_kg_rag_pipeline", query=initial_query, streamed=stream_sub_queries) as root:
+        result = PipelineResult(initial_query, trace=root)
+        _run_hybrid(result, df_embeddings, triple_preselect, fast_triples, context_tokens, trim_sentences,
+                    stream_sub_queries, _answer_cache() if use_cache else None, structured_triples)
+    return result
+
+def _fail(result: PipelineResult, message: str, raw_output: str) -> PipelineResult:
+    result.error = message
+    logger.info("ERROR: %s\n--- Raw LLM Output that caused the error ---\n%s", message, raw_output)
+    return result
+
+def _run_hybrid(result: PipelineResult, df_embeddings, triple_preselect: int, fast_triples: bool,
+                context_tokens: int, trim_sentences: bool, stream_sub_queries: bool = False, cache=None,
+                structured_triples: bool = False):
+    start = time.perf_counter()
+    initial_query = result.query
+    # Resolve the store once so every sub-query shares the same mapping
+    df_embeddings = as_vector_store(df_embeddings)
+
+    logger.info("--- PIPELINE START ---")
+    logger.info("Initial Query: '%s'", initial_query)
+
+    # Aliases in the query pick the KGs; otherwise the query is matched against KG descriptors
+    with tracing.span("kg_routing"):
+        kg_registry = _registry()
+        selected_kgs = kg_registry.route(initial_query, embedding_model=_models()[0])
+        if not selected_kgs:
+            result.error = "Could not determine target KG from query."
+            logger.info("Could not determine target KG from query. Aborting.")
+            return result
+
+        result.kgs = selected_kgs
+        logger.info("KG Selected: %s", ", ".join(selected_kgs))
+        target_kg_data = kg_registry.kg_for(selected_kgs)
+        event_chunk_ids = kg_registry.chunk_ids(selected_kgs, df_embeddings)
+
+    if cache is not None:
+        # Answers depend on the routed KGs, the corpus and the settings that shape the prompts
+        with tracing.span("answer_cache") as cache_span:
+            lookup_start = time.perf_counter()
+            query_embedding = np.asarray(_models()[0].encode([initial_query], normalize_embeddings=True),
+                                         dtype=np.float32)[0]
+            # Structured facts can come from any registered KG, through shared items
+            graph_kgs = [kg_registry[name].kg.digest for name in kg_registry.names] if structured_triples else None
+            version = answer_version(target_kg_data.digest, df_embeddings, model=get_model(),
+                                     triple_preselect=triple_preselect, fast_triples=bool(fast_triples),
+                                     context_tokens=context_tokens, trim_sentences=trim_sentences,
+                                     structured_triples=graph_kgs)
+            hit = cache.lookup(initial_query, query_embedding, selected_kgs, version,
+                               overhead_ms=(time.perf_counter() - lookup_start) * 1000)
+            cache_span.set(hit=hit is not None)
+        if hit is not None:
+            entry, similarity = hit
+            result.answer, result.triples = entry.answer, entry.triples
+            result.sub_queries, result.context = entry.sub_queries, entry.context
+            result.cache = entry.provenance(similarity)
+            logger.info("Answered from the cache (similarity %.3f to '%s').", similarity, entry.query)
+            return result
+
+    with tracing.span("kg_extraction", fast=bool(fast_triples), preselect=triple_preselect,
+                      structured=structured_triples):
+        # Compiled KGs keep their flattened view, so nothing is re-flattened per query
+        flat_kg = target_kg_data.flat()
+        extracted_triples = None
+
+        if structured_triples:
+            # rdflib is only imported when the graph is used
+            from .kg_graph import get_kg_graph
+
+            extracted_triples = get_kg_graph(kg_registry).select(initial_query, selected_kgs, n=10,
+                                                                 embedding_model=_models()[0]) or None
+            if extracted_triples is None:
+                logger.info("No KG attribute matches the query; falling back to the extraction prompt.")
+
+        if extracted_triples is None and (fast_triples or triple_preselect):
+            triple_index = get_triple_index(flat_kg, embedding_model=_models()[0], digest=target_kg_data.digest)
+
+        if extracted_triples is None and fast_triples:
+            extracted_triples = triple_index.select(initial_query, n=10)
+        elif extracted_triples is None:
+            if triple_preselect:
+                flat_kg = triple_index.select(initial_query, n=triple_preselect)
+            kg_extraction_prompt = build_kg_extraction_prompt(initial_query, flat_kg)
+            extracted_triples_str = give_answer(kg_extraction_prompt)
+            extracted_triples = extract_json_from_llm_output(extracted_triples_str)
+
+    if extracted_triples is None:
+        return _fail(result, "Failed to parse/extract JSON from the LLM's KG extraction step.",
+                     extracted_triples_str)
+
+    result.triples = extracted_triples
+    logger.info("--- Step 1: KG Triple Extraction ---\n%s", json.dumps(extracted_triples, indent=2))
+
+    sub_query_generation_prompt = build_sub_query_prompt(initial_query, extracted_triples)
+    if stream_sub_queries:
+        # Sub-query generation and retrieval overlap; both are traced in one stage
+        with tracing.span("subquery_generation_and_retrieval") as stream_span:
+            transcript = []
+            sub_queries, hits = retrieve_streamed(
+                iter_list_items(give_answer_stream(sub_query_generation_prompt), transcript),
+                df_embeddings, k=10, m=5, chunk_ids=event_chunk_ids,
+            )
+            stream_span.set(sub_queries=len(sub_queries))
+        if not sub_queries:
+            return _fail(result, "Failed to parse/extract a list from the LLM's sub-query generation step.",
+                         "".join(transcript))
+    else:
+        with tracing.span("subquery_generation"):
+            sub_queries_str = give_answer(sub_query_generation_prompt)
+            sub_queries = extract_json_from_llm_output(sub_queries_str)
+
+        if sub_queries is None:
+            return _fail(result, "Failed to parse/extract a list from the LLM's sub-query generation step.",
+                         sub_queries_str)
+
+    result.sub_queries = sub_queries
+    logger.info("--- Step 2: Sub-Query Generation ---\n%s",
+                "\n".join(f"  {i+1}. {sq}" for i, sq in enumerate(sub_queries)))
+
+    logger.info("--- Step 3: Hybrid Retrieval --- RAG search for %d sub-queries", len(sub_queries))
+    with tracing.span("retrieval", sub_queries=len(sub_queries)):
+        if not stream_sub_queries:
+            hits = retrieve_hits_batched(sub_queries, df_embeddings, k=10, m=5, chunk_ids=event_chunk_ids)
+        # Best chunks first, near-duplicates dropped, within the token budget
+        packed = pack_context(hits, df_embeddings, queries=sub_queries, token_budget=context_tokens,
+                              trim_sentences=trim_sentences)
+
+    result.context = packed.chunks
+    final_rag_context = packed.join("\n")
+    logger.info("Packed %d context chunks (~%d tokens); dropped %d near-duplicates, %d over budget.",
+                len(packed), packed.tokens, packed.dropped_duplicates, packed.dropped_budget)
+
+    with tracing.span("synthesis"):
+        final_synthesis_prompt = build_synthesis_prompt(initial_query, extracted_triples, final_rag_context)
+        result.answer = give_answer(final_synthesis_prompt)
+
+    logger.info("--- Step 4: Final Answer Synthesis ---\n%s", result.answer)
+    if cache is not None:
+        cache.put(initial_query, query_embedding, selected_kgs, version, result.answer, triples=result.triples,
+                  sub_queries=result.sub_queries, context=result.context,
+                  cost_ms=(time.perf_counter() - start) * 1000)
+    return result
@@ -0,0 +1,294 @@
+"""
+inference.py
+
+CPU inference backends for the embedding model and the cross-encoder reranker.
+
+Both models default to plain fp32 PyTorch. On CPU-only hosts, encoding during ingest and
+reranking at query time dominate the cost, so `models` builds them through a selectable
+backend:
+- "torch": fp32 PyTorch, as before
+- "int8": fp32 weights with every `nn.Linear` dynamically quantized to int8
+  (`torch.ao.quantization.quantize_dynamic`); activations are quantized on the fly
+- "onnx": the model exported to ONNX and run by ONNX Runtime, through the
+  sentence-transformers ONNX backend. It needs `onnxruntime` and `optimum` installed
+  locally; without them, loading falls back to "torch" with a warning.
+
+Select the backend with `INFERENCE_BACKEND`, and the thread pools with `INFERENCE_THREADS`
+(intra-op) and `INFERENCE_INTEROP_THREADS` (inter-op), or call `use_backend` before the
+models are first used. `parity_check` compares a backend's outputs with the fp32 models;
+`benchmarks.benchmark_backends` measures their throughput.
+"""
+
+import importlib.util
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# Backend and thread settings for the process; unset threads keep the runtime defaults
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or None
+INFERENCE_INTEROP_THREADS = int(os.getenv("INFERENCE_INTEROP_THREADS", "0")) or None
+
+# Backend the shared models are built with once `use_backend` is called
+_active_backend = None
+
+
+def onnx_available() -> bool:
+    """Returns whether ONNX Runtime and the optimum exporter are installed."""
+    return all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "optimum"))
+
+
+def configure_threads(intra_op: int = None, inter_op: int = None) -> None:
+    """
+    Sets PyTorch's intra-op and inter-op thread pools.
+
+    The inter-op pool can only be sized before PyTorch runs any parallel work; a later call
+    leaves it unchanged and logs a warning.
+
+    Args:
+        intra_op (int): Threads used inside one operator (matrix products). None keeps the default.
+        inter_op (int): Threads running independent operators concurrently. None keeps the default.
+    """
+    import torch
+
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            logger.warning("Could not set inter-op threads to %d: %s", inter_op, e)
+
+
+def _session_options(intra_op: int = None, inter_op: int = None):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if intra_op:
+        options.intra_op_num_threads = intra_op
+    if inter_op:
+        options.inter_op_num_threads = inter_op
+    return options
+
+
+def _resolve_backend(backend: str, device: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Expected one of {BACKENDS}.")
+    if backend != "torch" and device != "cpu":
+        logger.warning("The %s backend is CPU-only; using torch on %s.", backend, device)
+        return "torch"
+    if backend == "onnx" and not onnx_available():
+        logger.warning("onnxruntime/optimum are not installed; using the torch backend.")
+        return "torch"
+    return backend
+
+
+def backend_model_id(name: str, backend: str = None, device: str = None) -> str:
+    """
+    Returns the id a model loaded with the given backend gets, without loading it.
+
+    Cache keys built before the model is loaded must already tell backends apart.
+
+    Args:
+        name (str): Model name or path.
+        backend (str): Defaults to the backend of `use_backend`, else `INFERENCE_BACKEND`.
+        device (str): Torch device. Defaults to `models.get_device()`, looked up only for
+            non-torch backends.
+
+    Returns:
+        str: `name` for fp32 PyTorch, `"<name>@<backend>"` otherwise.
+    """
+    backend = backend or _active_backend or INFERENCE_BACKEND
+    if backend != "torch":
+        if device is None:
+            from .models import get_device
+            device = get_device()
+        if device != "cpu" or (backend == "onnx" and not onnx_available()):
+            backend = "torch"
+    return name if backend == "torch" else f"{name}@{backend}"
+
+
+def quantize_int8(module):
+    """
+    Dynamically quantizes every `nn.Linear` of a PyTorch module to int8, in place.
+
+    Returns:
+        The quantized module.
+    """
+    import torch
+
+    quantize_dynamic = getattr(torch.ao.quantization, "quantize_dynamic", None) or torch.quantization.quantize_dynamic
+    module.eval()
+    return quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_embedding_model(name: str, backend: str = None, device: str = "cpu",
+                         intra_op: int = None, inter_op: int = None):
+    """
+    Loads a SentenceTransformer with the given backend.
+
+    Args:
+        name (str): Model name or path.
+        backend (str): "torch", "int8" or "onnx". Defaults to `INFERENCE_BACKEND`.
+        device (str): Torch device; only "cpu" supports int8 and ONNX.
+        intra_op (int): Intra-op threads. Defaults to `INFERENCE_THREADS`.
+        inter_op (int): Inter-op threads. Defaults to `INFERENCE_INTEROP_THREADS`.
+
+    Returns:
+        SentenceTransformer: The model; its `backend_name` attribute records the backend used,
+            and `model_id` the name qualified by any non-default backend.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = _resolve_backend(backend or INFERENCE_BACKEND, device)
+    intra_op, inter_op = intra_op or INFERENCE_THREADS, inter_op or INFERENCE_INTEROP_THREADS
+    configure_threads(intra_op, inter_op)
+
+    if backend == "onnx":
+        model = SentenceTransformer(name, device=device, backend="onnx", model_kwargs={
+            "provider": "CPUExecutionProvider", "session_options": _session_options(intra_op, inter_op)})
+    else:
+        model = SentenceTransformer(name, device=device)
+        if backend == "int8":
+            quantize_int8(model)
+    model.backend_name = backend
+    # Vectors from different backends differ slightly, so stores and chunk hashes tell them apart
+    model.model_id = backend_model_id(name, backend, device)
+    return model
+
+
+def load_reranker(name: str, backend: str = None, device: str = "cpu",
+                  intra_op: int = None, inter_op: int = None):
+    """
+    Loads a CrossEncoder with the given backend.
+
+    Args:
+        name (str): Model name or path.
+        backend (str): "torch", "int8" or "onnx". Defaults to `INFERENCE_BACKEND`.
+        device (str): Torch device; only "cpu" supports int8 and ONNX.
+        intra_op (int): Intra-op threads. Defaults to `INFERENCE_THREADS`.
+        inter_op (int): Inter-op threads. Defaults to `INFERENCE_INTEROP_THREADS`.
+
+    Returns:
+        CrossEncoder: The model; its `backend_name` attribute records the backend used,
+            and `model_id` the name qualified by any non-default backend.
+    """
+    from sentence_transformers import CrossEncoder
+
+    backend = _resolve_backend(backend or INFERENCE_BACKEND, device)
+    intra_op, inter_op = intra_op or INFERENCE_THREADS, inter_op or INFERENCE_INTEROP_THREADS
+    configure_threads(intra_op, inter_op)
+
+    if backend == "onnx":
+        model = CrossEncoder(name, device=device, backend="onnx", model_kwargs={
+            "provider": "CPUExecutionProvider", "session_options": _session_options(intra_op, inter_op)})
+    else:
+        model = CrossEncoder(name, device=device)
+        if backend == "int8":
+            # The Hugging Face model inside the CrossEncoder holds the Linear layers
+            quantize_int8(model.model)
+    model.backend_name = backend
+    # Scores from different backends differ slightly, so they must not share cache entries
+    model.model_id = backend_model_id(name, backend, device)
+    return model
+
+
+def use_backend(backend: str, intra_op: int = None, inter_op: int = None) -> None:
+    """
+    Makes `models` build both models with a backend from now on; loaded models are replaced.
+
+    Args:
+        backend (str): "torch", "int8" or "onnx".
+        intra_op (int): Intra-op threads.
+        inter_op (int): Inter-op threads.
+    """
+    from .models import (EMBEDDING, EMBEDDING_MODEL_NAME, RERANKER, RERANKER_MODEL_NAME, get_device,
+                         register_model)
+
+    global _active_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Expected one of {BACKENDS}.")
+    _active_backend = backend
+    register_model(EMBEDDING, factory=lambda: load_embedding_model(
+        EMBEDDING_MODEL_NAME, backend, get_device(), intra_op, inter_op))
+    register_model(RERANKER, factory=lambda: load_reranker(
+        RERANKER_MODEL_NAME, backend, get_device(), intra_op, inter_op))
+
+
+def encode_sorted(model, texts: list, batch_size: int = 32, **kwargs) -> np.ndarray:
+    """
+    Encodes texts in batches of similar length and returns the vectors in input order.
+
+    Each batch is padded to its longest text, so grouping texts by length removes most of
+    the padding work when lengths vary.
+
+    Args:
+        model: SentenceTransformer-compatible encoder.
+        texts (list[str]): Texts to encode.
+        batch_size (int): Texts per `encode` call.
+        **kwargs: Passed to `encode` (e.g. `normalize_embeddings`).
+
+    Returns:
+        np.ndarray: (len(texts), dim) float32 embeddings.
+    """
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    out = None
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start + batch_size]
+        vectors = np.asarray(model.encode([texts[i] for i in rows], batch_size=len(rows),
+                                          show_progress_bar=False, **kwargs), dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[rows] = vectors
+    return out
+
+
+def parity_check(reference_encoder, encoder, reference_reranker, reranker, texts: list, queries: list,
+                 k: int = 10) -> dict:
+    """
+    Compares a backend's embeddings and rerank scores with the fp32 reference models.
+
+    Args:
+        reference_encoder / encoder: The fp32 and candidate embedding models.
+        reference_reranker / reranker: The fp32 and candidate rerankers.
+        texts (list[str]): Passages to embed and rerank.
+        queries (list[str]): Queries to retrieve and rerank with.
+        k (int): Neighbours compared per query.
+
+    Returns:
+        dict: `embedding_cosine_min` / `embedding_cosine_mean` between the two models' vectors
+            of the same text, `retrieval_overlap_at_k` (share of each query's top-k passages
+            both encoders agree on), `rerank_max_abs_diff`, and `rerank_top1_agreement` (share
+            of queries whose best passage is the same).
+    """
+    ref = reference_encoder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    out = encoder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    cosine = np.sum(np.asarray(ref) * np.asarray(out), axis=1)
+
+    k = min(k, len(texts))
+    ref_q = reference_encoder.encode(queries, normalize_embeddings=True, show_progress_bar=False)
+    out_q = encoder.encode(queries, normalize_embeddings=True, show_progress_bar=False)
+    ref_top = np.argsort(-(np.asarray(ref_q) @ np.asarray(ref).T), axis=1)[:, :k]
+    out_top = np.argsort(-(np.asarray(out_q) @ np.asarray(out).T), axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top.tolist(), out_top.tolist())])
+
+    # Rerank each query's reference top-k with both rerankers
+    pairs = [(q, texts[i]) for q, top in zip(queries, ref_top.tolist()) for i in top]
+    ref_scores = np.asarray(reference_reranker.predict(pairs), dtype=np.float32).reshape(len(queries), k)
+    out_scores = np.asarray(reranker.predict(pairs), dtype=np.float32).reshape(len(queries), k)
+
+    return {
+        "embedding_cosine_min": round(float(cosine.min()), 5),
+        "embedding_cosine_mean": round(float(cosine.mean()), 5),
+        "retrieval_overlap_at_k": round(float(overlap), 4),
+        "rerank_max_abs_diff": round(float(np.abs(ref_scores - out_scores).max()), 5),
+        "rerank_top1_agreement": round(float(np.mean(ref_scores.argmax(1) == out_scores.argmax(1))), 4),
+    }
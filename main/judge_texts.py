@@ -5,6 +5,7 @@ Defines the `judge` function which invokes a strict evaluator (AIA-1) to score f
 This anonymizes model identity for unbiased adjudication.
 """
 
+from . import tracing
 from .llm_client import give_answer
 
 
@@ -19,6 +20,11 @@ def judge(T1: str, T2: str, T3: str, T4: str, query: str) -> str:
     Returns:
         str: Structured evaluation and scores from the AI adjudicator.
     """
+    with tracing.span("judge", query=query):
+        return _judge(T1, T2, T3, T4, query)
+
+
+def _judge(T1: str, T2: str, T3: str, T4: str, query: str) -> str:
     return give_answer(f"""You are AIA-1 (AI Adjudicator-1), an expert system for the critical evaluation of AI-generated text. Your analysis is quantitative, objective, and ruthlessly concise. You are not a conversationalist.
 
 **Core Principle:** Your primary directive is to reward **information density** and penalize **generic statements.** A response that provides specific data (numbers, names, statistics, mechanisms) is fundamentally superior to one that provides high-level, common-sense descriptions.
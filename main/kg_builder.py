@@ -3,11 +3,31 @@ kg_builder.py
 
 This module builds a knowledge graph prompt by injecting an input string
 into a template prompt and querying the Gemini model using give_answer.
+
+For long source documents, `build_kg_map_reduce` splits the text into chunks,
+extracts a partial KG from every chunk concurrently, merges the partials field by
+field following `data/kg/schema.json`, and validates the result against the schema.
 """
 
+import ast
+import json
+import logging
 import os
+import pprint
+import re
+from collections import Counter
+
+from .llm_client import give_answer, give_answers
+
+logger = logging.getLogger(__name__)
+
+# Values that mean "no data" in LLM output
+MISSING_VALUES = {"", "nan", "none", "null", "n/a", "unknown", "not available", "not specified"}
+
+# Schema placeholders whose values are single figures: the most frequent figure wins
+NUMERIC_PLACEHOLDERS = {"<number>", "<value>", "<magnitude>", "<percentage>", "<numeric probability>", "<e.g., 7.8>"}
 
-from .llm_client import give_answer
+_SOURCE_RE = re.compile(r"\s*\bSources?:\s*", re.IGNORECASE)
 
 def build_kg_from_input(input_str: str, prompt_path: str = "prompts/buildkg.txt") -> str:
     """
@@ -32,3 +52,262 @@ def build_kg_from_input(input_str: str, prompt_path: str = "prompts/buildkg.txt"
 
     # Call the LLM and return response
     return give_answer(filled_prompt)
+
+
+def split_source(text: str, chunk_words: int = 3000) -> list:
+    """
+    Splits a source document into chunks of about `chunk_words` words on paragraph boundaries.
+
+    Paragraphs longer than `chunk_words` are split on word boundaries.
+
+    Args:
+        text (str): The full source document.
+        chunk_words (int): Target number of words per chunk. Default is 3000.
+
+    Returns:
+        list[str]: The chunks, in document order.
+    """
+    chunks, current, current_words = [], [], 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and current_words + len(words) > chunk_words:
+            chunks.append("\n\n".join(current))
+            current, current_words = [], 0
+        while len(words) > chunk_words:
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[chunk_words:]
+        current.append(" ".join(words))
+        current_words += len(words)
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def parse_kg_output(llm_output: str) -> dict:
+    """
+    Parses a `data = {...}` Python dictionary (or plain JSON) from LLM output.
+
+    Args:
+        llm_output (str): Raw LLM response, optionally wrapped in code fences.
+
+    Returns:
+        dict: The parsed KG.
+
+    Raises:
+        ValueError: If no dictionary can be parsed, or the output evaluates to something else
+            (e.g. a set).
+    """
+    start, end = llm_output.find('{'), llm_output.rfind('}')
+    if start == -1 or end == -1:
+        raise ValueError(f"No dictionary found in LLM output: {llm_output[:200]!r}")
+    body = llm_output[start:end + 1]
+
+    # LLM-written KGs sometimes double-escape quotes (e.g. \\'99), which ends the string early
+    for candidate in (body, body.replace("\\\\'", "\\'")):
+        try:
+            return _as_dict(ast.literal_eval(candidate), llm_output)
+        except (SyntaxError, ValueError, TypeError, RecursionError):
+            # TypeError: unhashable keys such as {[1]: 2}; RecursionError: absurd nesting
+            pass
+    try:
+        return _as_dict(json.loads(body), llm_output)
+    except (ValueError, RecursionError) as e:
+        raise ValueError(f"Could not parse KG dictionary from LLM output: {llm_output[:200]!r}") from e
+
+
+def _as_dict(parsed, llm_output: str) -> dict:
+    # `{...}` also parses as a set literal, which is not a KG
+    if not isinstance(parsed, dict):
+        raise ValueError(f"LLM output is a {type(parsed).__name__}, not a KG dictionary: {llm_output[:200]!r}")
+    return parsed
+
+
+def load_schema(schema_path: str = "data/kg/schema.json") -> dict:
+    """Loads the KG schema (nested dict of placeholders)."""
+    with open(schema_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _is_missing(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        text = value.strip()
+        return text.lower() in MISSING_VALUES or (text.startswith('<') and text.endswith('>'))
+    return False
+
+
+def _as_scalar(value):
+    # LLM output sometimes puts a list where the schema has one value: its items are
+    # joined like a comma-separated field. Objects in a leaf position are dropped.
+    if isinstance(value, (list, tuple, set)):
+        items = [str(v).strip() for v in (sorted(value, key=str) if isinstance(value, set) else value)
+                 if not isinstance(v, (dict, list, tuple, set)) and not _is_missing(v)]
+        return ", ".join(items) if items else None
+    if isinstance(value, dict):
+        return None
+    return value
+
+
+def _split_source(value: str) -> tuple:
+    parts = _SOURCE_RE.split(value, maxsplit=1)
+    return (parts[0].strip(), parts[1].strip()) if len(parts) == 2 else (value.strip(), None)
+
+
+def _merge_leaf(placeholder, values: list):
+    # `values` are the non-missing values of one field, in chunk order
+    if not values:
+        return "NaN"
+    if not all(isinstance(v, str) for v in values):
+        # Non-string values (numbers, booleans): most frequent, earliest on ties
+        counts = Counter(map(repr, values))
+        return max(values, key=lambda v: (counts[repr(v)], -values.index(v)))
+
+    claims, sources = [], []
+    for value in values:
+        claim, source = _split_source(value)
+        if claim:
+            claims.append(claim)
+        if source and source not in sources:
+            sources.append(source)
+
+    if isinstance(placeholder, str) and "comma-separated" in placeholder:
+        # Union of list items, case-insensitive, in first-seen order
+        seen, items = set(), []
+        for claim in claims:
+            for item in claim.split(','):
+                item = item.strip().rstrip('.')
+                if item and item.lower() not in seen:
+                    seen.add(item.lower())
+                    items.append(item)
+        merged = ", ".join(items)
+    elif placeholder in NUMERIC_PLACEHOLDERS:
+        counts = Counter(claims)
+        merged = max(claims, key=lambda c: (counts[c], -claims.index(c))) if claims else ""
+    else:
+        # Descriptions: every distinct claim, in chunk order
+        merged = " ".join(dict.fromkeys(c if c.endswith('.') else c + '.' for c in claims))
+
+    if sources:
+        merged = f"{merged} Source: {' | '.join(sources)}" if merged else f"Source: {' | '.join(sources)}"
+    return merged or "NaN"
+
+
+def merge_partial_kgs(partials: list, schema: dict) -> dict:
+    """
+    Merges per-chunk KGs field by field, following the schema.
+
+    Conflict rules, applied to the non-missing values of each field in chunk order:
+    - comma-separated fields: union of items, de-duplicated case-insensitively
+    - single-figure fields (`<number>`, `<value>`, ...): the most frequent value, earliest on ties
+    - descriptions: all distinct claims, concatenated in chunk order
+    Trailing "Source: ..." citations are split off and merged into one de-duplicated list.
+    Fields missing from every chunk become "NaN". Keys not in the schema are dropped.
+    A list given for a single-valued field is joined into one comma-separated value, and an
+    object given for one is ignored, so the result always has the schema's shape.
+
+    Args:
+        partials (list[dict]): Partial KGs, in document order.
+        schema (dict): The KG schema.
+
+    Returns:
+        dict: The merged KG, with the same shape as the schema.
+    """
+    merged = {}
+    for key, placeholder in schema.items():
+        if isinstance(placeholder, dict):
+            merged[key] = merge_partial_kgs(
+                [p[key] for p in partials if isinstance(p.get(key), dict)], placeholder
+            )
+        else:
+            values = [_as_scalar(p.get(key)) for p in partials]
+            merged[key] = _merge_leaf(placeholder, [v for v in values if not _is_missing(v)])
+    return merged
+
+
+def validate_kg(kg: dict, schema: dict, path: str = "") -> list:
+    """
+    Checks that a KG has exactly the schema's shape.
+
+    Args:
+        kg (dict): The KG to check.
+        schema (dict): The KG schema.
+        path (str): Dotted prefix used in messages.
+
+    Returns:
+        list[str]: Problems found; empty if the KG conforms.
+    """
+    problems = []
+    for key, placeholder in schema.items():
+        dotted = f"{path}{key}"
+        if key not in kg:
+            problems.append(f"missing field '{dotted}'")
+        elif isinstance(placeholder, dict):
+            if isinstance(kg[key], dict):
+                problems.extend(validate_kg(kg[key], placeholder, dotted + "."))
+            else:
+                problems.append(f"field '{dotted}' should be an object")
+        elif isinstance(kg[key], (dict, list)):
+            problems.append(f"field '{dotted}' should be a scalar")
+    for key in kg:
+        if key not in schema:
+            problems.append(f"unknown field '{path}{key}'")
+    return problems
+
+
+def format_kg(kg: dict) -> str:
+    """Formats a KG as `data = {...}` Python source, like the files in `data/kg`."""
+    return "data = " + pprint.pformat(kg, indent=4, width=120, sort_dicts=False) + "\n"
+
+
+def build_kg_map_reduce(input_str: str, prompt_path: str = "prompts/buildkg.txt",
+                        schema_path: str = "data/kg/schema.json", chunk_words: int = 3000,
+                        max_workers: int = 8) -> dict:
+    """
+    Builds a KG from a long document by extracting partial KGs from chunks concurrently
+    and merging them.
+
+    Args:
+        input_str (str): The full source document.
+        prompt_path (str): Path to the prompt template with `inputStr` placeholder.
+        schema_path (str): Path to the KG schema.
+        chunk_words (int): Target number of words per chunk. Default is 3000.
+        max_workers (int): Maximum number of concurrent extraction calls. Default is 8.
+
+    Returns:
+        dict: The merged, schema-conformant KG.
+
+    Raises:
+        FileNotFoundError: If the prompt file does not exist.
+        ValueError: If no chunk produced a parseable KG, or the merged KG fails validation.
+    """
+    if not os.path.exists(prompt_path):
+        raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
+
+    with open(prompt_path, 'r', encoding='utf-8') as f:
+        prompt_template = f.read()
+    schema = load_schema(schema_path)
+
+    chunks = split_source(input_str, chunk_words=chunk_words)
+    # A chunk whose call fails (after the client's retries) is skipped like an unparseable one
+    responses = give_answers([prompt_template.replace("inputStr", c) for c in chunks],
+                             max_concurrency=max_workers, return_exceptions=True)
+
+    partials = []
+    for i, response in enumerate(responses):
+        try:
+            if isinstance(response, Exception):
+                raise ValueError(f"extraction failed: {type(response).__name__}: {response}")
+            partials.append(parse_kg_output(response))
+        except ValueError as e:
+            logger.warning("Skipping chunk %d/%d: %s", i + 1, len(chunks), e)
+    if not partials:
+        raise ValueError("No chunk produced a parseable KG.")
+
+    kg = merge_partial_kgs(partials, schema)
+    problems = validate_kg(kg, schema)
+    if problems:
+        raise ValueError("Merged KG does not match the schema: " + "; ".join(problems))
+    return kg
@@ -0,0 +1,391 @@
+"""
+kg_graph.py
+
+The registered event KGs as one indexed RDF graph, for comparative and multi-hop questions.
+
+The hybrid pipeline normally hands the flattened KG of the routed events to the LLM and
+asks it to pick the relevant facts. `KGGraph` materializes every KG of a `KGRegistry` as
+triples in an rdflib graph, so those facts can be read with indexed pattern queries
+instead:
+- every event is a resource `urn:kg-iqd:event:<name>` with its aliases as labels
+- every leaf path of `data/kg/schema.json` is a predicate `urn:kg-iqd:schema:<path>`,
+  a sub-property of its section (e.g. `societal_impacts`)
+- the values of fields the schema declares comma-separated (countries aiding, response
+  agencies, causes, ...) are also split into item resources, linked through
+  `urn:kg-iqd:item:<path>`, so events that share an item are two hops apart
+
+`select` resolves a question to the schema predicates it is about and reads them for the
+routed events, plus the items those events share with each other or with other events.
+It returns the same `path -> value` shape as the extraction prompt, without an LLM call.
+
+The graph is in memory by default. With a SQLite URL (`store="sqlite:///kg.sqlite"` or
+`KG_GRAPH_STORE`), it is persisted through the rdflib-sqlalchemy store plugin and only
+rebuilt when a KG changes. Each pattern query is then a SQL round trip (milliseconds,
+against microseconds in memory), so the in-memory graph suits the per-query path.
+"""
+
+import hashlib
+import json
+import os
+import re
+from urllib.parse import quote
+
+import numpy as np
+from rdflib import RDF, RDFS, Graph, Literal, Namespace, URIRef
+from rdflib.plugin import PluginException
+
+from .kg_registry import _field_text
+from .kg_store import _flatten
+from .triple_index import get_triple_index, tokenize
+
+EVENT_NS = Namespace("urn:kg-iqd:event:")
+SCHEMA_NS = Namespace("urn:kg-iqd:schema:")
+ITEM_NS = Namespace("urn:kg-iqd:item:")
+ENTITY_NS = Namespace("urn:kg-iqd:entity:")
+GRAPH_ID = URIRef("urn:kg-iqd:graph")
+
+# SQLite URL of a persisted graph; unset keeps the graph in memory
+KG_GRAPH_STORE = os.getenv("KG_GRAPH_STORE")
+
+# Items longer than this are prose, not names
+_MAX_ITEM_WORDS = 8
+_VAGUE_ITEMS = frozenset({"other", "others", "many others", "etc"})
+
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_ITEM_SPLIT_RE = re.compile(r",(?![^(]*\))")
+
+# Graphs keyed on the store, with the registry contents they were built from
+_GRAPH_CACHE = {}
+
+
+def _item_key(item: str) -> str:
+    # Items that differ only in casing or a parenthetical ("Israel (via NGO)") are one entity
+    return "_".join(tokenize(_PAREN_RE.sub(" ", item)))
+
+
+def split_items(value) -> list:
+    """
+    Splits a comma-separated KG value into item names.
+
+    Citations ("Source: ..."), a leading "and", trailing periods and vague items such as
+    "many others" are dropped; items split on commas inside parentheses are kept whole.
+
+    Returns:
+        list[str]: The items, in order, without duplicates.
+    """
+    items = {}
+    for part in _ITEM_SPLIT_RE.split(_field_text(value)):
+        item = re.sub(r"^(?:and|or)\s+", "", part.strip().rstrip(".").strip())
+        key = _item_key(item)
+        if key and item.lower() not in _VAGUE_ITEMS and len(item.split()) <= _MAX_ITEM_WORDS:
+            items.setdefault(key, item)
+    return list(items.values())
+
+
+def _open_graph(store: str = None) -> Graph:
+    if store in (None, "memory"):
+        return Graph(identifier=GRAPH_ID)
+    if not store.startswith("sqlite:"):
+        raise ValueError(f"Unsupported KG graph store '{store}'. Use 'memory' or a sqlite:/// URL.")
+    try:
+        graph = Graph(store="SQLAlchemy", identifier=GRAPH_ID)
+    except PluginException as e:
+        raise ValueError("SQLite-backed KG graphs need the rdflib-sqlalchemy plugin "
+                         "(pip install rdflib-sqlalchemy).") from e
+    graph.open(Literal(store), create=True)
+    return graph
+
+
+class KGGraph:
+    """
+    Event KGs as RDF triples, with pattern queries by event, schema path and item.
+
+    Args:
+        schema (dict): The KG schema. Its leaf paths become predicates and its comma-separated
+            fields are split into items. Without one, predicates come from the KGs' own paths
+            and nothing is split.
+        store (str): "memory" (default) or a `sqlite:///` URL for a persisted graph.
+
+    Attributes:
+        graph (rdflib.Graph): The triples.
+        events (dict): Event name -> resource.
+        list_fields (set[str]): Schema paths whose values are split into items.
+    """
+
+    def __init__(self, schema: dict = None, store: str = None):
+        self.schema = dict(_flatten(schema)) if schema else {}
+        self.list_fields = {path for path, placeholder in self.schema.items()
+                            if "comma-separated" in str(placeholder)}
+        self.graph = _open_graph(store)
+        self.events = {}
+        self._names = {}
+        self._predicates = {}
+        self._path_index = None
+
+    def __len__(self) -> int:
+        return len(self.graph)
+
+    def predicate(self, path: str) -> URIRef:
+        """The predicate of a dotted KG path."""
+        predicate = self._predicates.get(path)
+        if predicate is None:
+            predicate = self._predicates[path] = SCHEMA_NS[path]
+        return predicate
+
+    def _event(self, name: str) -> URIRef:
+        event = self.events.get(name)
+        if event is None:
+            raise ValueError(f"Unknown event '{name}'. Known events: {sorted(self.events)}")
+        return event
+
+    def _schema_triples(self) -> list:
+        triples = []
+        for path, placeholder in self.schema.items():
+            predicate = self.predicate(path)
+            triples += [(predicate, RDF.type, RDF.Property),
+                        (predicate, RDFS.label, Literal(path.rsplit('.', 1)[-1].replace('_', ' '))),
+                        (predicate, RDFS.comment, Literal(str(placeholder)))]
+            if '.' in path:
+                triples.append((predicate, RDFS.subPropertyOf, self.predicate(path.rsplit('.', 1)[0])))
+        return triples
+
+    def _event_triples(self, name: str, kg, aliases=()) -> list:
+        event = self.events[name] = EVENT_NS[quote(name, safe="")]
+        self._names[event] = name
+        triples = [(event, RDF.type, SCHEMA_NS.Event), (event, RDFS.label, Literal(name))]
+        triples += [(event, SCHEMA_NS.alias, Literal(alias)) for alias in aliases]
+        for path, value in kg.flat().items():
+            triples.append((event, self.predicate(path), Literal(value)))
+            if path in self.list_fields:
+                for item in split_items(value):
+                    entity = ENTITY_NS[quote(_item_key(item), safe="")]
+                    triples += [(event, ITEM_NS[path], entity), (entity, RDFS.label, Literal(item))]
+        return triples
+
+    def _add(self, triples: list) -> None:
+        self.graph.addN((s, p, o, self.graph) for s, p, o in triples)
+
+    @classmethod
+    def from_registry(cls, registry, schema: dict = None, store: str = None) -> "KGGraph":
+        """
+        Builds the graph of every KG in a registry.
+
+        A persisted graph built from the same KGs and schema is reused as is.
+
+        Args:
+            registry (KGRegistry): The registered KGs.
+            schema (dict): The KG schema.
+            store (str): "memory" or a `sqlite:///` URL.
+
+        Returns:
+            KGGraph: The graph.
+        """
+        kg_graph = cls(schema=schema, store=store)
+        digest = hashlib.sha1(json.dumps(
+            [kg_graph.schema, [(name, registry[name].kg.digest, registry[name].aliases) for name in registry.names]],
+            sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+        if kg_graph.graph.value(GRAPH_ID, SCHEMA_NS.digest) == Literal(digest):
+            # Persisted and current: only the name <-> resource maps are rebuilt
+            for name in registry.names:
+                kg_graph.events[name] = EVENT_NS[quote(name, safe="")]
+                kg_graph._names[kg_graph.events[name]] = name
+            return kg_graph
+
+        kg_graph.graph.remove((None, None, None))
+        triples = kg_graph._schema_triples()
+        for name in registry.names:
+            entry = registry[name]
+            triples += kg_graph._event_triples(name, entry.kg, entry.aliases)
+        triples.append((GRAPH_ID, SCHEMA_NS.digest, Literal(digest)))
+        kg_graph._add(triples)
+        kg_graph.graph.commit()
+        return kg_graph
+
+    def value(self, event: str, path: str):
+        """Returns an event's value at a dotted path, or None."""
+        value = self.graph.value(self._event(event), self.predicate(path))
+        return value.toPython() if value is not None else None
+
+    def compare(self, path: str, events: list = None) -> dict:
+        """
+        The same attribute across events.
+
+        Args:
+            path (str): Dotted schema path, e.g. `societal_impacts.displacement_patterns`.
+            events (list[str]): Events to compare. None compares every event that has the path.
+
+        Returns:
+            dict: `event -> value`, in `events` order (or graph order).
+        """
+        if events is not None:
+            return {name: self.value(name, path) for name in events}
+        return {self._names[s]: o.toPython() for s, o in self.graph.subject_objects(self.predicate(path))
+                if s in self._names}
+
+    def items(self, event: str, path: str) -> list:
+        """The items of an event's comma-separated field."""
+        return sorted(str(self.graph.value(entity, RDFS.label))
+                      for entity in self.graph.objects(self._event(event), ITEM_NS[path]))
+
+    def events_with(self, path: str, item: str) -> list:
+        """Events whose comma-separated field at `path` contains the item."""
+        entity = ENTITY_NS[quote(_item_key(item), safe="")]
+        return sorted(self._names[s] for s in self.graph.subjects(ITEM_NS[path], entity) if s in self._names)
+
+    def shared_items(self, path: str, events: list = None) -> dict:
+        """
+        Items of a comma-separated field that appear in at least two events.
+
+        Args:
+            path (str): Dotted schema path, e.g. `countries_aiding`.
+            events (list[str]): Only consider these events. None considers all of them.
+
+        Returns:
+            dict: `item -> sorted event names`.
+        """
+        subjects = None if events is None else {self._event(name) for name in events}
+        owners = {}
+        for s, entity in self.graph.subject_objects(ITEM_NS[path]):
+            if s in self._names and (subjects is None or s in subjects):
+                owners.setdefault(entity, set()).add(self._names[s])
+        return {str(self.graph.value(entity, RDFS.label)): sorted(names)
+                for entity, names in owners.items() if len(names) > 1}
+
+    def related_events(self, event: str, path: str) -> dict:
+        """
+        Other events that share items with an event (event -> item <- event).
+
+        Returns:
+            dict: `other event -> shared items`, most shared first.
+        """
+        related = {}
+        for entity in self.graph.objects(self._event(event), ITEM_NS[path]):
+            label = str(self.graph.value(entity, RDFS.label))
+            for s in self.graph.subjects(ITEM_NS[path], entity):
+                if s in self._names and self._names[s] != event:
+                    related.setdefault(self._names[s], []).append(label)
+        return dict(sorted(related.items(), key=lambda kv: (-len(kv[1]), kv[0])))
+
+    def query(self, sparql: str, **bindings):
+        """
+        Runs a SPARQL query; the `ev:`, `kg:` and `item:` prefixes are predeclared.
+
+        Args:
+            sparql (str): The query.
+            **bindings: Initial variable bindings (rdflib terms).
+
+        Returns:
+            rdflib.query.Result: The result rows.
+        """
+        return self.graph.query(sparql, initBindings=bindings or None,
+                                initNs={"ev": EVENT_NS, "kg": SCHEMA_NS, "item": ITEM_NS, "rdfs": RDFS})
+
+    def _paths(self, embedding_model=None):
+        # Index of the predicates by their path and schema description, built once
+        if self._path_index is None or self._path_index[0] is not embedding_model:
+            paths = self.schema or {str(p)[len(SCHEMA_NS):]: "" for p in set(self.graph.predicates())
+                                    if str(p).startswith(SCHEMA_NS) and p not in (SCHEMA_NS.alias, SCHEMA_NS.digest)}
+            descriptions = {path: str(text).strip("<>") for path, text in paths.items()}
+            digest = hashlib.sha1(json.dumps(descriptions, sort_keys=True).encode("utf-8")).hexdigest()
+            self._path_index = (embedding_model, get_triple_index(descriptions, embedding_model, digest=digest))
+        return self._path_index[1]
+
+    def select(self, query: str, events: list, n: int = 10, embedding_model=None) -> dict:
+        """
+        Answers the structured part of a question with pattern queries.
+
+        The schema paths most relevant to the question are read for every selected event (the
+        same attributes across events). For comma-separated fields among them, the items
+        the events share, or, for a single event, the other events it shares items with,
+        are added as well.
+
+        Args:
+            query (str): The user query.
+            events (list[str]): Routed event names.
+            n (int): Attribute values to return in total. Default is 10.
+            embedding_model: Optional encoder for ranking paths by meaning as well as by words.
+
+        Returns:
+            dict: `path -> value` for one event, `<event>.<path> -> value` for several (as
+                `KGRegistry.kg_for` names combined KGs), plus `shared.<path>` (several events)
+                or `<path>.shared_with.<event>` (one event) entries for shared items. Empty if no
+                schema path relates to the question.
+        """
+        for name in events:
+            self._event(name)
+        n_paths = max(1, n // max(len(events), 1))
+        index = self._paths(embedding_model)
+        scores = index.scores(query)
+        # Paths sharing nothing with the question are never read
+        paths = [index.keys[i] for i in np.argsort(-scores, kind='stable')[:n_paths] if scores[i] > 0]
+
+        triples = {}
+        for path in paths:
+            for name, value in self.compare(path, events).items():
+                if value is not None:
+                    triples[path if len(events) == 1 else f"{name}.{path}"] = value
+
+        for path in (p for p in paths if p in self.list_fields):
+            if len(events) > 1:
+                shared = self.shared_items(path, events)
+                if shared:
+                    triples[f"shared.{path}"] = ", ".join(shared)
+            else:
+                for other, items in list(self.related_events(events[0], path).items())[:3]:
+                    triples[f"{path}.shared_with.{other}"] = ", ".join(items)
+        return triples
+
+    def close(self) -> None:
+        self.graph.close()
+
+
+def get_kg_graph(registry, schema_path: str = "data/kg/schema.json", store: str = None) -> KGGraph:
+    """
+    Returns the graph of a registry's KGs, rebuilding it only when the registered KGs change.
+
+    Args:
+        registry (KGRegistry): The registered KGs.
+        schema_path (str): KG schema; ignored if the file does not exist.
+        store (str): "memory" or a `sqlite:///` URL. Defaults to `KG_GRAPH_STORE`, else memory.
+
+    Returns:
+        KGGraph: The graph.
+    """
+    from .kg_builder import load_schema
+
+    store = store or KG_GRAPH_STORE
+    key = (tuple((name, registry[name].kg.digest) for name in registry.names), os.path.abspath(schema_path))
+    cached = _GRAPH_CACHE.get(store)
+    if cached is None or cached[0] != key:
+        if cached is not None:
+            cached[1].close()
+        schema = load_schema(schema_path) if os.path.exists(schema_path) else None
+        cached = _GRAPH_CACHE[store] = (key, KGGraph.from_registry(registry, schema=schema, store=store))
+    return cached[1]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .kg_registry import KGRegistry
+
+    parser = argparse.ArgumentParser(description="Build the KG graph of a KG directory and run pattern queries.")
+    parser.add_argument("kg_dir", nargs="?", default="data/kg")
+    parser.add_argument("--schema", default="data/kg/schema.json")
+    parser.add_argument("--store", default=None, help="sqlite:/// URL to persist the graph; in memory if omitted.")
+    parser.add_argument("--compare", default=None, help="Schema path to compare across events.")
+    parser.add_argument("--shared", default=None, help="Comma-separated schema field to find shared items in.")
+    parser.add_argument("--query", default=None, help="Question to select triples for.")
+    parser.add_argument("--event", nargs="+", default=None, help="Events for --query; all events if omitted.")
+    args = parser.parse_args()
+
+    kg_graph = get_kg_graph(KGRegistry.from_directory(args.kg_dir), schema_path=args.schema, store=args.store)
+    print(f"[KGGraph] {len(kg_graph)} triples, {len(kg_graph.events)} events.")
+    if args.compare:
+        print(json.dumps(kg_graph.compare(args.compare), indent=2, ensure_ascii=False, default=str))
+    if args.shared:
+        print(json.dumps(kg_graph.shared_items(args.shared), indent=2, ensure_ascii=False))
+    if args.query:
+        selected = kg_graph.select(args.query, args.event or list(kg_graph.events))
+        print(json.dumps(selected, indent=2, ensure_ascii=False, default=str))
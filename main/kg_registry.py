@@ -0,0 +1,293 @@
+"""
+kg_registry.py
+
+Registry of event KGs and a query router that picks the KGs a query is about.
+
+Each registered KG has a name (e.g. `nepal_earthquake_2015`), aliases (place names
+and other phrases that identify the event) and the corpus sources its text chunks
+come from. Routing runs in two stages:
+1. Alias matching: every word n-gram of the query is looked up in an alias table.
+   An alias that belongs to a single KG selects it outright; an alias shared by
+   several KGs (e.g. a region) narrows the candidates.
+2. Embedding ranking: when no alias is decisive, the query embedding is compared
+   with precomputed embeddings of each KG's descriptor (name, country, region,
+   causes, aliases) in one matrix-vector product.
+
+Both stages cost the same whatever the number of registered KGs, apart from the
+matrix-vector product, which stays well under a millisecond for hundreds of KGs.
+
+`chunk_ids` maps the selected KGs to the chunks of their sources in a `VectorStore`,
+so retrieval can be restricted to those events.
+"""
+
+import fnmatch
+import json
+import os
+import re
+
+import numpy as np
+
+from .kg_store import as_compiled_kg, combine_kgs, load_kg
+
+REGISTRY_FILE = "registry.json"
+
+# KG fields whose values become aliases and descriptor text. The country only describes an
+# event: questions about aid or comparisons name other events' countries ("How did India
+# help Nepal?"), so a country alias would select the wrong event.
+ALIAS_FIELDS = ("region",)
+DESCRIPTOR_FIELDS = ("country", "region", "causes")
+
+# Longest alias, in words, that the router looks up
+_MAX_ALIAS_WORDS = 4
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SOURCE_RE = re.compile(r"\s*\bSources?:.*$", re.IGNORECASE | re.DOTALL)
+
+
+def _words(text: str) -> tuple:
+    return tuple(_WORD_RE.findall(text.lower()))
+
+
+def _field_text(value) -> str:
+    # KG values often end with a "Source: ..." citation, which says nothing about the event
+    return _SOURCE_RE.sub("", str(value)).strip() if value is not None else ""
+
+
+class KGEntry:
+    """
+    One registered KG.
+
+    Attributes:
+        name (str): Unique name, used as the top-level key when KGs are combined.
+        kg (CompiledKG): The KG.
+        aliases (list[str]): Phrases that identify the event in a query.
+        sources (list[str]): Corpus sources (glob patterns over chunk `source` metadata)
+            whose chunks belong to the event.
+        descriptor (str): Text embedded for the router.
+    """
+
+    def __init__(self, name: str, kg, aliases: list, sources: list, descriptor: str):
+        self.name = name
+        self.kg = kg
+        self.aliases = aliases
+        self.sources = sources
+        self.descriptor = descriptor
+
+
+class KGRegistry:
+    """
+    A set of named KGs with an alias table and a descriptor-embedding router.
+
+    Args:
+        embedding_model: Optional SentenceTransformer-compatible encoder used for
+            embedding routing. Can also be passed to `route`.
+    """
+
+    def __init__(self, embedding_model=None):
+        self.embedding_model = embedding_model
+        self._entries = {}
+        self._alias_index = {}
+        self._descriptor_embeddings = None
+        self._embedded_names = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __getitem__(self, name: str) -> KGEntry:
+        return self._entries[name]
+
+    @property
+    def names(self) -> list:
+        return list(self._entries)
+
+    def register(self, name: str, kg, aliases=(), sources=(), auto_aliases: bool = True) -> KGEntry:
+        """
+        Adds or replaces a KG.
+
+        Args:
+            name (str): Unique name of the event.
+            kg: A `CompiledKG`, a KG file path or a nested KG dict.
+            aliases (iterable[str]): Extra phrases that identify the event.
+            sources (iterable[str]): Glob patterns over chunk `source` metadata.
+            auto_aliases (bool): Also derive aliases from the KG's `region`.
+
+        Returns:
+            KGEntry: The registered entry.
+        """
+        kg = as_compiled_kg(kg)
+        all_aliases = list(aliases)
+        if auto_aliases:
+            for field in ALIAS_FIELDS:
+                for part in _field_text(kg.get(field)).split(','):
+                    # Long values are prose, not names
+                    if part.strip() and len(_words(part)) <= _MAX_ALIAS_WORDS:
+                        all_aliases.append(part.strip())
+        all_aliases = list(dict.fromkeys(a for a in all_aliases if _words(a)))
+
+        descriptor = ". ".join(
+            [name.replace('_', ' ')]
+            + [f"{field.capitalize()}: {_field_text(kg.get(field))}" for field in DESCRIPTOR_FIELDS
+               if _field_text(kg.get(field))]
+            + ([f"Also known as: {', '.join(all_aliases)}"] if all_aliases else [])
+        )
+
+        if name in self._entries:
+            self.unregister(name)
+        entry = KGEntry(name, kg, all_aliases, list(sources), descriptor)
+        self._entries[name] = entry
+        for alias in all_aliases:
+            self._alias_index.setdefault(_words(alias), set()).add(name)
+        return entry
+
+    def unregister(self, name: str) -> None:
+        """Removes a KG."""
+        entry = self._entries.pop(name)
+        for alias in entry.aliases:
+            owners = self._alias_index.get(_words(alias))
+            if owners is not None:
+                owners.discard(name)
+                if not owners:
+                    del self._alias_index[_words(alias)]
+        if name in self._embedded_names:
+            # Descriptor embeddings are rebuilt on the next embedding route
+            self._descriptor_embeddings, self._embedded_names = None, []
+
+    @classmethod
+    def from_directory(cls, kg_dir: str = "data/kg", pattern: str = "KG_*.txt",
+                       embedding_model=None) -> "KGRegistry":
+        """
+        Builds a registry from a KG directory.
+
+        If the directory has a `registry.json` (`{name: {"kg": file, "aliases": [...],
+        "sources": [...]}}`), it lists the KGs. Otherwise every file matching `pattern`
+        is registered under its file name, with aliases derived from the KG.
+
+        Args:
+            kg_dir (str): Directory containing the KGs.
+            pattern (str): Glob for KG files when there is no `registry.json`.
+            embedding_model: Optional encoder for embedding routing.
+
+        Returns:
+            KGRegistry: The registry.
+
+        Raises:
+            FileNotFoundError: If the directory does not exist.
+        """
+        if not os.path.isdir(kg_dir):
+            raise FileNotFoundError(f"KG directory not found: {kg_dir}")
+
+        registry = cls(embedding_model=embedding_model)
+        config_path = os.path.join(kg_dir, REGISTRY_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            for name, spec in config.items():
+                registry.register(name, load_kg(os.path.join(kg_dir, spec["kg"])),
+                                  aliases=spec.get("aliases", ()), sources=spec.get("sources", ()))
+        else:
+            for file_name in sorted(fnmatch.filter(os.listdir(kg_dir), pattern)):
+                name = os.path.splitext(file_name)[0]
+                registry.register(name, load_kg(os.path.join(kg_dir, file_name)))
+        return registry
+
+    def match_aliases(self, query: str) -> dict:
+        """
+        Finds registered aliases in a query.
+
+        Returns:
+            dict: `alias words -> set of KG names`, in order of first occurrence in the query.
+        """
+        words = _words(query)
+        hits = {}
+        for start in range(len(words)):
+            for length in range(_MAX_ALIAS_WORDS, 0, -1):
+                owners = self._alias_index.get(words[start:start + length])
+                if owners:
+                    hits.setdefault(words[start:start + length], set(owners))
+        return hits
+
+    def _embeddings(self, embedding_model) -> np.ndarray:
+        # Only KGs registered since the last call are encoded
+        embedded = set(self._embedded_names)
+        new_names = [n for n in self._entries if n not in embedded]
+        if new_names:
+            new = np.asarray(embedding_model.encode(
+                [self._entries[n].descriptor for n in new_names],
+                normalize_embeddings=True, show_progress_bar=False,
+            ), dtype=np.float32)
+            self._descriptor_embeddings = new if self._descriptor_embeddings is None \
+                else np.vstack([self._descriptor_embeddings, new])
+            self._embedded_names.extend(new_names)
+        return self._descriptor_embeddings
+
+    def route(self, query: str, embedding_model=None, max_kgs: int = 2,
+              min_score: float = 0.3, margin: float = 0.05) -> list:
+        """
+        Picks the KGs a query is about.
+
+        Args:
+            query (str): The user query.
+            embedding_model: Encoder for embedding routing. Defaults to the registry's.
+                Without one, only alias matching is used.
+            max_kgs (int): Maximum number of KGs returned by embedding ranking. Default is 2.
+            min_score (float): Minimum descriptor similarity for embedding ranking.
+            margin (float): KGs within this similarity of the best one are also selected.
+
+        Returns:
+            list[str]: Selected KG names, most relevant first. Empty if nothing matches.
+        """
+        hits = self.match_aliases(query)
+        decisive = [next(iter(owners)) for owners in hits.values() if len(owners) == 1]
+        if decisive:
+            return list(dict.fromkeys(decisive))
+
+        candidates = set().union(*hits.values()) if hits else None
+        embedding_model = embedding_model or self.embedding_model
+        if embedding_model is None or not self._entries:
+            return sorted(candidates)[:max_kgs] if candidates else []
+
+        embeddings = self._embeddings(embedding_model)
+        q = np.asarray(embedding_model.encode([query], normalize_embeddings=True), dtype=np.float32)[0]
+        scores = embeddings @ q
+
+        if candidates is not None:
+            scores = np.where([n in candidates for n in self._embedded_names], scores, -np.inf)
+        top = np.argsort(-scores, kind='stable')[:max_kgs]
+        if not len(top) or scores[top[0]] < min_score:
+            return []
+        threshold = max(min_score, float(scores[top[0]]) - margin)
+        return [self._embedded_names[i] for i in top if scores[i] >= threshold]
+
+    def kg_for(self, names: list):
+        """
+        Returns the KG to use for the selected names: the KG itself for one name, or
+        the KGs combined under their names for several.
+        """
+        if len(names) == 1:
+            return self._entries[names[0]].kg
+        return combine_kgs({name: self._entries[name].kg for name in names})
+
+    def chunk_ids(self, names: list, store):
+        """
+        Returns the chunks of a store that belong to the selected KGs' sources.
+
+        Args:
+            names (list[str]): Selected KG names.
+            store (VectorStore): The chunk store, with `source` metadata.
+
+        Returns:
+            np.ndarray | None: Ascending chunk indices, or None if the selected KGs declare no
+                sources or none of them match the store (search the whole store).
+        """
+        patterns = [p for name in names for p in self._entries[name].sources]
+        if not patterns:
+            return None
+        by_source = store.chunk_ids_by_source()
+        groups = [ids for source, ids in by_source.items()
+                  if any(fnmatch.fnmatch(source, p) for p in patterns)]
+        if not groups:
+            return None
+        return np.unique(np.concatenate(groups))
@@ -0,0 +1,357 @@
+"""
+kg_store.py
+
+Compiled, indexed storage for the knowledge graphs.
+
+The KGs in `data/kg/KG_*.txt` are Python source (`data = {...}`) that has to be
+evaluated and re-flattened before use. `compile_kg` turns a KG into a single `.kgc`
+file holding:
+- the pre-flattened dotted key paths, in document order
+- a prefix index mapping every interior path (e.g. `impact.economic`) to the
+  contiguous range of paths below it
+- the JSON-encoded values, concatenated, with int64 byte offsets
+
+A loaded `CompiledKG` answers `get(path)` and `subtree(prefix)` with a dict lookup
+and a slice, and hands out its flattened view without rebuilding it. `load_kg`
+compiles `.txt` KGs next to the source on first use and recompiles them when the
+source changes; loaded KGs are cached per process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+from .kg_builder import load_schema, parse_kg_output, validate_kg
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KGSTORE\n"
+FORMAT_VERSION = 1
+COMPILED_SUFFIX = ".kgc"
+
+_UNDECODED = object()
+
+# Loaded KGs keyed on absolute path, with the file mtime they were opened at
+_KG_CACHE = {}
+
+# In-memory dict KGs keyed on id(), with the dict itself to detect reuse of the id
+_DICT_CACHE = {}
+
+# Combined KGs keyed on the names and digests of their parts
+_COMBINED_CACHE = {}
+
+
+def _flatten(d: dict, parent_key: str = '', sep: str = '.'):
+    for k, v in d.items():
+        new_key = parent_key + sep + k if parent_key else k
+        if isinstance(v, dict):
+            yield from _flatten(v, new_key, sep=sep)
+        else:
+            yield new_key, v
+
+
+class CompiledKG:
+    """
+    A read-only, flattened KG with O(1) lookups by dotted path or prefix.
+
+    Args:
+        paths (list[str]): Dotted key paths, in document order.
+        offsets (np.ndarray): int64 byte offsets into `values_buf` (len(paths) + 1 entries).
+        values_buf (bytes): The JSON-encoded values, concatenated.
+        header (dict): Format metadata (format_version, source, count, digest).
+
+    Attributes:
+        digest (str): SHA-1 of the paths and values; identical KGs share a digest.
+    """
+
+    def __init__(self, paths: list, offsets: np.ndarray, values_buf: bytes, header: dict,
+                 prefixes: dict = None):
+        self.paths = paths
+        self.header = header
+        self.digest = header["digest"]
+        self._offsets = offsets
+        self._values_buf = values_buf
+        self._index = {p: i for i, p in enumerate(paths)}
+        self._prefixes = prefixes if prefixes is not None else _prefix_ranges(paths)
+        self._values = [_UNDECODED] * len(paths)
+        self._flat = None
+
+    @classmethod
+    def from_dict(cls, kg: dict, source: str = None) -> "CompiledKG":
+        """Compiles a nested KG dict in memory."""
+        return cls.from_items(list(_flatten(kg)), source=source)
+
+    @classmethod
+    def from_items(cls, items: list, source: str = None) -> "CompiledKG":
+        """Compiles `(dotted_path, value)` pairs in memory. Paths must be unique."""
+        paths = [p for p, _ in items]
+        if len(set(paths)) != len(paths):
+            raise ValueError("KG paths must be unique.")
+
+        encoded = [json.dumps(v, ensure_ascii=False).encode("utf-8") for _, v in items]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        values_buf = b"".join(encoded)
+
+        digest = hashlib.sha1(json.dumps(paths).encode("utf-8") + values_buf).hexdigest()
+        header = {"format_version": FORMAT_VERSION, "source": source, "count": len(paths), "digest": digest}
+        compiled = cls(paths, offsets, values_buf, header)
+        compiled._values = [v for _, v in items]
+        return compiled
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._index
+
+    def _value(self, i: int):
+        value = self._values[i]
+        if value is _UNDECODED:
+            start, end = self._offsets[i], self._offsets[i + 1]
+            value = self._values[i] = json.loads(self._values_buf[start:end].decode("utf-8"))
+        return value
+
+    def get(self, path: str, default=None):
+        """Returns the value at a dotted leaf path, or `default`."""
+        i = self._index.get(path)
+        return default if i is None else self._value(i)
+
+    def subtree(self, prefix: str) -> dict:
+        """
+        Returns the flattened leaves at or below a dotted path.
+
+        Args:
+            prefix (str): A leaf or interior path, e.g. `impact.economic`. "" selects everything.
+
+        Returns:
+            dict: `dotted_path -> value` in document order; empty if the prefix is unknown.
+        """
+        if prefix in self._index:
+            return {prefix: self.get(prefix)}
+        start, stop = self._prefixes.get(prefix, (0, 0))
+        return {self.paths[i]: self._value(i) for i in range(start, stop)}
+
+    def flat(self) -> dict:
+        """
+        Returns the whole KG flattened, as `hybrid.flatten_kg` would.
+
+        The dict is built once and shared; callers must not modify it.
+        """
+        if self._flat is None:
+            self._flat = {p: self._value(i) for i, p in enumerate(self.paths)}
+        return self._flat
+
+    def to_dict(self) -> dict:
+        """Rebuilds the nested KG."""
+        nested = {}
+        for path, value in self.flat().items():
+            node = nested
+            *parents, leaf = path.split('.')
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        return nested
+
+    def save(self, path: str) -> None:
+        """
+        Writes the compiled KG to a single file.
+
+        Layout: MAGIC, uint64 header length, JSON header (metadata, paths, prefix index),
+        int64 offsets, then the value bytes.
+        """
+        header = dict(self.header, paths=self.paths,
+                      prefixes={p: list(r) for p, r in self._prefixes.items()})
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(np.asarray(self._offsets, dtype="<i8").tobytes())
+            f.write(self._values_buf)
+        os.replace(tmp_path, path)
+
+
+def _prefix_ranges(paths: list) -> dict:
+    # Flattening is depth-first, so every interior path covers one contiguous range of leaves
+    ranges = {"": (0, len(paths))}
+    for i, path in enumerate(paths):
+        parts = path.split('.')
+        for depth in range(1, len(parts)):
+            prefix = '.'.join(parts[:depth])
+            start, _ = ranges.get(prefix, (i, i))
+            ranges[prefix] = (start, i + 1)
+    return ranges
+
+
+def read_compiled_kg(path: str) -> CompiledKG:
+    """
+    Reads a `.kgc` file written by `CompiledKG.save`.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file is not a compiled KG or has an unsupported version.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Compiled KG not found: {path}")
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Not a compiled KG file: {path}")
+
+    pos = len(MAGIC)
+    (header_len,) = struct.unpack_from("<Q", data, pos)
+    pos += 8
+    header = json.loads(data[pos:pos + header_len].decode("utf-8"))
+    pos += header_len
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compiled KG version {header.get('format_version')} in {path}")
+
+    paths = header.pop("paths")
+    prefixes = {p: tuple(r) for p, r in header.pop("prefixes").items()}
+    offsets = np.frombuffer(data, dtype="<i8", count=len(paths) + 1, offset=pos)
+    pos += offsets.nbytes
+    return CompiledKG(paths, offsets, data[pos:], header, prefixes=prefixes)
+
+
+def read_kg_source(path: str) -> dict:
+    """Evaluates a `data = {...}` KG source file (e.g. `data/kg/KG_NEP.txt`) into a dict."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_kg_output(f.read())
+
+
+def compile_kg(kg, out_path: str = None, schema_path: str = None, source: str = None) -> CompiledKG:
+    """
+    Compiles a KG and optionally writes it to disk.
+
+    Args:
+        kg (dict | str): A nested KG dict, a path to a `data = {...}` source file, or raw
+            LLM output containing one.
+        out_path (str): Where to write the `.kgc` file. Nothing is written if None.
+        schema_path (str): If given, the KG must match this schema.
+        source (str): Recorded in the header. Defaults to the source file path, if any.
+
+    Returns:
+        CompiledKG: The compiled KG.
+
+    Raises:
+        ValueError: If the KG cannot be parsed or does not match the schema.
+    """
+    if isinstance(kg, str):
+        if os.path.exists(kg):
+            source = source or kg
+            kg = read_kg_source(kg)
+        else:
+            kg = parse_kg_output(kg)
+
+    if schema_path is not None:
+        problems = validate_kg(kg, load_schema(schema_path))
+        if problems:
+            raise ValueError("KG does not match the schema: " + "; ".join(problems))
+
+    compiled = CompiledKG.from_dict(kg, source=source)
+    if out_path is not None:
+        compiled.save(out_path)
+    return compiled
+
+
+def load_kg(path: str) -> CompiledKG:
+    """
+    Loads a KG in compiled form, cached by path and modification time.
+
+    A `.kgc` path is read directly. Any other path is treated as KG source: its compiled
+    sibling (`<path>.kgc`) is used when it is newer than the source, and rebuilt otherwise.
+
+    Args:
+        path (str): A `.kgc` file or a `data = {...}` KG source file.
+
+    Returns:
+        CompiledKG: The loaded KG.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"KG file not found: {path}")
+
+    cache_key = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = _KG_CACHE.get(cache_key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    if path.endswith(COMPILED_SUFFIX):
+        compiled = read_compiled_kg(path)
+    else:
+        compiled_path = path + COMPILED_SUFFIX
+        compiled = None
+        if os.path.exists(compiled_path) and os.path.getmtime(compiled_path) >= mtime:
+            try:
+                compiled = read_compiled_kg(compiled_path)
+            except ValueError:
+                compiled = None
+        if compiled is None:
+            compiled = compile_kg(path)
+            try:
+                compiled.save(compiled_path)
+            except OSError as e:
+                logger.warning("Could not write %s: %s", compiled_path, e)
+
+    _KG_CACHE[cache_key] = (mtime, compiled)
+    return compiled
+
+
+def as_compiled_kg(kg) -> CompiledKG:
+    """
+    Accepts a CompiledKG, a KG file path or a nested KG dict, and returns a CompiledKG.
+
+    Dicts are compiled once and cached on identity, so they must not be modified afterwards.
+    """
+    if isinstance(kg, CompiledKG):
+        return kg
+    if isinstance(kg, str):
+        return load_kg(kg)
+    if isinstance(kg, dict):
+        cached = _DICT_CACHE.get(id(kg))
+        if cached is None or cached[0] is not kg:
+            cached = _DICT_CACHE[id(kg)] = (kg, CompiledKG.from_dict(kg))
+        return cached[1]
+    raise TypeError(f"Unsupported KG type: {type(kg).__name__}")
+
+
+def combine_kgs(named: dict) -> CompiledKG:
+    """
+    Combines several KGs under top-level names, e.g. for comparison queries.
+
+    Args:
+        named (dict): `name -> KG` (anything accepted by `as_compiled_kg`).
+
+    Returns:
+        CompiledKG: A KG whose paths are `<name>.<path>`. Cached on the parts' digests.
+    """
+    parts = {name: as_compiled_kg(kg) for name, kg in named.items()}
+    key = tuple((name, kg.digest) for name, kg in parts.items())
+    if key not in _COMBINED_CACHE:
+        items = [(f"{name}.{path}", value) for name, kg in parts.items() for path, value in kg.flat().items()]
+        _COMBINED_CACHE[key] = CompiledKG.from_items(items)
+    return _COMBINED_CACHE[key]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile KG source files into indexed .kgc files.")
+    parser.add_argument("kg", nargs="+", help="KG source files (data = {...})")
+    parser.add_argument("--schema", default=None, help="Validate against this schema (e.g. data/kg/schema.json)")
+    args = parser.parse_args()
+
+    for kg_path in args.kg:
+        compiled = compile_kg(kg_path, out_path=kg_path + COMPILED_SUFFIX, schema_path=args.schema)
+        print(f"[KGStore] {kg_path} -> {kg_path + COMPILED_SUFFIX} ({len(compiled)} paths)")
@@ -0,0 +1,147 @@
+"""
+llm_cache.py
+
+Persistent, content-addressed cache for LLM responses, backed by SQLite.
+
+Entries are keyed on a SHA-256 hash of the model, the prompt and any generation
+parameters, so an identical call made on a later run is answered from disk.
+The cache supports a time-to-live, LRU eviction by entry count and total size,
+and keeps hit/miss counters for the current process.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def cache_key(model: str, prompt: str, params: dict = None) -> str:
+    """
+    Computes the content address of an LLM call.
+
+    Args:
+        model (str): Model name.
+        prompt (str): Full prompt text.
+        params (dict): Generation parameters that affect the output (e.g. temperature).
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    payload = json.dumps({"model": model, "prompt": prompt, "params": params or {}},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed LRU cache of LLM responses.
+
+    Args:
+        path (str): SQLite database file, created if missing.
+        ttl (float | None): Seconds after which an entry expires. None keeps entries forever.
+        max_entries (int | None): Maximum number of entries before LRU eviction.
+        max_bytes (int | None): Maximum total response size in bytes before LRU eviction.
+
+    Attributes:
+        hits (int): Lookups answered from the cache in this process.
+        misses (int): Lookups that found no live entry.
+        evictions (int): Entries removed by TTL or LRU eviction.
+    """
+
+    def __init__(self, path: str, ttl: float = None, max_entries: int = 10_000,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key: str):
+        """
+        Looks up a response and marks it as recently used.
+
+        Returns:
+            str | None: The cached response, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = None) -> None:
+        """Stores a response, then evicts least-recently-used entries beyond the size limits."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, model, response, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        if self.ttl is not None:
+            cur = self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while (self.max_entries is not None and count > self.max_entries) or \
+                (self.max_bytes is not None and total > self.max_bytes and count > 1):
+            key, size = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed ASC LIMIT 1"
+            ).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.evictions += 1
+            count, total = count - 1, total - size
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
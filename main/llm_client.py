@@ -2,20 +2,289 @@
 llm_client.py
 
 This module provides a wrapper function to query the Gemini 2.5 Pro model using LiteLLM.
+
+Besides the blocking `give_answer`, it offers:
+- `agive_answer`: an asyncio variant
+- `give_answers` / `agive_answers`: run many prompts with bounded concurrency
+- `give_answer_stream`: yields the response text as the model generates it
+- requests/tokens-per-minute rate limiting shared by every call in the process
+- jittered exponential backoff on rate-limit and transient errors, and per-call timeouts
+- an optional persistent response cache (see `llm_cache.py`), enabled with the
+  `LLM_CACHE_PATH` environment variable or `configure(cache_path=...)`
+
+All settings, including the completion functions themselves, can be changed with
+`configure`, so tests and benchmarks can plug in a local stub and never touch the network.
 """
 
-from litellm
+import asyncio
+import itertools
 import os
+import random
+import threading
+import time
+
+from . import tracing
+from .llm_cache import LLMCache, cache_key
 
 # Load API key securely (can be set in your environment or .env)
 GEMINI_KEY = os.getenv("GEMINI_KEY")
 
-def give_answer(query: str) -> str:
+# SQLite file for the response cache; unset disables caching
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+
+DEFAULT_MODEL = "gemini/gemini-2.5-pro"
+
+# HTTP status codes worth retrying: rate limiting and transient server failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Rough characters-per-token ratio used to reserve tokens before the real usage is known
+CHARS_PER_TOKEN = 4
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests per minute and tokens per minute.
+
+    Both buckets refill continuously. A limit of None disables that bucket.
+
+    Args:
+        requests_per_minute (float | None): Maximum request rate.
+        tokens_per_minute (float | None): Maximum token rate.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._request_budget = float(requests_per_minute or 0)
+        self._token_budget = float(tokens_per_minute or 0)
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_min = (now - self._last) / 60.0
+        self._last = now
+        if self.requests_per_minute:
+            self._request_budget = min(self.requests_per_minute,
+                                       self._request_budget + elapsed_min * self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._token_budget = min(self.tokens_per_minute,
+                                     self._token_budget + elapsed_min * self.tokens_per_minute)
+
+    def _reserve(self, tokens: int) -> float:
+        # Returns 0 and consumes the budget if the call may proceed, else the seconds to wait
+        with self._lock:
+            self._refill()
+            wait = 0.0
+            if self.requests_per_minute and self._request_budget < 1:
+                wait = max(wait, (1 - self._request_budget) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                # A single oversized call may drain the bucket, but never waits forever
+                needed = min(tokens, self.tokens_per_minute)
+                if self._token_budget < needed:
+                    wait = max(wait, (needed - self._token_budget) * 60.0 / self.tokens_per_minute)
+            if wait:
+                return wait
+            if self.requests_per_minute:
+                self._request_budget -= 1
+            if self.tokens_per_minute:
+                self._token_budget -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Blocks until one request of `tokens` estimated tokens may be sent."""
+        while (wait := self._reserve(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """Asyncio variant of `acquire`."""
+        while (wait := self._reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, extra_tokens: int) -> None:
+        """Charges (or refunds, if negative) the difference between estimated and actual usage."""
+        if self.tokens_per_minute and extra_tokens:
+            with self._lock:
+                self._token_budget -= extra_tokens
+
+
+# Process-wide client settings, changed through `configure`
+_settings = {
+    "model": DEFAULT_MODEL,
+    "timeout": 120.0,
+    "max_retries": 5,
+    "backoff_base": 1.0,
+    "backoff_cap": 60.0,
+    # None means LiteLLM, imported on first call because importing it takes seconds
+    "completion_fn": None,
+    "acompletion_fn": None,
+}
+_limiter = RateLimiter()
+_cache = LLMCache(LLM_CACHE_PATH) if LLM_CACHE_PATH else None
+
+
+def configure(model: str = None, timeout: float = None, max_retries: int = None,
+              backoff_base: float = None, backoff_cap: float = None,
+              requests_per_minute: float = None, tokens_per_minute: float = None,
+              completion_fn=None, acompletion_fn=None, cache_path: str = None,
+              cache_ttl: float = None, cache_max_entries: int = None,
+              cache_max_bytes: int = None) -> None:
+    """
+    Updates the process-wide client settings. Arguments left as None are unchanged.
+
+    Args:
+        model (str): LiteLLM model name. Default is "gemini/gemini-2.5-pro".
+        timeout (float): Per-call timeout in seconds. Default is 120.
+        max_retries (int): Retries after the first attempt on retryable errors. Default is 5.
+        backoff_base (float): Base delay in seconds for exponential backoff. Default is 1.
+        backoff_cap (float): Maximum backoff delay in seconds. Default is 60.
+        requests_per_minute (float): Request rate limit. 0 disables it.
+        tokens_per_minute (float): Token rate limit. 0 disables it.
+        completion_fn (callable): Replacement for `litellm.completion`, e.g. a local stub.
+        acompletion_fn (callable): Replacement for `litellm.acompletion`. If only
+            `completion_fn` is given, async calls run it in a worker thread.
+            Passing `completion_fn=False` restores LiteLLM for both.
+        cache_path (str): SQLite file for the response cache. An empty string disables caching.
+        cache_ttl (float): Seconds before a cached response expires.
+        cache_max_entries (int): Maximum cached responses before LRU eviction.
+        cache_max_bytes (int): Maximum total cached response size before LRU eviction.
+    """
+    global _limiter, _cache
+
+    for key, value in (("model", model), ("timeout", timeout), ("max_retries", max_retries),
+                       ("backoff_base", backoff_base), ("backoff_cap", backoff_cap)):
+        if value is not None:
+            _settings[key] = value
+
+    if completion_fn is False:
+        _settings["completion_fn"] = _settings["acompletion_fn"] = None
+    elif completion_fn is not None:
+        _settings["completion_fn"] = completion_fn
+        _settings["acompletion_fn"] = acompletion_fn
+    elif acompletion_fn is not None:
+        _settings["acompletion_fn"] = acompletion_fn
+
+    if requests_per_minute is not None or tokens_per_minute is not None:
+        rpm = _limiter.requests_per_minute if requests_per_minute is None else requests_per_minute
+        tpm = _limiter.tokens_per_minute if tokens_per_minute is None else tokens_per_minute
+        _limiter = RateLimiter(rpm or None, tpm or None)
+
+    if cache_path is not None:
+        if _cache is not None:
+            _cache.close()
+        _cache = LLMCache(cache_path) if cache_path else None
+    if _cache is not None:
+        if cache_ttl is not None:
+            _cache.ttl = cache_ttl
+        if cache_max_entries is not None:
+            _cache.max_entries = cache_max_entries
+        if cache_max_bytes is not None:
+            _cache.max_bytes = cache_max_bytes
+
+
+def get_model() -> str:
+    """Returns the configured LiteLLM model name."""
+    return _settings["model"]
+
+
+def get_cache():
+    """Returns the active `LLMCache`, or None if caching is disabled."""
+    return _cache
+
+
+def _cache_lookup(kwargs: dict, use_cache: bool, refresh: bool):
+    # Returns (key, cached response); key is None when the call must not touch the cache
+    if _cache is None or not use_cache:
+        return None, None
+    key = cache_key(kwargs["model"], kwargs["messages"][0]["content"])
+    return key, (None if refresh else _cache.get(key))
+
+
+def _uses_stub() -> bool:
+    return _settings["completion_fn"] is not None or _settings["acompletion_fn"] is not None
+
+
+def _completion_fns() -> tuple:
+    # Returns (sync, async) completion functions; async is None when only a sync stub is set
+    sync_fn, async_fn = _settings["completion_fn"], _settings["acompletion_fn"]
+    if sync_fn is not None:
+        return sync_fn, async_fn
+    from litellm import completion, acompletion
+    return completion, async_fn or acompletion
+
+
+def _call_kwargs(query: str, model: str, timeout: float) -> dict:
+    if not GEMINI_KEY and not _uses_stub():
+        raise ValueError("GEMINI_KEY is not set in the environment variables.")
+
+    kwargs = {
+        "model": model or _settings["model"],
+        "messages": [{"role": "user", "content": query}],
+        "timeout": timeout or _settings["timeout"],
+    }
+    if GEMINI_KEY:
+        kwargs["api_key"] = GEMINI_KEY
+    return kwargs
+
+
+def _extract_content(response) -> str:
+    try:
+        return response['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Unexpected response format: {response}") from e
+
+
+def _account(response, query: str, content: str) -> None:
+    # Token counts for the current trace span: provider usage when reported, else estimates
+    usage = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+    def _usage(field, fallback):
+        try:
+            return int(usage[field] if isinstance(usage, dict) else getattr(usage, field))
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return fallback
+    tracing.add("llm_calls")
+    tracing.add("prompt_tokens", _usage("prompt_tokens", len(query) // CHARS_PER_TOKEN))
+    tracing.add("completion_tokens", _usage("completion_tokens", len(content or "") // CHARS_PER_TOKEN))
+
+
+def _actual_tokens(response, estimate: int) -> int:
+    try:
+        usage = response['usage']
+        return int(usage['total_tokens']) - estimate
+    except (KeyError, IndexError, TypeError, ValueError):
+        return 0
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status in RETRYABLE_STATUS_CODES:
+        return True
+    # LiteLLM maps provider errors onto these exception names
+    return type(exc).__name__ in {"RateLimitError", "Timeout", "APIConnectionError",
+                                  "ServiceUnavailableError", "InternalServerError"}
+
+
+def _backoff_delay(attempt: int) -> float:
+    # "Full jitter": uniform in [0, min(cap, base * 2^attempt)] so parallel callers spread out
+    return random.uniform(0, min(_settings["backoff_cap"], _settings["backoff_base"] * 2 ** attempt))
+
+
+def give_answer(query: str, model: str = None, timeout: float = None,
+                cache: bool = True, refresh: bool = False) -> str:
     """
     Sends a query to the Gemini 2.5 Pro LLM via LiteLLM and returns the model's response.
 
+    Calls are rate limited, time out after `timeout` seconds, and are retried with
+    jittered exponential backoff on rate-limit and transient errors.
+
     Args:
         query (str): The prompt or question to send to the model.
+        model (str): Overrides the configured model.
+        timeout (float): Overrides the configured per-call timeout, in seconds.
+        cache (bool): Read from and write to the response cache, if enabled. Default is True.
+        refresh (bool): Skip the cache lookup but store the fresh response. Default is False.
 
     Returns:
         str: The content of the model's response.
@@ -23,16 +292,196 @@ def give_answer(query: str) -> str:
     Raises:
         ValueError: If API key is missing or the response structure is invalid.
     """
-    if not GEMINI_KEY:
-        raise ValueError("GEMINI_KEY is not set in the environment variables.")
+    kwargs = _call_kwargs(query, model, timeout)
+    key, cached = _cache_lookup(kwargs, cache, refresh)
+    if cached is not None:
+        tracing.add("llm_cache_hits")
+        return cached
+    estimate = len(query) // CHARS_PER_TOKEN
 
-    response = completion(
-        model="gemini/gemini-2.5-pro",
-        messages=[{"role": "user", "content": query}],
-        api_key=GEMINI_KEY
-    )
+    for attempt in range(_settings["max_retries"] + 1):
+        _limiter.acquire(estimate)
+        try:
+            response = _completion_fns()[0](**kwargs)
+        except Exception as e:
+            if attempt == _settings["max_retries"] or not _is_retryable(e):
+                raise
+            tracing.add("llm_retries")
+            time.sleep(_backoff_delay(attempt))
+            continue
 
+        _limiter.record(_actual_tokens(response, estimate))
+        content = _extract_content(response)
+        _account(response, query, content)
+        return _store(key, kwargs, content)
+
+
+def _extract_delta(chunk) -> str:
+    # Streaming chunks are dicts from stubs and attribute objects from LiteLLM
     try:
-        return response['choices'][0]['message']['content']
-    except (KeyError, IndexError) as e:
-        raise ValueError(f"Unexpected response format: {response}") from e
+        delta = chunk['choices'][0]['delta'] if isinstance(chunk, dict) else chunk.choices[0].delta
+        content = delta.get('content') if isinstance(delta, dict) else getattr(delta, 'content', None)
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
+        raise ValueError(f"Unexpected stream chunk format: {chunk}") from e
+    return content or ""
+
+
+def give_answer_stream(query: str, model: str = None, timeout: float = None,
+                       cache: bool = True, refresh: bool = False):
+    """
+    Streaming variant of `give_answer`: yields the response text in pieces as it is generated.
+
+    The call is rate limited and retried like `give_answer`, but only until the first piece
+    arrives; an error after that is raised to the caller. The complete response is cached,
+    unless it is empty.
+    A cached response is yielded as a single piece.
+
+    Args:
+        query (str): The prompt or question to send to the model.
+        model (str): Overrides the configured model.
+        timeout (float): Overrides the configured per-call timeout, in seconds.
+        cache (bool): Read from and write to the response cache, if enabled. Default is True.
+        refresh (bool): Skip the cache lookup but store the fresh response. Default is False.
+
+    Yields:
+        str: Consecutive pieces of the response.
+
+    Raises:
+        ValueError: If API key is missing or a chunk has an unexpected structure.
+    """
+    kwargs = _call_kwargs(query, model, timeout)
+    key, cached = _cache_lookup(kwargs, cache, refresh)
+    if cached is not None:
+        tracing.add("llm_cache_hits")
+        yield cached
+        return
+    estimate = len(query) // CHARS_PER_TOKEN
+
+    for attempt in range(_settings["max_retries"] + 1):
+        _limiter.acquire(estimate)
+        try:
+            chunks = iter(_completion_fns()[0](**kwargs, stream=True))
+            first = next(chunks, None)
+        except Exception as e:
+            if attempt == _settings["max_retries"] or not _is_retryable(e):
+                raise
+            tracing.add("llm_retries")
+            time.sleep(_backoff_delay(attempt))
+            continue
+        break
+
+    pieces = []
+    if first is not None:
+        for chunk in itertools.chain([first], chunks):
+            piece = _extract_delta(chunk)
+            if piece:
+                pieces.append(piece)
+                yield piece
+
+    # Streams carry no usage block, so token counts are estimated
+    content = "".join(pieces)
+    _account(None, query, content)
+    # An empty stream is not a valid answer; caching it would replay it on every later call
+    if content:
+        _store(key, kwargs, content)
+
+
+def _store(key: str, kwargs: dict, content: str) -> str:
+    if key is not None and content is not None:
+        _cache.put(key, content, model=kwargs["model"])
+    return content
+
+
+async def agive_answer(query: str, model: str = None, timeout: float = None,
+                       cache: bool = True, refresh: bool = False) -> str:
+    """
+    Asyncio variant of `give_answer`, with the same rate limiting, timeout and retries.
+
+    Args:
+        query (str): The prompt or question to send to the model.
+        model (str): Overrides the configured model.
+        timeout (float): Overrides the configured per-call timeout, in seconds.
+        cache (bool): Read from and write to the response cache, if enabled. Default is True.
+        refresh (bool): Skip the cache lookup but store the fresh response. Default is False.
+
+    Returns:
+        str: The content of the model's response.
+    """
+    kwargs = _call_kwargs(query, model, timeout)
+    key, cached = _cache_lookup(kwargs, cache, refresh)
+    if cached is not None:
+        tracing.add("llm_cache_hits")
+        return cached
+    estimate = len(query) // CHARS_PER_TOKEN
+
+    for attempt in range(_settings["max_retries"] + 1):
+        await _limiter.aacquire(estimate)
+        try:
+            sync_fn, async_fn = _completion_fns()
+            if async_fn is not None:
+                call = async_fn(**kwargs)
+            else:
+                call = asyncio.to_thread(sync_fn, **kwargs)
+            response = await asyncio.wait_for(call, timeout=kwargs["timeout"])
+        except Exception as e:
+            if attempt == _settings["max_retries"] or not _is_retryable(e):
+                raise
+            tracing.add("llm_retries")
+            await asyncio.sleep(_backoff_delay(attempt))
+            continue
+
+        _limiter.record(_actual_tokens(response, estimate))
+        content = _extract_content(response)
+        _account(response, query, content)
+        return _store(key, kwargs, content)
+
+
+async def agive_answers(prompts: list, max_concurrency: int = 8, return_exceptions: bool = False,
+                        **kwargs) -> list:
+    """
+    Answers many prompts concurrently on the running event loop.
+
+    Args:
+        prompts (list[str]): Prompts to send.
+        max_concurrency (int): Maximum number of in-flight calls. Default is 8.
+        return_exceptions (bool): Return the exception of a failed call in its place instead
+            of raising it, so the other calls still complete. Default is False.
+        **kwargs: Passed to `agive_answer` (model, timeout, cache, refresh).
+
+    Returns:
+        list[str | Exception]: Responses in the same order as `prompts`.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(prompt: str) -> str:
+        async with semaphore:
+            return await agive_answer(prompt, **kwargs)
+
+    return list(await asyncio.gather(*(_one(p) for p in prompts), return_exceptions=return_exceptions))
+
+
+def give_answers(prompts: list, max_concurrency: int = 8, return_exceptions: bool = False, **kwargs) -> list:
+    """
+    Blocking batch API: answers many prompts concurrently and returns them in order.
+
+    All calls share one event loop, so LiteLLM reuses its HTTP connections across them.
+
+    Args:
+        prompts (list[str]): Prompts to send.
+        max_concurrency (int): Maximum number of in-flight calls. Default is 8.
+        return_exceptions (bool): Return the exception of a failed call in its place instead
+            of raising it, so the other calls still complete. Default is False.
+        **kwargs: Passed to `agive_answer` (model, timeout, cache, refresh).
+
+    Returns:
+        list[str | Exception]: Responses in the same order as `prompts`.
+
+    Raises:
+        RuntimeError: If called from inside a running event loop; use `agive_answers` there.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(agive_answers(prompts, max_concurrency=max_concurrency,
+                                         return_exceptions=return_exceptions, **kwargs))
+    raise RuntimeError("give_answers() cannot run inside an event loop; await agive_answers() instead.")
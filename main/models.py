@@ -0,0 +1,119 @@
+"""
+models.py
+
+Lazy registry for the embedding model and the cross-encoder reranker.
+
+Nothing heavy (torch, sentence_transformers, model weights) is imported or loaded
+until a model is first requested, so modules that only need the LLM (e.g. `judge`,
+`give_query_answer_kg`) start fast. Servers can call `warmup()` at startup to pay
+the loading cost up front.
+
+Models used:
+- Embedding model: mixedbread-ai/mxbai-embed-large-v1
+- Reranker: cross-encoder/ms-marco-MiniLM-L-6-v2
+
+Both are built through `inference.py`, so `INFERENCE_BACKEND` ("torch", "int8" or
+"onnx") and the thread settings there apply to them.
+"""
+
+import threading
+
+EMBEDDING_MODEL_NAME = 'mixedbread-ai/mxbai-embed-large-v1'
+RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+EMBEDDING = "embedding"
+RERANKER = "reranker"
+
+_models = {}
+_factories = {}
+_lock = threading.RLock()
+_device = None
+
+
+def get_device() -> str:
+    """Returns 'cuda' if available, else 'cpu'. Imports torch on first call."""
+    global _device
+    if _device is None:
+        import torch
+
+        # Select GPU if available
+        _device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        print(f"[EmbeddingGenerator] Using device: {_device}")
+    return _device
+
+
+def _load_embedding_model():
+    from .inference import load_embedding_model
+    return load_embedding_model(EMBEDDING_MODEL_NAME, device=get_device())
+
+
+def _load_reranker():
+    from .inference import load_reranker
+    return load_reranker(RERANKER_MODEL_NAME, device=get_device())
+
+
+_factories[EMBEDDING] = _load_embedding_model
+_factories[RERANKER] = _load_reranker
+
+
+def register_model(name: str, model=None, factory=None) -> None:
+    """
+    Overrides a model in the registry, e.g. with a stand-in for offline runs.
+
+    Args:
+        name (str): Registry name, `EMBEDDING` or `RERANKER` (or a new name).
+        model: An already constructed model. Takes precedence over `factory`.
+        factory (callable): Zero-argument callable that builds the model on first use.
+    """
+    with _lock:
+        if model is not None:
+            _models[name] = model
+        elif factory is not None:
+            _factories[name] = factory
+            _models.pop(name, None)
+        else:
+            raise ValueError("register_model() needs a model or a factory.")
+
+
+def get_model(name: str):
+    """
+    Returns a model, loading it on first use.
+
+    Raises:
+        KeyError: If no model or factory is registered under `name`.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        # Another thread may have finished loading while we waited for the lock
+        if name not in _models:
+            _models[name] = _factories[name]()
+        return _models[name]
+
+
+def get_embedding_model():
+    """Returns the SentenceTransformer embedding model, loading it on first use."""
+    return get_model(EMBEDDING)
+
+
+def get_reranker():
+    """Returns the CrossEncoder reranker, loading it on first use."""
+    return get_model(RERANKER)
+
+
+def is_loaded(name: str) -> bool:
+    """Returns whether a model has already been loaded."""
+    return name in _models
+
+
+def warmup(names=(EMBEDDING, RERANKER)) -> None:
+    """
+    Loads the given models now instead of on first use. Intended for server startup.
+
+    Args:
+        names (tuple[str]): Registry names to load. Defaults to both models.
+    """
+    for name in names:
+        get_model(name)
@@ -0,0 +1,437 @@
+"""
+offline.py
+
+Deterministic stand-ins for the models and the LLM, plus synthetic corpora and KGs,
+so every pipeline can run (and be benchmarked) without model weights or network access.
+
+- `HashingEncoder`: SentenceTransformer-compatible encoder (signed feature-hashed bag of words)
+- `OverlapReranker`: CrossEncoder-compatible scorer (query-term overlap)
+- `StubLLM`: `litellm.completion`-compatible stub that answers each pipeline prompt in
+  the format the pipeline parses
+- `use_offline_models`: registers the three in `models` and `llm_client`
+
+Each stand-in can sleep a fixed time per call plus a time per item, to imitate the cost
+of the real model. Synthetic data is generated from a seed and is identical across runs.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_CONSONANTS = "bdfgklmnprstvz"
+_VOWELS = "aeiou"
+
+
+def _words(text: str) -> list:
+    return _WORD_RE.findall(text.lower())
+
+
+def _seed_of(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class HashingEncoder:
+    """
+    Deterministic SentenceTransformer stand-in: each word adds +-1 to one of `dim`
+    buckets chosen by its CRC32, so texts sharing words get similar vectors.
+
+    Args:
+        dim (int): Embedding dimension. Default is 1024 (as mxbai-embed-large-v1).
+        latency (float): Seconds slept per `encode` call.
+        latency_per_text (float): Additional seconds slept per encoded text.
+    """
+
+    model_id = "offline/hashing-encoder"
+
+    def __init__(self, dim: int = 1024, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self._features = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def features(self, words: list) -> tuple:
+        """Returns the (bucket, sign) arrays of the given words."""
+        buckets = np.empty(len(words), dtype=np.int64)
+        signs = np.empty(len(words), dtype=np.float32)
+        for i, word in enumerate(words):
+            feature = self._features.get(word)
+            if feature is None:
+                h = _seed_of(word)
+                feature = self._features[word] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+            buckets[i], signs[i] = feature
+        return buckets, signs
+
+    def encode_word_ids(self, word_ids: np.ndarray, vocabulary: list,
+                        normalize_embeddings: bool = True) -> np.ndarray:
+        """
+        Encodes texts given as rows of word ids into `vocabulary`, without building strings.
+
+        Produces the same vectors as `encode` on the corresponding space-joined texts.
+        """
+        buckets, signs = self.features(vocabulary)
+        rows = np.repeat(np.arange(word_ids.shape[0]), word_ids.shape[1])
+        flat = rows * self.dim + buckets[word_ids.ravel()]
+        out = np.bincount(flat, weights=signs[word_ids.ravel()],
+                          minlength=word_ids.shape[0] * self.dim).reshape(-1, self.dim).astype(np.float32)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = None,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        time.sleep(self.latency + self.latency_per_text * len(sentences))
+
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            buckets, signs = self.features(_words(sentence))
+            np.add.at(out[i], buckets, signs)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+class OverlapReranker:
+    """
+    Deterministic CrossEncoder stand-in: scores a pair by the share of query words found
+    in the passage.
+
+    Args:
+        latency (float): Seconds slept per `predict` call.
+        latency_per_pair (float): Additional seconds slept per scored pair.
+    """
+
+    model_id = "offline/overlap-reranker"
+
+    def __init__(self, latency: float = 0.0, latency_per_pair: float = 0.0):
+        self.latency = latency
+        self.latency_per_pair = latency_per_pair
+
+    def predict(self, sentences, batch_size: int = 32, show_progress_bar: bool = None, **kwargs) -> np.ndarray:
+        sentences = list(sentences)
+        time.sleep(self.latency + self.latency_per_pair * len(sentences))
+        scores = np.empty(len(sentences), dtype=np.float32)
+        for i, (query, passage) in enumerate(sentences):
+            query_words, passage_words = set(_words(query)), set(_words(passage))
+            scores[i] = len(query_words & passage_words) / max(len(query_words), 1)
+        return scores
+
+
+class StubLLM:
+    """
+    Deterministic `litellm.completion` stand-in for the pipeline prompts.
+
+    - KG triple extraction (`FLATTENED_KG_DATA`): the 10 triples sharing most words with the query
+    - sub-query generation (`KEY_KG_FACTS`): a JSON list of questions built from the facts
+    - RQ-RAG decomposition ("numbered sub-questions"): a numbered list
+    - judging (`INPUT FOR ADJUDICATION`): AIA-1 scores growing with each text's distinct words
+    - anything else: an answer made of words drawn from the prompt
+
+    Called with `stream=True`, it returns the answer as a stream of word-sized chunks.
+
+    Args:
+        latency (float): Seconds slept per call.
+        seconds_per_1k_tokens (float): Additional seconds per 1000 prompt tokens (characters / 4).
+        answer_words (int): Length of free-text answers.
+        n_sub_queries (int): Number of sub-queries returned for the hybrid pipeline.
+        output_tokens_per_second (float | None): Generation speed (characters / 4 per second).
+            Streamed answers arrive at this rate; other answers are returned after the whole
+            generation time. None makes generation instant.
+    """
+
+    model_id = "offline/stub-llm"
+
+    def __init__(self, latency: float = 0.0, seconds_per_1k_tokens: float = 0.0,
+                 answer_words: int = 200, n_sub_queries: int = 15, output_tokens_per_second: float = None):
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.output_tokens_per_second = output_tokens_per_second
+        self.answer_words = answer_words
+        self.n_sub_queries = n_sub_queries
+        self.calls = 0
+
+    def _delay(self, prompt: str) -> float:
+        return self.latency + self.seconds_per_1k_tokens * len(prompt) / 4000
+
+    def _generation_time(self, content: str) -> float:
+        return len(content) / 4 / self.output_tokens_per_second if self.output_tokens_per_second else 0.0
+
+    @staticmethod
+    def _json_after(prompt: str, marker: str):
+        return json.loads(prompt.split(marker, 1)[1].strip())
+
+    @staticmethod
+    def _quoted_after(prompt: str, marker: str) -> str:
+        return prompt.split(marker, 1)[1].strip().splitlines()[0].strip().strip('"')
+
+    def respond(self, prompt: str) -> str:
+        """Returns the stub's answer to a prompt."""
+        if "FLATTENED_KG_DATA:" in prompt:
+            query_words = set(_words(self._quoted_after(prompt, "USER_QUERY:")))
+            flat_kg = self._json_after(prompt, "FLATTENED_KG_DATA:")
+            ranked = sorted(flat_kg, key=lambda k: -len(query_words & set(_words(f"{k} {flat_kg[k]}"))))
+            return json.dumps({k: flat_kg[k] for k in ranked[:10]})
+
+        if "KEY_KG_FACTS:" in prompt:
+            facts = self._json_after(prompt, "KEY_KG_FACTS:")
+            query = self._quoted_after(prompt, "ORIGINAL_QUERY:")
+            keys = list(facts) or ["event"]
+            questions = []
+            for i in range(self.n_sub_queries):
+                key = keys[i % len(keys)]
+                detail = " ".join(_words(str(facts.get(key, "")))[:6])
+                questions.append(f"What does the record say about {key.replace('.', ' ').replace('_', ' ')} "
+                                 f"({detail}) for: {query}?")
+            return json.dumps(questions)
+
+        if "numbered sub-questions" in prompt:
+            query = prompt.split("User query:", 1)[1].split("\n", 1)[0].strip()
+            return "\n".join(f"{i}. {aspect} {query}" for i, aspect in
+                             enumerate(("What happened in", "What caused", "What were the impacts of",
+                                        "How did authorities respond to"), 1))
+
+        if "**INPUT FOR ADJUDICATION**" in prompt:
+            body = prompt.split("**INPUT FOR ADJUDICATION**", 1)[1]
+            lines = ["### Adjudication", ""]
+            for i in range(1, 5):
+                text = body.split(f"**Text {i} (T{i}):**", 1)[1].split(f"**Text {i + 1} (T{i + 1}):**", 1)[0]
+                score = min(10, len(set(_words(text))) // 10)
+                lines += [f"**Text {i} (T{i}): {score}/10**", "*   **Reasoning:**",
+                          f"    *   {len(set(_words(text)))} distinct words.", ""]
+            return "\n".join(lines + ["---", "**Verdict:** The text with the most distinct words is best."])
+
+        rng = np.random.default_rng(_seed_of(prompt))
+        words = _words(prompt) or ["answer"]
+        return " ".join(words[i] for i in rng.integers(0, len(words), self.answer_words))
+
+    def _response(self, prompt: str, content: str) -> dict:
+        self.calls += 1
+        return {"choices": [{"message": {"content": content}}],
+                "usage": {"total_tokens": (len(prompt) + len(content)) // 4}}
+
+    def _stream(self, prompt: str, content: str):
+        self.calls += 1
+        for piece in re.findall(r"\S+\s*", content):
+            time.sleep(self._generation_time(piece))
+            yield {"choices": [{"delta": {"content": piece}}]}
+
+    def __call__(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        time.sleep(self._delay(prompt))
+        content = self.respond(prompt)
+        if kwargs.get("stream"):
+            return self._stream(prompt, content)
+        time.sleep(self._generation_time(content))
+        return self._response(prompt, content)
+
+    async def acompletion(self, **kwargs) -> dict:
+        prompt = kwargs["messages"][0]["content"]
+        await asyncio.sleep(self._delay(prompt))
+        content = self.respond(prompt)
+        await asyncio.sleep(self._generation_time(content))
+        return self._response(prompt, content)
+
+
+def use_offline_models(encoder=None, reranker=None, llm=None) -> tuple:
+    """
+    Registers stand-ins as the shared embedding model, reranker and LLM.
+
+    The LLM model name is switched to the stub's, so stub answers never share cache
+    entries with real ones.
+
+    Args:
+        encoder: Defaults to `HashingEncoder()`.
+        reranker: Defaults to `OverlapReranker()`.
+        llm: Defaults to `StubLLM()`.
+
+    Returns:
+        tuple: (encoder, reranker, llm).
+    """
+    from .llm_client import configure
+    from .models import EMBEDDING, RERANKER, register_model
+
+    encoder = encoder or HashingEncoder()
+    reranker = reranker or OverlapReranker()
+    llm = llm or StubLLM()
+    register_model(EMBEDDING, model=encoder)
+    register_model(RERANKER, model=reranker)
+    configure(model=llm.model_id, completion_fn=llm, acompletion_fn=getattr(llm, "acompletion", None))
+    return encoder, reranker, llm
+
+
+def synthetic_vocabulary(n_topics: int = 64, words_per_topic: int = 200, n_common: int = 500,
+                         seed: int = 0) -> tuple:
+    """
+    Generates pronounceable made-up words: a common pool and one pool per topic.
+
+    Returns:
+        tuple[list[str], list[np.ndarray]]: The vocabulary, and for each topic the ids of its words.
+            Ids `0 .. n_common - 1` are the common words.
+    """
+    rng = np.random.default_rng(seed)
+    syllables = [c + v for c in _CONSONANTS for v in _VOWELS]
+    needed = n_common + n_topics * words_per_topic
+    vocabulary = {}
+    while len(vocabulary) < needed:
+        rows = rng.integers(0, len(syllables), (needed, 4))
+        lengths = rng.integers(2, 5, needed)
+        for row, length in zip(rows.tolist(), lengths.tolist()):
+            vocabulary.setdefault("".join(syllables[j] for j in row[:length]), None)
+    vocabulary = list(vocabulary)[:needed]
+    topics = [np.arange(n_common + t * words_per_topic, n_common + (t + 1) * words_per_topic)
+              for t in range(n_topics)]
+    return vocabulary, topics
+
+
+def synthetic_word_ids(n_chunks: int, topics: list, words_per_chunk: int = 100, n_common: int = 500,
+                       topic_share: float = 0.5, seed: int = 0) -> tuple:
+    """
+    Draws chunks as rows of word ids: each chunk mixes words of one topic with common words.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (n_chunks, words_per_chunk) word ids, and each chunk's topic.
+    """
+    rng = np.random.default_rng(seed)
+    chunk_topics = rng.integers(0, len(topics), n_chunks)
+    topic_words = np.stack(topics)
+    ids = rng.integers(0, n_common, (n_chunks, words_per_chunk))
+    from_topic = rng.random((n_chunks, words_per_chunk)) < topic_share
+    picks = topic_words[chunk_topics[:, None], rng.integers(0, topic_words.shape[1], (n_chunks, words_per_chunk))]
+    ids[from_topic] = picks[from_topic]
+    return ids, chunk_topics
+
+
+def write_synthetic_text(path: str, n_chunks: int, words_per_chunk: int = 100, n_topics: int = 64,
+                         seed: int = 0) -> str:
+    """Writes a text file of `n_chunks * words_per_chunk` words, one chunk per line."""
+    vocabulary, topics = synthetic_vocabulary(n_topics, seed=seed)
+    ids, _ = synthetic_word_ids(n_chunks, topics, words_per_chunk, seed=seed + 1)
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in ids:
+            f.write(" ".join(vocabulary[i] for i in row) + "\n")
+    return path
+
+
+def synthetic_store(store_dir: str, n_chunks: int, encoder: HashingEncoder, words_per_chunk: int = 100,
+                    n_topics: int = 64, batch_size: int = 20_000, seed: int = 0):
+    """
+    Writes a synthetic vector store of topical chunks, streaming in batches.
+
+    Embeddings are computed from word ids with `HashingEncoder.encode_word_ids`, which matches
+    what the encoder returns for the chunk texts, so queries encoded at search time land in
+    the same space. Each chunk's `source` metadata is `topic_<t>.txt`.
+
+    Args:
+        store_dir (str): Output directory (replaced if it exists).
+        n_chunks (int): Number of chunks.
+        encoder (HashingEncoder): The stand-in encoder.
+        words_per_chunk (int): Words per chunk.
+        n_topics (int): Number of topics.
+        batch_size (int): Chunks generated and written per batch.
+        seed (int): Random seed.
+
+    Returns:
+        VectorStore: The loaded store.
+    """
+    import shutil
+
+    from .vector_store import StoreWriter, load_store
+
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir)
+    vocabulary, topics = synthetic_vocabulary(n_topics, seed=seed)
+    writer = StoreWriter(store_dir, encoder.model_id, encoder.dim, resume=False)
+    for start in range(0, n_chunks, batch_size):
+        n = min(batch_size, n_chunks - start)
+        ids, chunk_topics = synthetic_word_ids(n, topics, words_per_chunk, seed=seed + 1 + start)
+        texts = [" ".join(vocabulary[i] for i in row) for row in ids]
+        writer.append(texts, encoder.encode_word_ids(ids, vocabulary),
+                      metadata=[{"source": f"topic_{t}.txt"} for t in chunk_topics.tolist()])
+    return load_store(store_dir)
+
+
+def synthetic_kg(schema: dict, topic_words: list, name: str, seed: int = 0) -> dict:
+    """
+    Fills a KG schema with deterministic values drawn from a topic's words.
+
+    Args:
+        schema (dict): The KG schema (see `data/kg/schema.json`).
+        topic_words (list[str]): Words the values are made of.
+        name (str): Event name, used as the country and region so routing can find the KG.
+        seed (int): Random seed.
+
+    Returns:
+        dict: A KG with the schema's shape.
+    """
+    rng = np.random.default_rng(seed)
+
+    def fill(node):
+        kg = {}
+        for key, placeholder in node.items():
+            if isinstance(placeholder, dict):
+                kg[key] = fill(placeholder)
+            elif key in ("country", "region"):
+                kg[key] = f"{name.capitalize()} {key}"
+            elif not isinstance(placeholder, str):
+                kg[key] = placeholder
+            elif placeholder in ("<number>", "<value>", "<magnitude>", "<percentage>"):
+                kg[key] = str(int(rng.integers(1, 100_000)))
+            else:
+                n_words = 3 if "comma-separated" in placeholder else int(rng.integers(8, 20))
+                words = [topic_words[i] for i in rng.integers(0, len(topic_words), n_words)]
+                text = ", ".join(words) if "comma-separated" in placeholder else " ".join(words).capitalize() + "."
+                kg[key] = f"{text} Source: synthetic report {int(rng.integers(1, 50))}"
+        return kg
+
+    return fill(schema)
+
+
+def synthetic_registry(n_kgs: int, schema: dict, n_topics: int = 64, seed: int = 0):
+    """
+    Builds a `KGRegistry` of synthetic event KGs, one per topic of `synthetic_store`.
+
+    KG `i` is named after a made-up word (also its alias) and its sources are the chunks
+    of topic `i % n_topics`.
+
+    Returns:
+        tuple[KGRegistry, list[str]]: The registry and each KG's alias word.
+    """
+    from .kg_registry import KGRegistry
+
+    vocabulary, topics = synthetic_vocabulary(n_topics, seed=seed)
+    registry, aliases = KGRegistry(), []
+    for i in range(n_kgs):
+        topic = i % n_topics
+        topic_words = [vocabulary[j] for j in topics[topic]]
+        alias = f"{topic_words[i // n_topics % len(topic_words)]}{i}"
+        kg = synthetic_kg(schema, topic_words, alias, seed=seed + i)
+        registry.register(f"event_{i}", kg, aliases=[alias], sources=[f"topic_{topic}.txt"])
+        aliases.append(alias)
+    return registry, aliases
+
+
+def synthetic_queries(n_queries: int, n_topics: int = 64, words_per_query: int = 6, aliases: list = None,
+                      seed: int = 0) -> list:
+    """
+    Generates questions from topic words; with `aliases`, each names one synthetic event.
+    """
+    vocabulary, topics = synthetic_vocabulary(n_topics, seed=seed)
+    rng = np.random.default_rng(seed + 7)
+    queries = []
+    for q in range(n_queries):
+        topic = q % n_topics
+        words = " ".join(vocabulary[i] for i in rng.choice(topics[topic], words_per_query, replace=False))
+        event = f" during {aliases[q % len(aliases)]}" if aliases else ""
+        queries.append(f"What happened to {words}{event}?")
+    return queries
@@ -4,65 +4,77 @@
 rag_answer.py
 
 This module implements a full Retrieval-Augmented Generation (RAG) pipeline:
-1. Embedding-based similarity search (using SentenceTransformer).
+1. Embedding-based similarity search (using SentenceTransformer), fused with BM25
+   candidates when the store has a lexical index.
 2. Cross-encoder reranking of top-k similar passages.
 3. Final answer generation using context-limited prompting.
 """
 
 import numpy as np
-import pandas as pd
-import torch
-from sentence_transformers.util import cos_sim
+from . import tracing
+from .context_packer import DEFAULT_CONTEXT_TOKENS, pack_context
 from .llm_client import give_answer
-from .embedding_generator import embedding_model, reranker
-
-
-def give_query_answer_rag(query: str, embedding_csv: str = "embedding.csv",
-                          k: int = 10, m: int = 3) -> str:
+from .models import get_embedding_model
+from .rerank_service import get_rerank_service
+from .ann_index import open_index
+from .bm25_index import open_bm25_index
+from .retrieval import search_candidates
+from .retrieval_server import get_client
+from .tracing import PipelineResult
+from .vector_store import DEFAULT_STORE_DIR, as_vector_store, resolve_embedding_source
+
+
+def give_query_answer_rag(query: str, embedding_store=DEFAULT_STORE_DIR,
+                          k: int = 10, m: int = 3, return_result: bool = False,
+                          context_tokens: int = DEFAULT_CONTEXT_TOKENS, trim_sentences: bool = False,
+                          retrieval_server: str = None, embedding_csv: str = None):
     """
     Answers a query using a RAG pipeline based on dense vector search + reranking.
 
     Args:
         query (str): The user's question.
-        embedding_csv (str): Path to the CSV containing precomputed embeddings.
+        embedding_store: Vector store directory (or `VectorStore`) with precomputed embeddings.
+            A legacy embeddings CSV path is also accepted, and `embedding.csv` is used when
+            the default store directory does not exist.
         k (int): Number of top similar chunks to retrieve.
         m (int): Number of top reranked chunks to include in final context.
+        return_result (bool): Return a `PipelineResult` (answer, context, trace) instead of
+            the answer string.
+        context_tokens (int | None): Token budget of the final context. None means no limit.
+        trim_sentences (bool): Cut chunks to the sentences sharing terms with the query.
+        retrieval_server (str): URL of a running `retrieval_server` to retrieve through instead
+            of loading the store and models here. Defaults to `RETRIEVAL_SERVER_URL`, if set.
+        embedding_csv (str): Deprecated alias of `embedding_store`.
 
     Returns:
-        str: The answer generated using only the retrieved and reranked data.
+        str | PipelineResult: The answer generated using only the retrieved and reranked data.
     """
-    # Load the embedded document chunks
-    df = pd.read_csv(embedding_csv)
-    if 'embedding' not in df.columns or 'text' not in df.columns:
-        raise ValueError("CSV must contain 'embedding' and 'text' columns.")
+    embedding_store = resolve_embedding_source(embedding_store, embedding_csv)
+    with tracing.span("rag_answer", query=query) as root:
+        result = PipelineResult(query, trace=root)
+        _run_rag(result, embedding_store, k, m, context_tokens, trim_sentences, retrieval_server)
+    return result if return_result else result.answer
 
-    embeddings = np.array([
-        np.fromstring(emb, sep=',', dtype=np.float32) for emb in df['embedding']
-    ])
-
-    # Encode the query with the special instruction prompt
-    prompt = "Represent this sentence for searching relevant passages: "
-    query_embedding = embedding_model.encode(
-        [prompt + query], normalize_embeddings=True
-    )[0].astype(np.float32)
 
-    # Compute cosine similarity with all document embeddings
-    query_tensor = torch.tensor(query_embedding).unsqueeze(0)
-    embedding_tensor = torch.tensor(embeddings)
-    similarities = cos_sim(query_tensor, embedding_tensor)[0].numpy()
+def _run_rag(result: PipelineResult, embedding_store, k: int, m: int, context_tokens: int,
+             trim_sentences: bool, retrieval_server: str = None) -> None:
+    query = result.query
 
-    # Retrieve top-k most similar chunks
-    top_k_indices = np.argsort(similarities)[::-1][:k]
-    top_k_texts = df.iloc[top_k_indices]['text'].tolist()
+    # Queries are encoded with the special instruction prompt
+    prompt = "Represent this sentence for searching relevant passages: "
 
-    # Rerank using cross-encoder
-    pairs = [(query, passage) for passage in top_k_texts]
-    scores = reranker.predict(pairs)
-    sorted_indices = np.argsort(scores)[::-1]
-    top_m_texts = [top_k_texts[i] for i in sorted_indices[:m]]
+    client = get_client(retrieval_server)
+    if client is not None:
+        # The server holds the store and warm models; it retrieves, reranks and packs
+        with tracing.span("retrieval", remote=client.url):
+            _, packed = client.retrieve([query], k=k, m=m, query_prompt=prompt,
+                                        token_budget=context_tokens, trim_sentences=trim_sentences)
+    else:
+        packed = _retrieve_local(query, embedding_store, k, m, prompt, context_tokens, trim_sentences)
+    result.context = packed.chunks
 
     # Concatenate final context
-    data = " ".join(top_m_texts)
+    data = packed.join(" ")
 
     # Create a strict instruction prompt and get the answer
     final_prompt = f"""You are an expert assistant.
@@ -82,4 +94,38 @@ Your task:
 – Explain each point in detail, using examples or references to the data where helpful.
 – Do not mention or infer anything that isn’t explicitly in the data.
 """
-    return give_answer(final_prompt)
+    with tracing.span("synthesis"):
+        result.answer = give_answer(final_prompt)
+
+
+def _retrieve_local(query: str, embedding_store, k: int, m: int, prompt: str, context_tokens: int,
+                    trim_sentences: bool):
+    # Open the memory-mapped document chunks
+    store = as_vector_store(embedding_store)
+
+    with tracing.span("encode"):
+        query_embedding = get_embedding_model().encode(
+            [prompt + query], normalize_embeddings=True
+        )[0].astype(np.float32)
+
+    # Never retrieve more candidates than the reranker accepts in one request
+    reranker = get_rerank_service()
+    if reranker.max_pairs is not None:
+        k = max(1, min(k, reranker.max_pairs))
+
+    # Retrieve top-k candidates: dense (exact scan or ANN index), fused with BM25 when the store has it
+    top_k_indices = search_candidates([query], query_embedding[None, :], open_index(store), k,
+                                      sparse_index=open_bm25_index(store))
+    top_k_texts = store.texts(top_k_indices[0])
+
+    # Rerank using cross-encoder (scores are cached across calls)
+    pairs = [(query, passage) for passage in top_k_texts]
+    with tracing.span("rerank") as rerank_span:
+        rerank_span.add("pairs_reranked", len(pairs))
+        scores = reranker.predict(pairs)
+    sorted_indices = np.argsort(scores)[::-1]
+    top_m_hits = [(top_k_indices[0][i], scores[i]) for i in sorted_indices[:m]]
+
+    # Pack the top-m chunks: near-duplicates dropped, within the token budget
+    return pack_context(top_m_hits, store, queries=[query], token_budget=context_tokens,
+                        trim_sentences=trim_sentences)
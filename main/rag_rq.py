@@ -7,25 +7,50 @@ Implements a RQ Retrieval-Augmented Generation (RQ-RAG) system that:
 3. Reranks and combines them for final answering.
 """
 
-import numpy as np
-import pandas as pd
-import torch
-from sentence_transformers.util import cos_sim
-
+from . import tracing
+from .context_packer import DEFAULT_CONTEXT_TOKENS, pack_context
 from .llm_client import give_answer
-from .embedding_generator import embedding_model, reranker
-
-def give_query_answer_rag_multihop(query: str, embedding_csv: str = "embedding.csv") -> str:
+from .models import get_embedding_model
+from .rerank_service import get_rerank_service
+from .retrieval import QUERY_PROMPT, batch_retrieve_indices
+from .retrieval_server import get_client
+from .tracing import PipelineResult
+from .vector_store import DEFAULT_STORE_DIR, as_vector_store, resolve_embedding_source
+
+def give_query_answer_rag_multihop(query: str, embedding_store=DEFAULT_STORE_DIR,
+                                   return_result: bool = False, context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                                   trim_sentences: bool = False, retrieval_server: str = None,
+                                   embedding_csv: str = None):
     """
     Answers a complex query using a multi-hop RAG pipeline by decomposing it into sub-questions.
 
     Args:
         query (str): User's original complex query.
-        embedding_csv (str): Path to CSV file with text chunks and their embeddings.
+        embedding_store: Vector store directory (or `VectorStore`) with text chunks and their embeddings.
+            A legacy embeddings CSV path is also accepted, and `embedding.csv` is used when
+            the default store directory does not exist.
+        return_result (bool): Return a `PipelineResult` (answer, sub-queries, context, trace)
+            instead of the answer string.
+        context_tokens (int | None): Token budget of the retrieved context. None means no limit.
+        trim_sentences (bool): Cut retrieved chunks to the sentences sharing terms with their sub-query.
+        retrieval_server (str): URL of a running `retrieval_server` to retrieve through instead
+            of loading the store and models here. Defaults to `RETRIEVAL_SERVER_URL`, if set.
+        embedding_csv (str): Deprecated alias of `embedding_store`.
 
     Returns:
-        str: Final answer generated using retrieved and reranked passages.
+        str | PipelineResult: Final answer generated using retrieved and reranked passages.
     """
+    embedding_store = resolve_embedding_source(embedding_store, embedding_csv)
+    with tracing.span("rag_multihop", query=query) as root:
+        result = PipelineResult(query, trace=root)
+        _run_multihop(result, embedding_store, context_tokens, trim_sentences, retrieval_server)
+    return result if return_result else result.answer
+
+
+def _run_multihop(result: PipelineResult, embedding_store, context_tokens: int, trim_sentences: bool,
+                  retrieval_server: str = None) -> None:
+    query = result.query
+
     # --- Step 1: Decompose query into sub-queries ---
     sub_query_instruction = f"""You are a helpful assistant. Break the user's question into independent sub-queries to better search for information.
 
@@ -35,7 +60,8 @@ Respond with clearly numbered sub-questions like:
 1. ...
 2. ...
 """
-    sub_queries_text = give_answer(sub_query_instruction)
+    with tracing.span("decomposition"):
+        sub_queries_text = give_answer(sub_query_instruction)
 
     # Parse numbered sub-questions from model output
     sub_queries = []
@@ -46,40 +72,30 @@ Respond with clearly numbered sub-questions like:
 
     if not sub_queries:
         raise ValueError("Failed to extract sub-queries. Model output:\n" + sub_queries_text)
-
-    # --- Step 2: Load embeddings from CSV ---
-    df = pd.read_csv(embedding_csv)
-    if 'embedding' not in df.columns or 'text' not in df.columns:
-        raise ValueError("CSV must contain 'embedding' and 'text' columns.")
-
-    embeddings = np.array([
-        np.fromstring(emb, sep=',', dtype=np.float32) for emb in df['embedding']
-    ])
-    embedding_tensor = torch.tensor(embeddings)
-
-    # --- Step 3: For each sub-query, retrieve top-k, rerank top-m ---
-    all_retrieved_texts = []
-
-    for sub_q in sub_queries:
-        prompt = "Represent this sentence for searching relevant passages: "
-        query_with_prompt = prompt + sub_q
-        query_embedding = embedding_model.encode([query_with_prompt], normalize_embeddings=True)[0].astype(np.float32)
-        query_tensor = torch.tensor(query_embedding).unsqueeze(0)
-
-        similarities = cos_sim(query_tensor, embedding_tensor)[0].numpy()
-        top_k_indices = np.argsort(similarities)[::-1][:5]
-        top_k_texts = df.iloc[top_k_indices]['text'].tolist()
-
-        # Rerank using cross-encoder
-        pairs = [(sub_q, passage) for passage in top_k_texts]
-        scores = reranker.predict(pairs)
-        sorted_indices = np.argsort(scores)[::-1]
-        top_texts = [top_k_texts[i] for i in sorted_indices[:3]]
-
-        all_retrieved_texts.extend(top_texts)
+    result.sub_queries = sub_queries
+
+    client = get_client(retrieval_server)
+    if client is not None:
+        # --- Steps 2-3: The server holds the store and warm models; it retrieves, reranks and packs ---
+        with tracing.span("retrieval", sub_queries=len(sub_queries), remote=client.url):
+            _, packed = client.retrieve(sub_queries, k=5, m=3, query_prompt=QUERY_PROMPT,
+                                        token_budget=context_tokens, trim_sentences=trim_sentences)
+    else:
+        # --- Step 2: Open the memory-mapped embedding store ---
+        store = as_vector_store(embedding_store)
+
+        # --- Step 3: Retrieve top-k for all sub-queries at once, rerank the union, keep top-m each ---
+        with tracing.span("retrieval", sub_queries=len(sub_queries)):
+            hits = batch_retrieve_indices(sub_queries, store, get_embedding_model(), get_rerank_service(),
+                                          k=5, m=3, query_prompt=QUERY_PROMPT)
+            # Each chunk once, best first, near-duplicates dropped, within the token budget
+            packed = pack_context(hits, store, queries=sub_queries, token_budget=context_tokens,
+                                  trim_sentences=trim_sentences)
+
+    result.context = packed.chunks
 
     # --- Step 4: Compose final answer using retrieved data only ---
-    combined_data = " ".join(all_retrieved_texts)
+    combined_data = packed.join(" ")
 
     final_prompt = f"""You are an expert assistant.
 Only use the information provided in the data block to craft your answer. Do NOT bring in any outside knowledge or assumptions.
@@ -99,4 +115,5 @@ Your task:
 – Do not mention or infer anything that isn’t explicitly in the data.
 """
 
-    return give_answer(final_prompt)
+    with tracing.span("synthesis"):
+        result.answer = give_answer(final_prompt)
@@ -0,0 +1,294 @@
+"""
+rerank_service.py
+
+Caching, batching front end for the cross-encoder reranker.
+
+`RerankService` exposes the same `predict(pairs, batch_size=...)` call as a
+`CrossEncoder`, so it can be passed anywhere a reranker is expected. In front of the
+model it adds:
+- a score cache keyed on (normalized query, chunk id, model id): a bounded in-memory
+  LRU, optionally backed by a bounded SQLite LRU table shared across runs
+  (`RERANK_CACHE_PATH` environment variable or the `cache_path` argument)
+- length-bucketed dynamic batching: uncached pairs are sorted by length and cut into
+  batches of similar length, capped by pair count and by padded tokens, so short pairs
+  are not padded to the length of long ones
+- a cap on the number of pairs a single request may score (`max_pairs`)
+- hit-rate and pairs-per-second counters (`stats`)
+
+The chunk id is the text's content hash unless the caller supplies stable ids.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from . import tracing
+from .llm_client import CHARS_PER_TOKEN
+from .models import RERANKER, RERANKER_MODEL_NAME, get_reranker, is_loaded
+
+# SQLite file for the persistent score cache; unset keeps scores in memory only
+RERANK_CACHE_PATH = os.getenv("RERANK_CACHE_PATH")
+
+
+def normalize_query(query: str) -> str:
+    """NFKC-normalizes a query and collapses whitespace, so trivially different queries share scores."""
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+def _score_key(model_id: str, query: str, chunk_id: str) -> str:
+    payload = "\x00".join((model_id, normalize_query(query), chunk_id))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _text_id(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _ScoreTable:
+    # Bounded SQLite score table; the least recently used entries are dropped first
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " key TEXT PRIMARY KEY, score REAL NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(scores)")}
+        if "accessed" not in columns:
+            # Tables written before LRU eviction: entries start out as last used when created
+            self._conn.execute("ALTER TABLE scores ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE scores SET accessed = created")
+            self._conn.execute("DROP INDEX IF EXISTS scores_created")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS scores_accessed ON scores (accessed)")
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE scores SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+            self._conn.execute("COMMIT")
+        return found
+
+    def put_many(self, items: list) -> None:
+        now = time.time()
+        self._conn.execute("BEGIN")
+        self._conn.executemany("INSERT OR REPLACE INTO scores (key, score, created, accessed) VALUES (?, ?, ?, ?)",
+                               [(key, score, now, now) for key, score in items])
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()
+        if self.max_entries is not None and count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._conn.execute("COMMIT")
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM scores")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RerankService:
+    """
+    Cross-encoder reranking with a score cache and length-bucketed batching.
+
+    Args:
+        reranker: CrossEncoder-compatible model. Defaults to whatever reranker is registered
+            in `models`, looked up on each cache miss and loaded on the first one.
+        model_id (str): Identifies the model in cache keys. Defaults to the reranker's
+            `model_id` attribute, or the shared reranker's name.
+        cache_size (int): Maximum scores kept in memory (LRU). 0 disables the memory cache.
+        cache_path (str): SQLite file for a persistent score cache. None keeps scores in
+            memory only.
+        disk_max_entries (int): Maximum scores kept on disk.
+        batch_size (int): Maximum pairs per model call. Default is 32.
+        max_batch_tokens (int): Maximum padded tokens (pairs x longest pair) per model call.
+        max_pairs (int | None): Maximum pairs a single `predict` call may score.
+
+    Attributes:
+        hits (int): Pairs answered from the cache.
+        misses (int): Pairs scored by the model.
+        batches (int): Model calls made.
+        model_seconds (float): Time spent in the model.
+    """
+
+    def __init__(self, reranker=None, model_id: str = None, cache_size: int = 100_000,
+                 cache_path: str = None, disk_max_entries: int = 5_000_000, batch_size: int = 32,
+                 max_batch_tokens: int = 8192, max_pairs: int = 2048):
+        self._reranker = reranker
+        self._model_id = model_id
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_pairs = max_pairs
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.model_seconds = 0.0
+        self._memory = OrderedDict()
+        self._disk = _ScoreTable(cache_path, disk_max_entries) if cache_path else None
+        self._lock = threading.Lock()
+
+    @property
+    def reranker(self):
+        return self._reranker if self._reranker is not None else get_reranker()
+
+    @property
+    def model_id(self) -> str:
+        if self._model_id:
+            return self._model_id
+        if self._reranker is not None:
+            return getattr(self._reranker, "model_id", type(self._reranker).__name__)
+        # Stand-ins registered in `models` declare their own id; the real model is not loaded for
+        # this, its backend-qualified id is derived from the inference settings instead
+        if is_loaded(RERANKER):
+            return getattr(get_reranker(), "model_id", RERANKER_MODEL_NAME)
+        from .inference import backend_model_id
+        return backend_model_id(RERANKER_MODEL_NAME)
+
+    def _lookup(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._memory.get(key)
+                if score is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = score
+        missing = [k for k in keys if k not in found]
+        if self._disk is not None and missing:
+            from_disk = self._disk.get_many(missing)
+            self._remember(from_disk.items())
+            found.update(from_disk)
+        return found
+
+    def _remember(self, items) -> None:
+        if not self.cache_size:
+            return
+        with self._lock:
+            for key, score in items:
+                self._memory[key] = score
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.cache_size:
+                self._memory.popitem(last=False)
+
+    def _batches(self, pairs: list) -> list:
+        # Sort by length so each batch pads to a similar length, then cut on pair and token budgets
+        lengths = [(len(q) + len(p)) // CHARS_PER_TOKEN + 1 for q, p in pairs]
+        order = sorted(range(len(pairs)), key=lambda i: lengths[i])
+        batches, current = [], []
+        for i in order:
+            padded = (len(current) + 1) * lengths[i]
+            if current and (len(current) >= self.batch_size or padded > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def predict(self, pairs: list, batch_size: int = None, chunk_ids: list = None, **kwargs) -> np.ndarray:
+        """
+        Scores (query, passage) pairs, reusing cached scores.
+
+        Args:
+            pairs (list[tuple[str, str]]): The pairs to score.
+            batch_size (int): Accepted for CrossEncoder compatibility; batching is controlled
+                by `batch_size` and `max_batch_tokens` of the service.
+            chunk_ids (list): Stable ids of the passages, used in cache keys instead of a
+                hash of the passage text.
+
+        Returns:
+            np.ndarray: One float32 score per pair, in input order.
+
+        Raises:
+            ValueError: If more than `max_pairs` pairs are passed.
+        """
+        if self.max_pairs is not None and len(pairs) > self.max_pairs:
+            raise ValueError(f"Rerank request of {len(pairs)} pairs exceeds max_pairs={self.max_pairs}.")
+        if not pairs:
+            return np.empty(0, dtype=np.float32)
+
+        ids = [str(c) for c in chunk_ids] if chunk_ids is not None else [_text_id(p) for _, p in pairs]
+        keys = [_score_key(self.model_id, q, cid) for (q, _), cid in zip(pairs, ids)]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Pairs repeated within the request are scored once
+        todo = {}
+        for key, pair in zip(keys, pairs):
+            if key not in found and key not in todo:
+                todo[key] = pair
+        with self._lock:
+            self.hits += len(keys) - len(todo)
+            self.misses += len(todo)
+        tracing.add("rerank_cache_hits", len(keys) - len(todo))
+
+        if todo:
+            todo_keys, todo_pairs = list(todo), list(todo.values())
+            scored, batches, model_seconds = [], 0, 0.0
+            for batch in self._batches(todo_pairs):
+                start = time.perf_counter()
+                scores = self.reranker.predict([todo_pairs[i] for i in batch], batch_size=len(batch))
+                model_seconds += time.perf_counter() - start
+                batches += 1
+                scored.extend((todo_keys[i], float(s)) for i, s in zip(batch, np.asarray(scores).ravel()))
+            with self._lock:
+                self.batches += batches
+                self.model_seconds += model_seconds
+            self._remember(scored)
+            if self._disk is not None:
+                self._disk.put_many(scored)
+            found.update(scored)
+
+        return np.array([found[key] for key in keys], dtype=np.float32)
+
+    def stats(self) -> dict:
+        """Returns cache hit rate and model throughput for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "batches": self.batches,
+                "model_seconds": self.model_seconds,
+                "pairs_per_second": self.misses / self.model_seconds if self.model_seconds else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def clear(self) -> None:
+        """Drops every cached score."""
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_rerank_service() -> RerankService:
+    """Returns the shared service around the shared reranker, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RerankService(cache_path=RERANK_CACHE_PATH)
+        return _service
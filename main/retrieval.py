@@ -0,0 +1,164 @@
+"""
+retrieval.py
+
+Batched dense retrieval with a single cross-encoder rerank over the union of candidates.
+
+Instead of one encode, one full `argsort` and one `reranker.predict` call per sub-query,
+`batch_retrieve` does the following for a whole list of queries:
+1. Encodes every query in one `encode` call.
+2. Scores all queries against the store with one matrix-matrix product.
+3. Selects the top-k candidates per query with `argpartition`, or probes an IVF
+   index for large stores (see `ann_index.py`).
+4. When the store has a BM25 index (see `bm25_index.py`), merges each query's dense
+   and lexical candidates by reciprocal-rank fusion, so chunks that share the query's
+   rare terms reach the reranker without raising k.
+5. Dedupes candidate chunks across queries and reranks all (query, chunk) pairs
+   in a few large cross-encoder batches.
+"""
+
+import numpy as np
+
+from . import tracing
+from .ann_index import open_index
+from .bm25_index import open_bm25_index
+from .vector_store import as_vector_store
+
+# Instruction prefix recommended for mxbai-embed-large-v1 queries
+QUERY_PROMPT = "Represent this sentence for searching relevant passages: "
+
+# Rank constant of reciprocal-rank fusion; 60 is the usual choice and rarely needs tuning
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: list, limit: int, rrf_k: int = RRF_K) -> np.ndarray:
+    """
+    Merges ranked lists of chunk ids: a chunk scores the sum of `1 / (rrf_k + rank)` over the
+    lists it appears in.
+
+    Args:
+        rankings (list[np.ndarray]): Chunk ids, best first, one array per retriever.
+        limit (int): Number of fused ids to keep.
+        rrf_k (int): Rank constant; larger values flatten the rank discount.
+
+    Returns:
+        np.ndarray: The `limit` best fused ids; ties keep the order the ids were first seen in.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(np.asarray(ranking).tolist(), start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return np.asarray(ranked, dtype=np.int64)
+
+
+def search_candidates(queries: list, query_embeddings: np.ndarray, index, k: int,
+                      sparse_index=None, rrf_k: int = RRF_K) -> list:
+    """
+    Finds k rerank candidates per query: dense search, fused with BM25 when an index is given.
+
+    Args:
+        queries (list[str]): The queries, without any encoder instruction prefix.
+        query_embeddings (np.ndarray): Their (n_queries, dim) embeddings.
+        index: Dense search index over the store.
+        k (int): Number of candidates per query, after fusion.
+        sparse_index (BM25Index): Lexical index of the store, or None for dense-only search.
+        rrf_k (int): Rank constant of the fusion.
+
+    Returns:
+        list[np.ndarray]: Candidate chunk ids per query.
+    """
+    with tracing.span("search", index=getattr(index, "kind", type(index).__name__), k=k):
+        candidates, _ = index.search(np.asarray(query_embeddings, dtype=np.float32), k)
+    if sparse_index is None:
+        return candidates
+
+    # Restricted searches (e.g. to the routed events' chunks) stay restricted lexically too
+    with tracing.span("sparse_search", index=sparse_index.kind, k=k):
+        lexical, _ = sparse_index.search(queries, k, chunk_ids=getattr(index, "chunk_ids", None))
+    return [reciprocal_rank_fusion([dense, sparse], k, rrf_k=rrf_k) for dense, sparse in zip(candidates, lexical)]
+
+
+def batch_retrieve_indices(queries: list, store, embedding_model, reranker, k: int = 10, m: int = 3,
+                           query_prompt: str = "", rerank_batch_size: int = 128,
+                           index=None, max_pairs: int = None, sparse_index=None, fusion: bool = True) -> list:
+    """
+    Retrieves and reranks chunks for many queries at once.
+
+    Args:
+        queries (list[str]): The queries (e.g. sub-queries of one question).
+        store: A `VectorStore`, store directory or legacy embeddings DataFrame.
+        embedding_model: SentenceTransformer-compatible encoder.
+        reranker: CrossEncoder-compatible reranker.
+        k (int): Number of candidates per query (after fusion).
+        m (int): Number of reranked chunks kept per query.
+        query_prompt (str): Instruction prefix prepended to queries before encoding only.
+        rerank_batch_size (int): Cross-encoder batch size for the union rerank. Default is 128.
+        index: Search index over the store. Defaults to `open_index(store)`.
+        max_pairs (int): Cap on reranked pairs; each query keeps its best candidates
+            within an equal share. Defaults to the reranker's `max_pairs`, if it has one.
+        sparse_index (BM25Index): Lexical index fused with the dense candidates. Defaults to
+            the store's persisted index (`open_bm25_index`), if it has one.
+        fusion (bool): Fuse BM25 candidates when an index is available. Default is True.
+
+    Returns:
+        list[list[tuple[int, float]]]: For each query, its top-m (chunk index, rerank score) pairs.
+    """
+    store = as_vector_store(store)
+    if not queries:
+        return []
+
+    # Identical sub-queries are encoded and reranked only once
+    unique_queries = list(dict.fromkeys(queries))
+    with tracing.span("encode", queries=len(unique_queries)):
+        query_embeddings = embedding_model.encode(
+            [query_prompt + q for q in unique_queries], normalize_embeddings=True
+        )
+    index = index or open_index(store)
+    max_pairs = max_pairs if max_pairs is not None else getattr(reranker, "max_pairs", None)
+    if max_pairs is not None:
+        k = max(1, min(k, max_pairs // len(unique_queries)))
+    if fusion and sparse_index is None:
+        sparse_index = open_bm25_index(store)
+    candidates = search_candidates(unique_queries, query_embeddings, index, k,
+                                   sparse_index=sparse_index if fusion else None)
+
+    # Fetch each candidate chunk's text once, however many queries selected it
+    unique_ids = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+    texts = dict(zip(unique_ids.tolist(), store.texts(unique_ids)))
+
+    pairs, owners = [], []
+    for q_idx, query in enumerate(unique_queries):
+        for chunk_id in candidates[q_idx].tolist():
+            pairs.append((query, texts[chunk_id]))
+            owners.append((q_idx, chunk_id))
+
+    with tracing.span("rerank") as rerank_span:
+        rerank_span.add("pairs_reranked", len(pairs))
+        rerank_scores = reranker.predict(pairs, batch_size=rerank_batch_size) if pairs else []
+
+    per_query = [[] for _ in unique_queries]
+    for (q_idx, chunk_id), score in zip(owners, rerank_scores):
+        per_query[q_idx].append((chunk_id, float(score)))
+
+    results = {}
+    for q_idx, query in enumerate(unique_queries):
+        ranked = sorted(per_query[q_idx], key=lambda item: item[1], reverse=True)
+        results[query] = ranked[:m]
+
+    return [results[q] for q in queries]
+
+
+def batch_retrieve(queries: list, store, embedding_model, reranker, k: int = 10, m: int = 3,
+                   query_prompt: str = "", rerank_batch_size: int = 128, index=None,
+                   max_pairs: int = None, sparse_index=None, fusion: bool = True) -> list:
+    """
+    Same as `batch_retrieve_indices`, but returns the chunk texts.
+
+    Returns:
+        list[list[str]]: For each query, the texts of its top-m reranked chunks.
+    """
+    store = as_vector_store(store)
+    ranked = batch_retrieve_indices(queries, store, embedding_model, reranker, k=k, m=m,
+                                    query_prompt=query_prompt, rerank_batch_size=rerank_batch_size,
+                                    index=index, max_pairs=max_pairs, sparse_index=sparse_index, fusion=fusion)
+    return [store.texts([chunk_id for chunk_id, _ in hits]) for hits in ranked]
@@ -0,0 +1,420 @@
+"""
+retrieval_server.py
+
+Long-lived local retrieval server, and the client the RAG modules use to call it.
+
+The server opens a vector store once (memory-mapped, so the matrix lives in the OS page
+cache and is shared with every other process that maps the same files), loads the
+encoder and reranker once, and answers retrieval requests over localhost HTTP:
+- `POST /retrieve` with `{"queries": [...], "k", "m", "query_prompt", "token_budget",
+  "trim_sentences"}` returns each query's reranked hits and the packed context
+  (see `context_packer.py`)
+- `GET /health` returns the store, its version and batching statistics
+
+Requests that arrive within `max_wait_ms` of each other are merged: their queries go
+through one `batch_retrieve_indices` call, i.e. one encode, one search and one rerank.
+A watcher thread polls the store manifest and the persisted search indexes and swaps in
+the new store when any of them changes; requests in flight finish on the store they
+started with.
+
+Run the server with:
+    python -m main.retrieval_server --store embedding_store --port 8765
+
+and point the RAG modules at it with `retrieval_server="http://127.0.0.1:8765"` or the
+`RETRIEVAL_SERVER_URL` environment variable.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .ann_index import IVF_FILE, QUANTIZED_FILES, open_index
+from .bm25_index import BM25_FILE, open_bm25_index
+from .context_packer import DEFAULT_CONTEXT_TOKENS, PackedContext, pack_context
+from .retrieval import batch_retrieve_indices
+from .vector_store import MANIFEST_FILE, load_store
+
+logger = logging.getLogger(__name__)
+
+# Base URL of a running server; when set, the RAG modules retrieve through it
+RETRIEVAL_SERVER_URL = os.getenv("RETRIEVAL_SERVER_URL")
+
+DEFAULT_PORT = 8765
+
+
+class _Request:
+    def __init__(self, queries: list, k: int, m: int, query_prompt: str):
+        self.queries = queries
+        self.key = (k, m, query_prompt)
+        self.future = Future()
+
+
+class RetrievalServer:
+    """
+    Serves batched retrieval over one store with warm models.
+
+    Args:
+        store_dir (str): Vector store directory.
+        host (str): Interface to bind. Default is the loopback interface.
+        port (int): Port to bind. 0 picks a free port (see `url`).
+        embedding_model: Encoder. Defaults to the shared one from `models`.
+        reranker: Reranker. Defaults to the shared `RerankService`.
+        max_wait_ms (float): How long the batcher waits for more requests after the first.
+        max_batch_queries (int): Maximum queries per batch. Batches are also kept within the
+            reranker's `max_pairs`.
+        reload_interval (float): Seconds between store change checks. 0 disables hot reload.
+        preload (bool): Read the embedding matrix once at startup so it is in the page cache.
+        request_timeout (float): Seconds `retrieve` waits for its batch before giving up.
+    """
+
+    def __init__(self, store_dir: str, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 embedding_model=None, reranker=None, max_wait_ms: float = 5.0,
+                 max_batch_queries: int = 64, reload_interval: float = 2.0, preload: bool = True,
+                 request_timeout: float = 60.0):
+        from .models import get_embedding_model
+        from .rerank_service import get_rerank_service
+
+        self.store_dir = store_dir
+        self.embedding_model = embedding_model if embedding_model is not None else get_embedding_model()
+        self.reranker = reranker if reranker is not None else get_rerank_service()
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_queries = max_batch_queries
+        self.reload_interval = reload_interval
+        self.preload = preload
+        self.request_timeout = request_timeout
+        self.version = 0
+        self.stats = {"requests": 0, "queries": 0, "batches": 0, "reloads": 0}
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self.store = None
+        self._signature = None
+        self._reload(force=True)
+
+        self.httpd = ThreadingHTTPServer((host, port), _handler_for(self))
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _store_signature(self) -> tuple:
+        # The manifest changes on every store write; the index files on every index rebuild
+        names = (MANIFEST_FILE, IVF_FILE, BM25_FILE, *QUANTIZED_FILES.values())
+        paths = [os.path.join(self.store_dir, name) for name in names]
+        return tuple((p, os.path.getmtime(p)) for p in paths if os.path.exists(p))
+
+    def _reload(self, force: bool = False) -> bool:
+        signature = self._store_signature()
+        if not force and signature == self._signature:
+            return False
+        store = load_store(self.store_dir)
+        if self.preload and len(store):
+            # Touch every page of the matrix once, in blocks, so the first queries do not fault it in
+            for start in range(0, len(store), 65536):
+                np.asarray(store.embeddings[start:start + 65536]).sum()
+        open_index(store)
+        open_bm25_index(store)
+        self.store, self._signature = store, signature
+        self.version += 1
+        if not force:
+            self._count("reloads")
+        logger.info("Serving %s (%d chunks, version %d).", self.store_dir, len(store), self.version)
+        return True
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self._reload()
+            except Exception as e:
+                # A store caught mid-write is retried on the next poll
+                logger.warning("Store reload failed: %s", e)
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch, n_queries = [first], len(first.queries)
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while n_queries < self.max_batch_queries:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            n_queries += len(item.queries)
+        return batch
+
+    def _run_group(self, store, key: tuple, requests: list) -> None:
+        k, m, query_prompt = key
+        queries = [q for request in requests for q in request.queries]
+        try:
+            hits = batch_retrieve_indices(queries, store, self.embedding_model, self.reranker, k=k, m=m,
+                                          query_prompt=query_prompt)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        self._count("batches")
+        start = 0
+        for request in requests:
+            request.future.set_result((store, hits[start:start + len(request.queries)]))
+            start += len(request.queries)
+
+    def _run_key(self, store, key: tuple, requests: list) -> None:
+        # Keep each model call within the reranker's pair cap
+        max_pairs = getattr(self.reranker, "max_pairs", None)
+        limit = max(1, max_pairs // key[0]) if max_pairs else None
+        chunk, n_queries = [], 0
+        for request in requests:
+            if chunk and limit is not None and n_queries + len(request.queries) > limit:
+                self._run_group(store, key, chunk)
+                chunk, n_queries = [], 0
+            chunk.append(request)
+            n_queries += len(request.queries)
+        self._run_group(store, key, chunk)
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            store = self.store
+            groups = {}
+            for request in batch:
+                try:
+                    groups.setdefault(request.key, []).append(request)
+                except Exception as e:
+                    request.future.set_exception(e)
+            for key, requests in groups.items():
+                # A failing group fails its own requests; the batcher keeps serving the others
+                try:
+                    self._run_key(store, key, requests)
+                except Exception as e:
+                    logger.exception("Retrieval batch failed")
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+    def retrieve(self, queries: list, k: int = 10, m: int = 3, query_prompt: str = "") -> tuple:
+        """
+        Retrieves through the batcher; blocks until the request's batch is done.
+
+        Returns:
+            tuple: (store the hits index into, per-query (chunk index, rerank score) lists).
+
+        Raises:
+            ValueError: If `k` or `m` is below 1 or `query_prompt` is not a string.
+            TimeoutError: If the batch does not finish within `request_timeout` seconds.
+        """
+        _check_params(k, m, query_prompt)
+        request = _Request(list(queries), k, m, query_prompt)
+        self._count("requests")
+        self._count("queries", len(request.queries))
+        self._queue.put(request)
+        return request.future.result(timeout=self.request_timeout)
+
+    def health(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["mean_batch_queries"] = stats["queries"] / stats["batches"] if stats["batches"] else 0.0
+        return {"store": os.path.abspath(self.store_dir), "chunks": len(self.store), "version": self.version,
+                "model": self.store.model, "stats": stats}
+
+    def start(self) -> "RetrievalServer":
+        """Starts the batcher, the store watcher and the HTTP server in background threads."""
+        targets = [self._batch_loop, self.httpd.serve_forever]
+        if self.reload_interval:
+            targets.append(self._watch)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Retrieval server listening on %s", self.url)
+        return self
+
+    def serve_forever(self) -> None:
+        """Starts the server and blocks until interrupted."""
+        self.start()
+        try:
+            while not self._stop.wait(3600):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._queue.put(None)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _check_params(k, m, query_prompt) -> None:
+    if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+        raise ValueError(f"'k' must be a positive integer, got {k!r}.")
+    if isinstance(m, bool) or not isinstance(m, int) or m < 1:
+        raise ValueError(f"'m' must be a positive integer, got {m!r}.")
+    if not isinstance(query_prompt, str):
+        raise ValueError(f"'query_prompt' must be a string, got {type(query_prompt).__name__}.")
+
+
+def _handler_for(server: RetrievalServer):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+        def _send(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, server.health())
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/retrieve":
+                self._send(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                queries = body["queries"]
+                if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                    raise ValueError("'queries' must be a list of strings.")
+                k, m = int(body.get("k", 10)), int(body.get("m", 3))
+                query_prompt = body.get("query_prompt", "")
+                _check_params(k, m, query_prompt)
+                token_budget = body.get("token_budget", DEFAULT_CONTEXT_TOKENS)
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": f"Bad request: {e}"})
+                return
+
+            try:
+                store, hits = server.retrieve(queries, k=k, m=m, query_prompt=query_prompt)
+                packed = pack_context(hits, store, queries=queries, token_budget=token_budget,
+                                      trim_sentences=bool(body.get("trim_sentences", False)))
+            except Exception as e:
+                logger.exception("Retrieval failed")
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+
+            self._send(200, {
+                "version": server.version,
+                "hits": [[[int(c), float(s)] for c, s in query_hits] for query_hits in hits],
+                "context": {"chunks": packed.chunks, "chunk_ids": [int(c) for c in packed.chunk_ids],
+                            "tokens": packed.tokens, "dropped_duplicates": packed.dropped_duplicates,
+                            "dropped_budget": packed.dropped_budget},
+            })
+
+    return Handler
+
+
+class RetrievalClient:
+    """
+    Client for a `RetrievalServer`.
+
+    Args:
+        url (str): Base URL, e.g. "http://127.0.0.1:8765".
+        timeout (float): Seconds to wait for a response.
+    """
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, path: str, payload: dict = None) -> dict:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")
+            raise ValueError(f"Retrieval server error {e.code}: {detail}") from e
+
+    def health(self) -> dict:
+        return self._call("/health")
+
+    def retrieve(self, queries: list, k: int = 10, m: int = 3, query_prompt: str = "",
+                 token_budget: int = DEFAULT_CONTEXT_TOKENS, trim_sentences: bool = False) -> tuple:
+        """
+        Retrieves and packs context for some queries on the server.
+
+        Args:
+            queries (list[str]): The queries.
+            k (int): Dense candidates per query.
+            m (int): Reranked chunks kept per query.
+            query_prompt (str): Instruction prefix for encoding.
+            token_budget (int | None): Token budget of the packed context.
+            trim_sentences (bool): Trim chunks to the sentences relevant to their query.
+
+        Returns:
+            tuple: (per-query (chunk index, rerank score) lists, PackedContext).
+
+        Raises:
+            ValueError: If the server rejects the request or fails.
+        """
+        response = self._call("/retrieve", {"queries": list(queries), "k": k, "m": m,
+                                            "query_prompt": query_prompt, "token_budget": token_budget,
+                                            "trim_sentences": trim_sentences})
+        hits = [[(int(c), float(s)) for c, s in query_hits] for query_hits in response["hits"]]
+        context = response["context"]
+        packed = PackedContext(context["chunks"], context["chunk_ids"], context["tokens"],
+                               context["dropped_duplicates"], context["dropped_budget"])
+        return hits, packed
+
+
+def get_client(url: str = None):
+    """Returns a client for `url`, or for `RETRIEVAL_SERVER_URL`; None if neither is set."""
+    url = url or RETRIEVAL_SERVER_URL
+    return RetrievalClient(url) if url else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .models import warmup
+    from .tracing import enable_logging
+
+    parser = argparse.ArgumentParser(description="Serve batched retrieval over a vector store on localhost.")
+    parser.add_argument("--store", default="embedding_store", help="Vector store directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Batching window")
+    parser.add_argument("--max-batch-queries", type=int, default=64)
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="Seconds between store checks; 0 disables")
+    args = parser.parse_args()
+
+    enable_logging()
+    warmup()
+    RetrievalServer(args.store, host=args.host, port=args.port, max_wait_ms=args.max_wait_ms,
+                    max_batch_queries=args.max_batch_queries, reload_interval=args.reload_interval).serve_forever()
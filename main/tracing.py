@@ -0,0 +1,273 @@
+"""
+tracing.py
+
+Per-stage tracing and token accounting for the pipelines.
+
+A pipeline opens a root span and one child span per stage (KG extraction, sub-query
+generation, encoding, search, reranking, synthesis, ...). Each span records wall and
+CPU time, and lower layers add counters to whichever span is current:
+- `llm_calls`, `prompt_tokens`, `completion_tokens`, `llm_cache_hits` (llm_client)
+- `chunks_scored` (search indexes), `pairs_reranked`, `rerank_cache_hits` (reranking)
+- `answer_cache_hits`, `answer_cache_misses` (answer_cache)
+
+Spans are tracked in a context variable, so counters from worker threads started
+with a copied context and from asyncio tasks land in the right span. Counters are
+free when no span is open.
+
+Finished root spans are passed to the registered exporters. `JSONLExporter` writes one
+OpenTelemetry-style record per span; set `TRACE_JSONL_PATH` to enable it for the process.
+"""
+
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+_current = contextvars.ContextVar("current_span", default=None)
+_exporters = []
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """
+    One timed stage of a pipeline.
+
+    Attributes:
+        name (str): Stage name.
+        attributes (dict): Descriptive values set by the stage (query, model, k, ...).
+        counters (dict): Numeric counters added during the stage, excluding children.
+        children (list[Span]): Nested stages, in start order.
+        wall_ms (float | None): Wall-clock duration, once finished.
+        cpu_ms (float | None): CPU time of the process during the span, once finished.
+        error (str | None): Exception raised inside the span, if any.
+    """
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = next(_span_ids)
+        self.attributes = dict(attributes or {})
+        self.counters = {}
+        self.children = []
+        self.start_time = time.time()
+        self.wall_ms = None
+        self.cpu_ms = None
+        self.error = None
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._lock = threading.Lock()
+
+    def set(self, **attributes) -> None:
+        """Sets descriptive attributes."""
+        self.attributes.update(attributes)
+
+    def add(self, counter: str, value: float = 1) -> None:
+        """Adds to a counter."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def finish(self) -> None:
+        self.wall_ms = (time.perf_counter() - self._start) * 1000
+        self.cpu_ms = (time.process_time() - self._cpu_start) * 1000
+
+    def totals(self) -> dict:
+        """Counters of this span and all its descendants, summed."""
+        totals = dict(self.counters)
+        for child in self.children:
+            for key, value in child.totals().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def stages(self) -> dict:
+        """`name -> wall_ms` for the direct children (summed if a stage ran more than once)."""
+        stages = {}
+        for child in self.children:
+            stages[child.name] = stages.get(child.name, 0.0) + (child.wall_ms or 0.0)
+        return stages
+
+    def walk(self):
+        """Yields this span and its descendants, depth first."""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> dict:
+        """Nested, JSON-serializable view of the span tree."""
+        return {
+            "name": self.name,
+            "wall_ms": round(self.wall_ms, 3) if self.wall_ms is not None else None,
+            "cpu_ms": round(self.cpu_ms, 3) if self.cpu_ms is not None else None,
+            "attributes": self.attributes,
+            "counters": self.counters,
+            "totals": self.totals(),
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    def to_record(self) -> dict:
+        """Flat, OpenTelemetry-style record of this span alone."""
+        end_time = self.start_time + (self.wall_ms or 0.0) / 1000
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start_time_unix_nano": int(self.start_time * 1e9),
+            "end_time_unix_nano": int(end_time * 1e9),
+            "cpu_ms": round(self.cpu_ms, 3) if self.cpu_ms is not None else None,
+            "attributes": dict(self.attributes, **self.counters),
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class span:
+    """
+    Context manager that opens a span as a child of the current one.
+
+    Usage:
+        with span("rerank", k=10) as s:
+            ...
+            s.add("pairs_reranked", len(pairs))
+
+    A span opened with no current span is a root; when it closes, it is exported.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._token = None
+        self.span = None
+
+    def __enter__(self) -> Span:
+        parent = _current.get()
+        self.span = Span(self.name, parent=parent, attributes=self.attributes)
+        if parent is not None:
+            with parent._lock:
+                parent.children.append(self.span)
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.span.finish()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        if self.span.parent is None:
+            _export(self.span)
+        return False
+
+
+def current_span():
+    """Returns the innermost open span, or None."""
+    return _current.get()
+
+
+def add(counter: str, value: float = 1) -> None:
+    """Adds to a counter of the current span; does nothing when no span is open."""
+    current = _current.get()
+    if current is not None:
+        current.add(counter, value)
+
+
+class JSONLExporter:
+    """
+    Appends one JSON record per span (root and descendants) to a file.
+
+    Args:
+        path (str): Output file, created if missing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def __call__(self, root: Span) -> None:
+        lines = "".join(json.dumps(s.to_record(), ensure_ascii=False, default=str) + "\n" for s in root.walk())
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+def add_exporter(exporter) -> None:
+    """Registers a callable that receives every finished root span."""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter) -> None:
+    _exporters.remove(exporter)
+
+
+def _export(root: Span) -> None:
+    for exporter in list(_exporters):
+        try:
+            exporter(root)
+        except Exception as e:
+            logging.getLogger(__name__).warning("Trace exporter %r failed: %s", exporter, e)
+
+
+def enable_logging(level: int = logging.INFO) -> None:
+    """Opts in to the pipelines' progress logs on stderr."""
+    logger = logging.getLogger(__package__)
+    if not any(getattr(h, "_kg_iqd", False) for h in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+        handler._kg_iqd = True
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+
+class PipelineResult:
+    """
+    What a pipeline produced, and how long each stage took.
+
+    Attributes:
+        query (str): The user query.
+        answer (str | None): The final answer; None if the pipeline stopped early.
+        kgs (list[str]): KGs the query was routed to (hybrid pipeline).
+        triples (dict): KG triples used as facts (hybrid pipeline).
+        sub_queries (list[str]): Generated sub-queries.
+        context (list[str]): Retrieved chunks given to the final prompt.
+        trace (Span): The pipeline's root span.
+        error (str | None): Why the pipeline stopped early, if it did.
+        cache (dict | None): Provenance of an answer reused from the answer cache
+            (see `answer_cache.CachedAnswer.provenance`); None if the answer was generated.
+    """
+
+    def __init__(self, query: str, answer: str = None, kgs: list = None, triples: dict = None,
+                 sub_queries: list = None, context: list = None, trace: Span = None, error: str = None,
+                 cache: dict = None):
+        self.query = query
+        self.answer = answer
+        self.kgs = kgs or []
+        self.triples = triples or {}
+        self.sub_queries = sub_queries or []
+        self.context = context or []
+        self.trace = trace
+        self.error = error
+        self.cache = cache
+
+    def __str__(self) -> str:
+        return self.answer if self.answer is not None else f"<no answer: {self.error}>"
+
+    def to_dict(self) -> dict:
+        return {
+            "query": self.query,
+            "answer": self.answer,
+            "kgs": self.kgs,
+            "triples": self.triples,
+            "sub_queries": self.sub_queries,
+            "context": self.context,
+            "error": self.error,
+            "cache": self.cache,
+            "trace": self.trace.to_dict() if self.trace is not None else None,
+        }
+
+
+if os.getenv("TRACE_JSONL_PATH"):
+    add_exporter(JSONLExporter(os.environ["TRACE_JSONL_PATH"]))
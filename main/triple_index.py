@@ -0,0 +1,163 @@
+"""
+triple_index.py
+
+Local index over flattened KG triples (`dotted.key.path -> value`), used to shrink the
+KG-extraction prompt of the hybrid pipeline.
+
+Each triple is indexed as the text "key path + value" with:
+- a lexical BM25 score over lower-cased word tokens
+- an optional embedding score (cosine similarity with the query)
+
+`TripleIndex.select` returns the top-N triples for a query. The hybrid pipeline either
+sends only these candidates to the LLM, or, in fast mode, uses the top triples directly
+without any LLM call.
+"""
+
+import hashlib
+import json
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from how in is it of on or the to was were what "
+    "when where which who why with".split()
+)
+
+# Built indexes keyed on a hash of the flattened KG, so each KG is indexed once per process
+_INDEX_CACHE = {}
+
+
+def tokenize(text: str) -> list:
+    """Lower-cases, splits on non-alphanumerics, drops stopwords and folds simple plurals."""
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def triple_text(key: str, value) -> str:
+    """Text a triple is indexed by: its key path with separators spaced out, then its value."""
+    return f"{key.replace('.', ' ').replace('_', ' ')}: {value}"
+
+
+class TripleIndex:
+    """
+    BM25 + embedding index over a flattened KG.
+
+    Args:
+        flat_kg (dict): Flattened KG as returned by `hybrid.flatten_kg`.
+        embedding_model: Optional SentenceTransformer-compatible encoder for the dense score.
+        k1 (float): BM25 term-frequency saturation. Default is 1.2.
+        b (float): BM25 length normalization. Default is 0.75.
+    """
+
+    def __init__(self, flat_kg: dict, embedding_model=None, k1: float = 1.2, b: float = 0.75):
+        self.keys = list(flat_kg)
+        self.values = [flat_kg[k] for k in self.keys]
+        self.embedding_model = embedding_model
+        self.k1, self.b = k1, b
+
+        docs = [tokenize(triple_text(k, v)) for k, v in zip(self.keys, self.values)]
+        self._tfs = [Counter(d) for d in docs]
+        self._lengths = np.array([len(d) for d in docs], dtype=np.float32)
+        self._avg_length = float(self._lengths.mean()) if len(docs) else 0.0
+
+        df = Counter(tok for tf in self._tfs for tok in tf)
+        n = len(docs)
+        self._idf = {tok: math.log(1 + (n - c + 0.5) / (c + 0.5)) for tok, c in df.items()}
+
+        self._embeddings = None
+        if embedding_model is not None and self.keys:
+            self._embeddings = np.asarray(embedding_model.encode(
+                [triple_text(k, v) for k, v in zip(self.keys, self.values)],
+                normalize_embeddings=True, show_progress_bar=False,
+            ), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lexical_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every triple for the query."""
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        query_tokens = set(tokenize(query))
+        if not query_tokens or not self.keys:
+            return scores
+
+        norm = self.k1 * (1 - self.b + self.b * self._lengths / max(self._avg_length, 1e-6))
+        for i, tf in enumerate(self._tfs):
+            s = 0.0
+            for tok in query_tokens & tf.keys():
+                f = tf[tok]
+                s += self._idf[tok] * f * (self.k1 + 1) / (f + norm[i])
+            scores[i] = s
+        return scores
+
+    def scores(self, query: str, alpha: float = 0.5) -> np.ndarray:
+        """
+        Combined relevance of every triple.
+
+        Args:
+            query (str): The user query.
+            alpha (float): Weight of the lexical score; the embedding score gets 1 - alpha.
+                Ignored (lexical only) when the index has no embeddings.
+
+        Returns:
+            np.ndarray: One score per triple, in `self.keys` order.
+        """
+        lexical = self.lexical_scores(query)
+        if lexical.max(initial=0) > 0:
+            lexical = lexical / lexical.max()
+        if self._embeddings is None:
+            return lexical
+
+        q = np.asarray(self.embedding_model.encode([query], normalize_embeddings=True), dtype=np.float32)[0]
+        dense = self._embeddings @ q
+        return alpha * lexical + (1 - alpha) * dense
+
+    def select(self, query: str, n: int = 10, alpha: float = 0.5) -> dict:
+        """
+        Returns the n most relevant triples, best first.
+
+        Args:
+            query (str): The user query.
+            n (int): Number of triples to keep. Default is 10.
+            alpha (float): Weight of the lexical score (see `scores`).
+
+        Returns:
+            dict: `key -> value` for the selected triples.
+        """
+        if not self.keys:
+            return {}
+        scores = self.scores(query, alpha=alpha)
+        n = min(n, len(self.keys))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return {self.keys[i]: self.values[i] for i in top}
+
+
+def get_triple_index(flat_kg: dict, embedding_model=None, digest: str = None) -> TripleIndex:
+    """
+    Returns the index for a flattened KG, building it only the first time that KG is seen.
+
+    Args:
+        flat_kg (dict): Flattened KG.
+        embedding_model: Optional encoder for the dense score.
+        digest (str): Precomputed content hash of the KG (e.g. `CompiledKG.digest`),
+            which skips hashing `flat_kg` on every call.
+
+    Returns:
+        TripleIndex: The cached or newly built index.
+    """
+    digest = digest or hashlib.sha1(json.dumps(flat_kg, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    key = (digest, id(embedding_model) if embedding_model is not None else None)
+    if key not in _INDEX_CACHE:
+        _INDEX_CACHE[key] = TripleIndex(flat_kg, embedding_model=embedding_model)
+    return _INDEX_CACHE[key]
@@ -0,0 +1,488 @@
+"""
+vector_store.py
+
+This module provides a binary, memory-mapped on-disk store for chunk embeddings.
+It replaces the stringified-CSV format so that retrieval never has to turn text
+back into floats.
+
+A store is a directory containing:
+- `manifest.json`: model name, dimension, dtype, normalization, chunk count and store id
+- `embeddings.bin`: the row-major embedding matrix (float32 or float16)
+- `texts.bin`: the UTF-8 encoded chunk texts, concatenated
+- `offsets.bin`: int64 byte offsets into `texts.bin` (count + 1 entries)
+- `meta.jsonl` (optional): one JSON object of per-chunk metadata per line (e.g. source file)
+
+Stores are written through `StoreWriter`, which appends batches and commits each one
+by rewriting the manifest. A crash can therefore only lose the batch in flight, and
+a writer reopened with `resume=True` truncates any uncommitted tail.
+
+Every fresh store gets a new random `store_id`, and committed rows are never rewritten,
+so the store id and the chunk count identify a store's contents (`VectorStore.fingerprint`).
+Side indexes saved in the store directory record the fingerprint they were built for and
+are treated as stale when it changes, e.g. after the store is rebuilt from scratch.
+
+The matrix and texts are opened with `np.memmap`, so loading is O(1) and the
+retrieval paths read the vectors without copying them.
+"""
+
+import json
+import os
+import uuid
+import warnings
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.bin"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.bin"
+META_FILE = "meta.jsonl"
+
+FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ("float32", "float16")
+
+# Default store of the answer pipelines, and the CSV they read before stores existed
+DEFAULT_STORE_DIR = "embedding_store"
+LEGACY_CSV_FILE = "embedding.csv"
+
+# Loaded stores keyed on absolute path, with the manifest mtime they were opened at
+_STORE_CACHE = {}
+
+
+class VectorStore:
+    """
+    A read-only view over an embedding matrix and its chunk texts.
+
+    Attributes:
+        embeddings (np.ndarray): (count, dim) matrix, memory-mapped when loaded from disk.
+        manifest (dict): Store metadata (model, dim, dtype, normalized, count).
+        path (str | None): Directory the store was loaded from, if any.
+        index_cache (dict): Search indexes opened over this store, keyed by kind.
+    """
+
+    def __init__(self, embeddings: np.ndarray, texts_buf: np.ndarray, offsets: np.ndarray,
+                 manifest: dict, path: str = None):
+        self.embeddings = embeddings
+        self.manifest = manifest
+        self.path = path
+        self._texts_buf = texts_buf
+        self._offsets = offsets
+        self._norms = None
+        self._metadata = None
+        self._source_ids = None
+        self.index_cache = {}
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    @property
+    def model(self) -> str:
+        return self.manifest["model"]
+
+    @property
+    def dim(self) -> int:
+        return int(self.manifest["dim"])
+
+    @property
+    def normalized(self) -> bool:
+        return bool(self.manifest["normalized"])
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the committed contents: "<store_id>:<count>", or "" for stores without an id."""
+        store_id = self.manifest.get("store_id")
+        return f"{store_id}:{len(self)}" if store_id else ""
+
+    def text(self, index: int) -> str:
+        """Returns the text of a single chunk."""
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return bytes(self._texts_buf[start:end]).decode("utf-8")
+
+    def texts(self, indices) -> list:
+        """Returns the texts of the given chunk indices, in order."""
+        return [self.text(int(i)) for i in indices]
+
+    def metadata(self, index: int) -> dict:
+        """Returns the metadata recorded for a chunk, or an empty dict if the store has none."""
+        if self._metadata is None:
+            meta_path = os.path.join(self.path, META_FILE) if self.path else None
+            self._metadata = []
+            if meta_path and os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    self._metadata = [json.loads(line) for _, line in zip(range(len(self)), f)]
+        return self._metadata[index] if index < len(self._metadata) else {}
+
+    def chunk_ids_by_source(self) -> dict:
+        """
+        Groups chunk indices by the `source` recorded in their metadata.
+
+        Returns:
+            dict: `source -> np.ndarray` of ascending chunk indices. Empty if the store has no metadata.
+        """
+        if self._source_ids is None:
+            groups = {}
+            for i in range(len(self)):
+                source = self.metadata(i).get("source")
+                if source is not None:
+                    groups.setdefault(source, []).append(i)
+            self._source_ids = {src: np.asarray(ids, dtype=np.int64) for src, ids in groups.items()}
+        return self._source_ids
+
+    def similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Computes cosine similarities between one or more queries and every chunk.
+
+        Args:
+            query_embedding (np.ndarray): A (dim,) vector or a (n_queries, dim) matrix.
+
+        Returns:
+            np.ndarray: (count,) or (count, n_queries) float32 similarities.
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        # float32 stores are multiplied in place; float16 rows are promoted by NumPy
+        scores = (self.embeddings @ query_embedding.T).astype(np.float32, copy=False)
+
+        if not self.normalized:
+            if self._norms is None:
+                norms = np.linalg.norm(self.embeddings.astype(np.float32), axis=1)
+                self._norms = np.maximum(norms, 1e-12)
+            q_norms = np.maximum(np.linalg.norm(query_embedding, axis=-1), 1e-12)
+            scores = scores / (self._norms if scores.ndim == 1 else self._norms[:, None]) / q_norms
+
+        return scores
+
+
+def _write_manifest(store_dir: str, manifest: dict) -> None:
+    tmp_path = os.path.join(store_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_FILE))
+
+
+def _pack_texts(texts) -> tuple:
+    encoded = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return b"".join(encoded), offsets
+
+
+class StoreWriter:
+    """
+    Appends chunks and embeddings to a store directory, committing after every batch.
+
+    Args:
+        store_dir (str): Output directory, created if missing.
+        model (str): Name of the model that produces the embeddings.
+        dim (int): Embedding dimension.
+        dtype (str): On-disk dtype, "float32" or "float16". Default is "float32".
+        normalized (bool): Whether the rows are L2-normalized. Default is True.
+        resume (bool): Continue an existing store instead of starting a new one. Rows written
+            after the last committed manifest are discarded. Default is False.
+
+    Attributes:
+        count (int): Number of committed chunks.
+        checkpoint (dict | None): Caller-defined progress saved with the last commit.
+
+    Raises:
+        ValueError: If the dtype is unsupported, or a resumed store has a different model, dim or dtype.
+    """
+
+    def __init__(self, store_dir: str, model: str, dim: int, dtype: str = "float32",
+                 normalized: bool = True, resume: bool = False):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}'. Expected one of {SUPPORTED_DTYPES}.")
+
+        self.store_dir = store_dir
+        self.manifest = {
+            "format_version": FORMAT_VERSION,
+            "model": model,
+            "dim": int(dim),
+            "dtype": dtype,
+            "normalized": bool(normalized),
+            "count": 0,
+        }
+        self.checkpoint = None
+        os.makedirs(store_dir, exist_ok=True)
+
+        manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            for key in ("model", "dim", "dtype", "normalized"):
+                if existing[key] != self.manifest[key]:
+                    raise ValueError(f"Cannot resume store {store_dir}: {key} is {existing[key]!r}, "
+                                     f"expected {self.manifest[key]!r}.")
+            self.manifest = existing
+            self.checkpoint = existing.get("checkpoint")
+            self._truncate_to_manifest()
+        else:
+            for name in (EMBEDDINGS_FILE, TEXTS_FILE, META_FILE):
+                open(os.path.join(store_dir, name), 'wb').close()
+            np.zeros(1, dtype=np.int64).tofile(os.path.join(store_dir, OFFSETS_FILE))
+            self.manifest.pop("checkpoint", None)
+            # A new id, so side indexes of a store previously written here are stale
+            self.manifest["store_id"] = uuid.uuid4().hex
+            _write_manifest(store_dir, self.manifest)
+
+        offsets = np.fromfile(os.path.join(store_dir, OFFSETS_FILE), dtype=np.int64)
+        self._text_end = int(offsets[-1])
+
+    @property
+    def count(self) -> int:
+        return int(self.manifest["count"])
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.store_dir, name)
+
+    def _truncate_to_manifest(self) -> None:
+        # Drop anything appended after the last commit, e.g. by a run that crashed mid-batch
+        count, dim = self.count, int(self.manifest["dim"])
+        itemsize = np.dtype(self.manifest["dtype"]).itemsize
+        with open(self._path(EMBEDDINGS_FILE), 'r+b') as f:
+            f.truncate(count * dim * itemsize)
+        with open(self._path(OFFSETS_FILE), 'r+b') as f:
+            f.truncate((count + 1) * 8)
+        offsets = np.fromfile(self._path(OFFSETS_FILE), dtype=np.int64)
+        with open(self._path(TEXTS_FILE), 'r+b') as f:
+            f.truncate(int(offsets[-1]))
+
+        meta_path = self._path(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'rb') as f:
+                kept = sum(len(line) for _, line in zip(range(count), f))
+            with open(meta_path, 'r+b') as f:
+                f.truncate(kept)
+
+    def append(self, texts, embeddings, metadata=None, checkpoint: dict = None) -> None:
+        """
+        Appends a batch and commits it.
+
+        Args:
+            texts (list[str]): Chunk texts, one per embedding row.
+            embeddings (np.ndarray): (len(texts), dim) embedding matrix.
+            metadata (list[dict]): Optional per-chunk metadata, one dict per text.
+            checkpoint (dict): Progress to record with this commit (see `checkpoint`).
+
+        Raises:
+            ValueError: If the batch shapes do not match.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=self.manifest["dtype"])
+        if len(texts) and (embeddings.ndim != 2 or embeddings.shape != (len(texts), self.manifest["dim"])):
+            raise ValueError(f"Expected a ({len(texts)}, {self.manifest['dim']}) matrix, "
+                             f"got shape {embeddings.shape}.")
+        if metadata is not None and len(metadata) != len(texts):
+            raise ValueError("metadata must have one entry per text.")
+
+        if len(texts):
+            text_bytes, offsets = _pack_texts(texts)
+            with open(self._path(EMBEDDINGS_FILE), 'ab') as f:
+                embeddings.tofile(f)
+            with open(self._path(TEXTS_FILE), 'ab') as f:
+                f.write(text_bytes)
+            with open(self._path(OFFSETS_FILE), 'ab') as f:
+                (offsets[1:] + self._text_end).tofile(f)
+            with open(self._path(META_FILE), 'a', encoding='utf-8') as f:
+                for item in (metadata or [{}] * len(texts)):
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._text_end += int(offsets[-1])
+
+        # The manifest is written last so a partially written batch is never visible
+        self.manifest["count"] = self.count + len(texts)
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            self.manifest["checkpoint"] = checkpoint
+        _write_manifest(self.store_dir, self.manifest)
+
+
+def write_store(store_dir: str, texts, embeddings, model: str,
+                normalized: bool = True, dtype: str = "float32", metadata=None) -> str:
+    """
+    Writes chunk texts and their embeddings into a binary store directory.
+
+    Args:
+        store_dir (str): Output directory, created if missing. Existing store files are overwritten.
+        texts (list[str]): Chunk texts, one per embedding row.
+        embeddings (np.ndarray): (count, dim) embedding matrix.
+        model (str): Name of the model that produced the embeddings.
+        normalized (bool): Whether the rows are L2-normalized. Default is True.
+        dtype (str): On-disk dtype, "float32" or "float16". Default is "float32".
+        metadata (list[dict]): Optional per-chunk metadata, one dict per text.
+
+    Returns:
+        str: The store directory.
+
+    Raises:
+        ValueError: If the dtype is unsupported or texts and embeddings disagree in length.
+    """
+    embeddings = np.asarray(embeddings)
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(texts):
+        raise ValueError(f"Expected a ({len(texts)}, dim) matrix, got shape {embeddings.shape}.")
+
+    writer = StoreWriter(store_dir, model, embeddings.shape[1], dtype=dtype, normalized=normalized)
+    writer.append(texts, embeddings, metadata=metadata)
+    return store_dir
+
+
+def _memmap(path: str, dtype, shape):
+    # np.memmap refuses zero-length files, so empty stores get an empty array instead
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+def load_store(store_dir: str) -> VectorStore:
+    """
+    Opens a store directory with memory-mapped embeddings and texts.
+
+    Args:
+        store_dir (str): Directory written by `write_store`.
+
+    Returns:
+        VectorStore: The opened store. Repeated calls for an unchanged store return the same object.
+
+    Raises:
+        FileNotFoundError: If the directory has no manifest.
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Vector store manifest not found: {manifest_path}")
+
+    cache_key = os.path.abspath(store_dir)
+    mtime = os.path.getmtime(manifest_path)
+    cached = _STORE_CACHE.get(cache_key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    count, dim = int(manifest["count"]), int(manifest["dim"])
+    embeddings = _memmap(os.path.join(store_dir, EMBEDDINGS_FILE), manifest["dtype"], (count, dim))
+    offsets = _memmap(os.path.join(store_dir, OFFSETS_FILE), np.int64, (count + 1,))
+    texts_size = int(offsets[-1]) if count else 0
+    texts_buf = _memmap(os.path.join(store_dir, TEXTS_FILE), np.uint8, (texts_size,))
+
+    store = VectorStore(embeddings, texts_buf, offsets, manifest, path=store_dir)
+    _STORE_CACHE[cache_key] = (mtime, store)
+    return store
+
+
+def from_dataframe(df, model: str = "unknown", normalized: bool = True) -> VectorStore:
+    """
+    Builds an in-memory store from a legacy DataFrame with `text` and stringified `embedding` columns.
+
+    Args:
+        df (pd.DataFrame): DataFrame as produced by `generate_embeddings_csv`.
+        model (str): Name of the model that produced the embeddings.
+        normalized (bool): Whether the embeddings are L2-normalized. Default is True.
+
+    Returns:
+        VectorStore: An in-memory store.
+
+    Raises:
+        ValueError: If the DataFrame lacks the `text` or `embedding` columns.
+    """
+    if 'embedding' not in df.columns or 'text' not in df.columns:
+        raise ValueError("CSV must contain 'embedding' and 'text' columns.")
+
+    texts = [str(t) for t in df['text'].fillna('')]
+    rows = [np.fromstring(emb, sep=',', dtype=np.float32) for emb in df['embedding']]
+    embeddings = np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    text_bytes, offsets = _pack_texts(texts)
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "dim": int(embeddings.shape[1]),
+        "dtype": "float32",
+        "normalized": bool(normalized),
+        "count": len(texts),
+    }
+    return VectorStore(embeddings, np.frombuffer(text_bytes, dtype=np.uint8), offsets, manifest)
+
+
+def convert_csv_to_store(csv_file: str, store_dir: str,
+                         model: str = "mixedbread-ai/mxbai-embed-large-v1",
+                         dtype: str = "float32", normalized: bool = True) -> str:
+    """
+    One-shot converter from a legacy embeddings CSV to a binary store.
+
+    Args:
+        csv_file (str): Path to the CSV written by `generate_embeddings_csv`.
+        store_dir (str): Output store directory.
+        model (str): Name of the model that produced the embeddings.
+        dtype (str): On-disk dtype, "float32" or "float16". Default is "float32".
+        normalized (bool): Whether the embeddings are L2-normalized. Default is True.
+
+    Returns:
+        str: The store directory.
+    """
+    import pandas as pd
+
+    store = from_dataframe(pd.read_csv(csv_file), model=model, normalized=normalized)
+    return write_store(store_dir, store.texts(range(len(store))), store.embeddings,
+                       model=model, normalized=normalized, dtype=dtype)
+
+
+def as_vector_store(source) -> VectorStore:
+    """
+    Resolves a store directory, legacy CSV path, DataFrame or VectorStore into a VectorStore.
+
+    Args:
+        source: A `VectorStore`, a store directory, a legacy `.csv` path, or a legacy DataFrame.
+
+    Returns:
+        VectorStore: The resolved store.
+    """
+    if isinstance(source, VectorStore):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        source = os.fspath(source)
+        if os.path.isfile(source) and source.endswith(".csv"):
+            import pandas as pd
+            store = from_dataframe(pd.read_csv(source))
+            # Lets side files written next to the CSV (e.g. its BM25 index) be found
+            store.manifest["source"] = source
+            return store
+        return load_store(source)
+    return from_dataframe(source)
+
+
+def resolve_embedding_source(embedding_store=DEFAULT_STORE_DIR, embedding_csv: str = None):
+    """
+    Resolves the embeddings argument of the answer pipelines, keeping legacy callers working.
+
+    `embedding_csv` is the pipelines' former keyword and still wins when given, with a
+    DeprecationWarning. When the default store directory does not exist but the former
+    default `embedding.csv` does, the CSV is used.
+
+    Args:
+        embedding_store: The `embedding_store` argument of the pipeline.
+        embedding_csv (str): The deprecated `embedding_csv` argument, or None.
+
+    Returns:
+        The source to pass to `as_vector_store`.
+    """
+    if embedding_csv is not None:
+        warnings.warn("embedding_csv is deprecated; pass embedding_store instead.",
+                      DeprecationWarning, stacklevel=3)
+        return embedding_csv
+    if (isinstance(embedding_store, str) and embedding_store == DEFAULT_STORE_DIR
+            and not os.path.exists(os.path.join(DEFAULT_STORE_DIR, MANIFEST_FILE))
+            and os.path.isfile(LEGACY_CSV_FILE)):
+        return LEGACY_CSV_FILE
+    return embedding_store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a legacy embeddings CSV into a binary vector store.")
+    parser.add_argument("csv_file")
+    parser.add_argument("store_dir")
+    parser.add_argument("--model", default="mixedbread-ai/mxbai-embed-large-v1")
+    parser.add_argument("--dtype", default="float32", choices=SUPPORTED_DTYPES)
+    args = parser.parse_args()
+
+    convert_csv_to_store(args.csv_file, args.store_dir, model=args.model, dtype=args.dtype)
+    print(f"[VectorStore] Wrote {args.store_dir}")
@@ -0,0 +1,27 @@
+"""
+conftest.py
+
+Shared fixtures: every test runs against the offline stand-ins of `main.offline`, with
+the process-wide model registry and LLM client settings restored afterwards.
+"""
+
+import pytest
+
+from main import llm_client, models
+from main.offline import HashingEncoder, OverlapReranker, StubLLM, use_offline_models
+
+
+@pytest.fixture(autouse=True)
+def isolated_client(monkeypatch):
+    """Gives each test its own LLM client settings, rate limiter and (disabled) cache."""
+    monkeypatch.setattr(llm_client, "_settings", dict(llm_client._settings))
+    monkeypatch.setattr(llm_client, "_limiter", llm_client.RateLimiter())
+    monkeypatch.setattr(llm_client, "_cache", None)
+    monkeypatch.setattr(models, "_models", {})
+    monkeypatch.setattr(models, "_factories", dict(models._factories))
+
+
+@pytest.fixture
+def offline():
+    """Registers a small hashing encoder, the overlap reranker and the stub LLM."""
+    return use_offline_models(HashingEncoder(dim=64), OverlapReranker(), StubLLM())
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from main.ann_index import IVFIndex, QuantizedIndex, build_index, open_index
+from main.vector_store import load_store, write_store
+
+
+def _store(path, seed, count=64, dim=16):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    write_store(str(path), [f"chunk {i}" for i in range(count)], vectors, model="test")
+    return load_store(str(path))
+
+
+def test_ivf_index_is_stale_after_store_rebuild(tmp_path):
+    build_index(_store(tmp_path, seed=0), kind="ivf", nlist=4)
+    IVFIndex.load(load_store(str(tmp_path)))
+
+    # Same chunk count, different vectors: the old lists must not be used
+    rebuilt = _store(tmp_path, seed=1)
+    with pytest.raises(ValueError, match="stale"):
+        IVFIndex.load(rebuilt)
+
+
+def test_quantized_codes_are_ignored_after_store_rebuild(tmp_path):
+    build_index(_store(tmp_path, seed=0), kind="binary")
+    assert open_index(load_store(str(tmp_path))).kind == "binary"
+
+    rebuilt = _store(tmp_path, seed=1)
+    with pytest.raises(ValueError, match="stale"):
+        QuantizedIndex.load(rebuilt, "binary")
+    assert open_index(rebuilt).kind == "exact"
+
+
+def test_auto_mode_skips_int8_codes(tmp_path):
+    store = _store(tmp_path, seed=0)
+    build_index(store, kind="int8")
+    store = load_store(str(tmp_path))
+    assert open_index(store).kind == "exact"
+    assert open_index(store, mode="int8").kind == "int8"
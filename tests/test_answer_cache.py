@@ -0,0 +1,49 @@
+import numpy as np
+
+from main.answer_cache import AnswerCache
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_similar_query_hits_above_threshold():
+    cache = AnswerCache(threshold=0.9)
+    cache.put("How many died in the Nepal earthquake?", _unit(1, 0, 0), ("nepal",), "v1", "About 9,000.")
+
+    hit = cache.lookup("How many people died in the Nepal earthquake?", _unit(1, 0.1, 0), ("nepal",), "v1")
+    assert hit is not None
+    entry, similarity = hit
+    assert entry.answer == "About 9,000."
+    assert similarity >= 0.9
+
+    assert cache.lookup("What was the magnitude?", _unit(1, 1, 0), ("nepal",), "v1") is None
+    # The same question routed to another KG never reuses the answer
+    assert cache.lookup("How many died in the Nepal earthquake?", _unit(1, 0, 0), ("kerala",), "v1") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_new_version_invalidates_the_scope():
+    cache = AnswerCache(threshold=0.9)
+    cache.put("q", _unit(1, 0), ("nepal",), "v1", "old answer")
+    cache.put("q", _unit(1, 0), ("kerala",), "v1", "other answer")
+
+    assert cache.lookup("q", _unit(1, 0), ("nepal",), "v2") is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.lookup("q", _unit(1, 0), ("kerala",), "v1")[0].answer == "other answer"
+
+    cache.put("q", _unit(1, 0), ("nepal",), "v2", "new answer")
+    assert cache.lookup("q", _unit(1, 0), ("nepal",), "v2")[0].answer == "new answer"
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = AnswerCache(threshold=0.9, max_entries=2)
+    cache.put("a", _unit(1, 0, 0), ("s",), "v", "A")
+    cache.put("b", _unit(0, 1, 0), ("s",), "v", "B")
+    cache.lookup("a", _unit(1, 0, 0), ("s",), "v")
+    cache.put("c", _unit(0, 0, 1), ("s",), "v", "C")
+
+    assert len(cache) == 2
+    assert cache.lookup("b", _unit(0, 1, 0), ("s",), "v") is None
+    assert cache.lookup("a", _unit(1, 0, 0), ("s",), "v")[0].answer == "A"
@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from main.benchmarks import benchmark_pipelines
+from main.offline import HashingEncoder, OverlapReranker, StubLLM, synthetic_queries, write_synthetic_text
+
+
+def test_stand_ins_and_synthetic_data_are_deterministic(tmp_path):
+    texts = ["flood relief in kerala", "earthquake in nepal"]
+    assert np.array_equal(HashingEncoder(dim=32).encode(texts), HashingEncoder(dim=32).encode(texts))
+    scores = OverlapReranker().predict([("kerala flood", texts[0]), ("kerala flood", texts[1])])
+    assert scores[0] > scores[1]
+    assert StubLLM().respond("Question: q") == StubLLM().respond("Question: q")
+
+    assert synthetic_queries(5, seed=3) == synthetic_queries(5, seed=3)
+    a = write_synthetic_text(str(tmp_path / "a.txt"), 20, seed=1)
+    b = write_synthetic_text(str(tmp_path / "b.txt"), 20, seed=1)
+    assert open(a, encoding="utf-8").read() == open(b, encoding="utf-8").read()
+
+
+def test_pipelines_benchmark_reports_every_operation(tmp_path):
+    report = benchmark_pipelines(sizes=(200,), n_queries=2, dim=32, n_kgs=2, trace_memory=False,
+                                 work_dir=str(tmp_path))
+    ops = [row["op"] for row in report["results"]]
+    assert ops == ["synthetic_store", "generate_embeddings_csv", "generate_embeddings_store",
+                   "retrieve_from_rag", "give_query_answer_rag_multihop", "hybrid_kg_rag_pipeline"]
+    for row in report["results"]:
+        assert row["chunks"] == 200
+        assert row["p50_ms"] <= row["p99_ms"]
+        assert row["throughput_per_s"] > 0
+    assert report["meta"]["llm_calls"] > 0
+    json.dumps(report)
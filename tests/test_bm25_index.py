@@ -0,0 +1,18 @@
+import numpy as np
+
+from main.bm25_index import build_bm25_index, open_bm25_index
+from main.vector_store import load_store, write_store
+
+
+def _store(path, words):
+    texts = [f"{word} chunk" for word in words]
+    write_store(str(path), texts, np.eye(len(texts), dtype=np.float32), model="test")
+    return load_store(str(path))
+
+
+def test_index_is_ignored_after_store_rebuild(tmp_path):
+    build_bm25_index(_store(tmp_path, ["alpha", "beta"]))
+    assert open_bm25_index(load_store(str(tmp_path))) is not None
+
+    # Same chunk count, different texts: the old postings must not be used
+    assert open_bm25_index(_store(tmp_path, ["gamma", "delta"])) is None
@@ -0,0 +1,56 @@
+import pytest
+
+from main.chunker import ChunkReport, iter_token_chunks
+
+TEXT = "One two three. Four five six. Seven eight nine.\n\nTen eleven twelve thirteen fourteen fifteen sixteen seventeen."
+
+
+def _count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+def _chunks(path, **kwargs):
+    return list(iter_token_chunks(str(path), count_tokens=_count_words, source="doc", **kwargs))
+
+
+def test_chunks_pack_whole_sentences_with_overlap(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(TEXT.encode("utf-8"))
+    chunks = [chunk for chunk, _ in _chunks(path, max_tokens=6, overlap_tokens=3)]
+
+    assert [c.text for c in chunks] == ["One two three. Four five six.",
+                                        "Four five six. Seven eight nine.",
+                                        "Ten eleven twelve thirteen fourteen fifteen",
+                                        "sixteen seventeen."]
+    assert [c.chunk_id for c in chunks] == ["doc#0", "doc#1", "doc#2", "doc#3"]
+    assert all(c.tokens <= 6 for c in chunks)
+    # Byte offsets point back at the chunk in the source
+    for chunk in chunks:
+        assert " ".join(TEXT.encode("utf-8")[chunk.start:chunk.end].decode("utf-8").split()) == chunk.text
+
+
+def test_no_overlap_and_invalid_overlap(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(TEXT.encode("utf-8"))
+    texts = [chunk.text for chunk, _ in _chunks(path, max_tokens=6, overlap_tokens=0)]
+    assert texts[:2] == ["One two three. Four five six.", "Seven eight nine."]
+
+    with pytest.raises(ValueError, match="overlap_tokens"):
+        _chunks(path, max_tokens=6, overlap_tokens=6)
+
+
+def test_resume_from_a_yielded_position_repeats_the_remaining_chunks(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(TEXT.encode("utf-8"))
+    full = _chunks(path, max_tokens=6, overlap_tokens=3)
+    for i, (_, position) in enumerate(full[:-1]):
+        resumed = _chunks(path, max_tokens=6, overlap_tokens=3, start=position)
+        assert [(c.text, c.index) for c, _ in resumed] == [(c.text, c.index) for c, _ in full[i + 1:]]
+
+
+def test_report_counts_truncated_tokens():
+    report = ChunkReport(max_tokens=10)
+    for tokens in (4, 10, 15):
+        report.add(tokens)
+    assert report.to_dict() == {"chunks": 3, "max_tokens": 10, "tokens_encoded": 24,
+                                "tokens_truncated": 5, "truncated_chunks": 1}
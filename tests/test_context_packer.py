@@ -0,0 +1,50 @@
+import numpy as np
+
+from main.context_packer import pack_context, trim_to_sentences
+from main.vector_store import load_store, write_store
+
+TEXTS = [
+    "The flood closed the main road. Schools stayed open.",
+    "The flood closed the main road. Schools stayed open!",
+    "Relief camps housed ten thousand people.",
+    "Rainfall was three times the seasonal average.",
+]
+
+
+def _store(tmp_path):
+    vectors = np.array([[1, 0, 0], [1, 0.01, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    write_store(str(tmp_path), TEXTS, vectors, model="test")
+    return load_store(str(tmp_path))
+
+
+def test_repeated_chunks_are_merged_and_near_duplicates_dropped(tmp_path):
+    store = _store(tmp_path)
+    hits = [[(0, 0.9), (1, 0.8), (2, 0.5)], [(2, 0.7), (3, 0.1)]]
+    packed = pack_context(hits, store, token_budget=None)
+
+    assert packed.chunk_ids == [0, 2, 3]
+    assert packed.dropped_duplicates == 1
+    assert packed.tokens == sum(len(TEXTS[i]) // 4 for i in (0, 2, 3))
+    assert packed.join() == "\n".join(TEXTS[i] for i in (0, 2, 3))
+
+
+def test_budget_is_never_exceeded(tmp_path):
+    store = _store(tmp_path)
+    hits = [(0, 0.9), (2, 0.5), (3, 0.4)]
+    budget = len(TEXTS[0]) // 4 + len(TEXTS[2]) // 4
+    packed = pack_context(hits, store, token_budget=budget)
+
+    assert packed.tokens <= budget
+    assert packed.chunk_ids == [0, 2]
+    assert packed.dropped_budget == 1
+    assert len(pack_context([], store)) == 0
+
+
+def test_chunks_are_trimmed_to_matching_sentences(tmp_path):
+    assert trim_to_sentences("The flood closed roads. Schools stayed open.", "Were schools open?") == \
+        "Schools stayed open."
+    assert trim_to_sentences("One. Two.", "unrelated") == "One. Two."
+
+    packed = pack_context([(0, 0.9)], _store(tmp_path), queries=["Which road closed?"], trim_sentences=True)
+    assert packed.chunks == ["The flood closed the main road."]
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from main.embedding_generator import generate_embeddings_store, update_embeddings_store
+from main.vector_store import load_store
+
+
+def _write(path, text, mtime=None):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_resume_returns_complete_store(tmp_path, offline):
+    src = tmp_path / "corpus.txt"
+    _write(src, "alpha beta gamma. delta epsilon zeta.")
+    store = str(tmp_path / "store")
+    generate_embeddings_store(str(src), store, chunk_size=3)
+    count = len(load_store(store))
+
+    generate_embeddings_store(str(src), store, chunk_size=3)
+    assert len(load_store(store)) == count
+
+
+def test_resume_rejects_edited_input(tmp_path, offline):
+    src = tmp_path / "corpus.txt"
+    _write(src, "alpha beta gamma. delta epsilon zeta.", mtime=1_000_000)
+    store = str(tmp_path / "store")
+    generate_embeddings_store(str(src), store, chunk_size=3)
+
+    _write(src, "alpha beta gamma. delta epsilon theta.", mtime=2_000_000)
+    with pytest.raises(ValueError, match="different inputs"):
+        generate_embeddings_store(str(src), store, chunk_size=3)
+
+    generate_embeddings_store(str(src), store, chunk_size=3, resume=False)
+    assert "theta" in load_store(store).text(1)
+
+
+def test_resume_rejects_store_without_checkpoint(tmp_path, offline):
+    src = tmp_path / "corpus.txt"
+    _write(src, "alpha beta gamma. delta epsilon zeta.")
+    store = str(tmp_path / "store")
+    update_embeddings_store(str(src), store, chunk_size=3)
+    count = len(load_store(store))
+
+    with pytest.raises(ValueError, match="no checkpoint"):
+        generate_embeddings_store(str(src), store, chunk_size=3)
+    assert len(load_store(store)) == count
+
+
+def test_vectors_of_another_backend_are_not_reused(tmp_path, offline):
+    from main.models import EMBEDDING, register_model
+    from main.offline import HashingEncoder
+
+    src = tmp_path / "corpus.txt"
+    _write(src, "alpha beta gamma. delta epsilon zeta.")
+    store = str(tmp_path / "store")
+    update_embeddings_store(str(src), store, chunk_size=3)
+    assert update_embeddings_store(str(src), store, chunk_size=3)["encoded"] == 0
+
+    quantized = HashingEncoder(dim=64)
+    quantized.model_id = "offline/hashing-encoder@int8"
+    register_model(EMBEDDING, model=quantized)
+    report = update_embeddings_store(str(src), store, chunk_size=3)
+    assert report["reused"] == 0
+    assert load_store(store).model == "offline/hashing-encoder@int8"
+
+
+def test_update_counts_reused_and_removed_chunks(tmp_path, offline):
+    src = tmp_path / "corpus.txt"
+    _write(src, "alpha beta gamma alpha beta gamma delta epsilon zeta")
+    store = str(tmp_path / "store")
+    report = update_embeddings_store(str(src), store, chunk_size=3)
+    assert report == dict(report, encoded=3, reused=0, removed=0, total=3)
+
+    # Both duplicate chunks are still present; only "delta epsilon zeta" disappeared
+    _write(src, "alpha beta gamma alpha beta gamma eta theta iota")
+    report = update_embeddings_store(str(src), store, chunk_size=3)
+    assert report == dict(report, encoded=1, reused=2, removed=1, total=3)
+    assert [load_store(store).text(i) for i in range(3)] == ["alpha beta gamma", "alpha beta gamma",
+                                                              "eta theta iota"]
@@ -0,0 +1,19 @@
+from main.evaluation import run_evaluation
+
+
+def test_whitespace_variants_are_evaluated_once(tmp_path):
+    calls = []
+
+    def system(query):
+        calls.append(query)
+        return "answer"
+
+    def judge(t1, t2, t3, t4, query):
+        return "\n".join(f"Text {i} (T{i}): 7/10" for i in range(1, 5))
+
+    systems = {name: system for name in ("a", "b", "c", "d")}
+    records = run_evaluation(["what  happened?", "what happened?", " what happened? "],
+                             str(tmp_path / "eval.jsonl"), systems=systems, judge_fn=judge)
+    assert len(records) == 1
+    assert len(calls) == 4
+    assert "error" not in records[0]
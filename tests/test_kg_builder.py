@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from main.kg_builder import build_kg_map_reduce, merge_partial_kgs, parse_kg_output, validate_kg
+from main.llm_client import configure
+
+SCHEMA = {"event": {"name": "<name>", "coordinates": "<value>", "impacts": "<comma-separated list>"}}
+
+
+def test_failed_chunk_is_skipped(tmp_path):
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Extract: inputStr", encoding="utf-8")
+    schema = tmp_path / "schema.json"
+    schema.write_text(json.dumps(SCHEMA), encoding="utf-8")
+
+    def completion(**kwargs):
+        text = kwargs["messages"][0]["content"]
+        if "broken" in text:
+            raise KeyError("provider rejected the request")
+        return {"choices": [{"message": {"content": "data = {'event': {'name': 'Flood', "
+                                                    "'impacts': 'roads'}}"}}]}
+
+    configure(completion_fn=completion)
+    kg = build_kg_map_reduce("good text\n\nbroken text\n\nmore good text", prompt_path=str(prompt),
+                             schema_path=str(schema), chunk_words=2)
+    assert kg["event"]["name"] == "Flood."
+    assert kg["event"]["impacts"] == "roads"
+
+
+def test_non_dict_output_is_rejected():
+    with pytest.raises(ValueError):
+        parse_kg_output("{'name', 'Flood'}")
+
+
+@pytest.mark.parametrize("output", ["data = {[1]: 2}", "{" * 5000 + "}" * 5000])
+def test_malformed_output_raises_value_error(output):
+    with pytest.raises(ValueError):
+        parse_kg_output(output)
+
+
+def test_unhashable_key_chunk_is_skipped(tmp_path, caplog):
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Extract: inputStr", encoding="utf-8")
+    schema = tmp_path / "schema.json"
+    schema.write_text(json.dumps(SCHEMA), encoding="utf-8")
+
+    def completion(**kwargs):
+        if "broken" in kwargs["messages"][0]["content"]:
+            return {"choices": [{"message": {"content": "data = {[1]: 2}"}}]}
+        return {"choices": [{"message": {"content": "data = {'event': {'name': 'Flood'}}"}}]}
+
+    configure(completion_fn=completion)
+    kg = build_kg_map_reduce("good text\n\nbroken text", prompt_path=str(prompt),
+                             schema_path=str(schema), chunk_words=2)
+    assert kg["event"]["name"] == "Flood."
+    assert "Skipping chunk 2/2" in caplog.text
+
+
+def test_list_leaves_are_joined():
+    partials = [{"event": {"name": "Flood", "coordinates": ["10N", "20E"], "impacts": ["roads", "farms"]}},
+                {"event": {"name": {"nested": "x"}, "impacts": "bridges"}}]
+    kg = merge_partial_kgs(partials, SCHEMA)
+    assert validate_kg(kg, SCHEMA) == []
+    assert kg["event"]["coordinates"] == "10N, 20E"
+    assert kg["event"]["impacts"] == "roads, farms, bridges"
+    assert kg["event"]["name"] == "Flood."
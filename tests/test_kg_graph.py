@@ -0,0 +1,42 @@
+from main.kg_graph import KGGraph, split_items
+from main.kg_registry import KGRegistry
+
+SCHEMA = {"countries_aiding": "<comma-separated list of countries>",
+          "impact": {"deaths": "<number of deaths>"}}
+
+
+def _graph():
+    registry = KGRegistry()
+    registry.register("quake", {"countries_aiding": "India, China (via NGO), USA", "impact": {"deaths": "9000"}},
+                      auto_aliases=False)
+    registry.register("flood", {"countries_aiding": "india, UAE and others", "impact": {"deaths": "480"}},
+                      auto_aliases=False)
+    registry.register("storm", {"countries_aiding": "USA", "impact": {"deaths": "20"}}, auto_aliases=False)
+    return KGGraph.from_registry(registry, schema=SCHEMA)
+
+
+def test_split_items_drops_citations_vague_items_and_duplicates():
+    value = "India, China (via NGO, Red Cross), and USA, india, many others. Source: Reuters"
+    assert split_items(value) == ["India", "China (via NGO, Red Cross)", "USA"]
+
+
+def test_items_and_shared_items_across_events():
+    graph = _graph()
+    assert graph.items("quake", "countries_aiding") == ["China (via NGO)", "India", "USA"]
+    assert graph.events_with("countries_aiding", "INDIA") == ["flood", "quake"]
+    assert graph.related_events("quake", "countries_aiding") == {"flood": ["India"], "storm": ["USA"]}
+    shared = graph.shared_items("countries_aiding", ["quake", "flood"])
+    assert list(shared.values()) == [["flood", "quake"]]
+
+
+def test_select_reads_relevant_paths_for_the_routed_events():
+    graph = _graph()
+    assert graph.select("How many deaths?", ["quake"], n=1) == {"impact.deaths": "9000"}
+
+    triples = graph.select("Which countries aided both events?", ["quake", "flood"], n=2)
+    assert triples["quake.countries_aiding"] == "India, China (via NGO), USA"
+    assert "flood.countries_aiding" in triples
+    assert triples["shared.countries_aiding"].lower() == "india"
+    assert "storm.countries_aiding" not in triples
+
+    assert graph.select("Unrelated words entirely", ["quake"]) == {}
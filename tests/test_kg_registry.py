@@ -0,0 +1,21 @@
+from main.kg_registry import KGRegistry
+from main.offline import HashingEncoder
+
+
+def test_country_names_do_not_select_an_event():
+    registry = KGRegistry.from_directory("data/kg")
+    assert "India" not in registry["kerala_floods_2018"].aliases
+    assert registry.route("How did India help Nepal?") == ["nepal_earthquake_2015"]
+    assert registry.route("How did Nepal help India?") == ["nepal_earthquake_2015"]
+
+
+def test_aliases_of_both_events_select_both_in_query_order():
+    registry = KGRegistry.from_directory("data/kg")
+    assert registry.route("Compare Nepal and Kerala") == ["nepal_earthquake_2015", "kerala_floods_2018"]
+
+
+def test_country_is_still_used_for_embedding_routing():
+    registry = KGRegistry(embedding_model=HashingEncoder(dim=256))
+    registry.register("flood", {"country": "India", "region": "Assam", "causes": "monsoon rain"})
+    registry.register("quake", {"country": "Chile", "region": "Maule", "causes": "subduction"})
+    assert registry.route("rain in India", min_score=0.0, max_kgs=1) == ["flood"]
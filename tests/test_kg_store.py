@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from main import kg_store
+from main.kg_store import COMPILED_SUFFIX, compile_kg, load_kg, read_compiled_kg
+
+
+@pytest.fixture(autouse=True)
+def empty_kg_cache(monkeypatch):
+    monkeypatch.setattr(kg_store, "_KG_CACHE", {})
+
+
+def _write_source(path, data, mtime):
+    path.write_text(f"data = {data!r}", encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_compiled_kg_round_trips(tmp_path):
+    kg = {"event": {"name": "Flood", "impact": {"deaths": "12", "roads": "closed"}}}
+    out = str(tmp_path / "kg.kgc")
+    compile_kg(kg, out_path=out)
+
+    compiled = read_compiled_kg(out)
+    assert compiled.paths == ["event.name", "event.impact.deaths", "event.impact.roads"]
+    assert compiled.get("event.impact.deaths") == "12"
+    assert compiled.subtree("event.impact") == {"event.impact.deaths": "12", "event.impact.roads": "closed"}
+
+
+def test_source_is_compiled_and_recompiled_on_change(tmp_path):
+    source = tmp_path / "KG_TEST.txt"
+    compiled_path = str(source) + COMPILED_SUFFIX
+    _write_source(source, {"event": {"name": "Flood"}}, mtime=1_000_000)
+
+    assert load_kg(str(source)).get("event.name") == "Flood"
+    assert os.path.exists(compiled_path)
+    assert read_compiled_kg(compiled_path).get("event.name") == "Flood"
+
+    _write_source(source, {"event": {"name": "Earthquake"}}, mtime=os.path.getmtime(compiled_path) + 10)
+    assert load_kg(str(source)).get("event.name") == "Earthquake"
+    assert read_compiled_kg(compiled_path).get("event.name") == "Earthquake"
+
+
+def test_unwritable_compiled_file_is_logged(tmp_path, caplog):
+    source = tmp_path / "KG_TEST.txt"
+    compiled_path = str(source) + COMPILED_SUFFIX
+    os.mkdir(compiled_path)
+    os.utime(compiled_path, (1_000_000, 1_000_000))
+    _write_source(source, {"event": {"name": "Flood"}}, mtime=2_000_000)
+
+    assert load_kg(str(source)).get("event.name") == "Flood"
+    assert "Could not write" in caplog.text
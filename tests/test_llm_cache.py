@@ -0,0 +1,50 @@
+import itertools
+
+from main import llm_cache
+from main.llm_cache import LLMCache, cache_key
+from main.llm_client import configure, give_answer
+
+
+def test_keys_address_model_prompt_and_params():
+    key = cache_key("gemini", "q", {"temperature": 0})
+    assert key == cache_key("gemini", "q", {"temperature": 0})
+    assert key != cache_key("gemini", "q", {"temperature": 1})
+    assert key != cache_key("gpt", "q", {"temperature": 0})
+    assert key != cache_key("gemini", "q2", {"temperature": 0})
+
+
+def test_entries_persist_expire_and_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(clock)))
+    path = str(tmp_path / "llm.sqlite")
+
+    cache = LLMCache(path, max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.close()
+    cache = LLMCache(path, max_entries=2)
+    assert cache.get("a") == "A"
+    cache.put("c", "C")  # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.stats() == dict(cache.stats(), hits=1, misses=1, evictions=1, entries=2)
+
+    cache.ttl = 3
+    for _ in range(5):
+        next(clock)
+    assert cache.get("c") is None
+
+
+def test_repeated_calls_are_answered_from_the_cache(tmp_path):
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        return {"choices": [{"message": {"content": f"answer {len(calls)}"}}]}
+
+    configure(completion_fn=completion, cache_path=str(tmp_path / "llm.sqlite"))
+    assert give_answer("q") == "answer 1"
+    assert give_answer("q") == "answer 1"
+    assert give_answer("q", cache=False) == "answer 2"
+    assert give_answer("q", refresh=True) == "answer 3"
+    assert give_answer("q") == "answer 3"
+    assert len(calls) == 3
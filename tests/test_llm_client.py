@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from main import llm_client
+from main.llm_client import configure, give_answer, give_answers
+
+
+def _response(content):
+    return {"choices": [{"message": {"content": content}}]}
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_retries_transient_errors_with_capped_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_client.time, "sleep", delays.append)
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 4:
+            raise RateLimitError("slow down")
+        return _response("ok")
+
+    configure(completion_fn=completion, max_retries=5, backoff_base=1.0, backoff_cap=3.0)
+    assert give_answer("q") == "ok"
+    assert len(calls) == 4
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= min(3.0, 2 ** attempt)
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(llm_client.time, "sleep", lambda _: None)
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        raise ConnectionError("down")
+
+    configure(completion_fn=completion, max_retries=2)
+    with pytest.raises(ConnectionError):
+        give_answer("q")
+    assert len(calls) == 3
+
+
+def test_does_not_retry_other_errors():
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        raise KeyError("bad request")
+
+    configure(completion_fn=completion, max_retries=5)
+    with pytest.raises(KeyError):
+        give_answer("q")
+    assert len(calls) == 1
+
+
+def test_timeout_is_passed_and_enforced():
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        return _response("ok")
+
+    async def acompletion(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(5)
+
+    configure(completion_fn=completion, timeout=7.5)
+    give_answer("q")
+    assert calls[-1]["timeout"] == 7.5
+
+    calls.clear()
+    configure(completion_fn=completion, acompletion_fn=acompletion, timeout=0.05,
+              max_retries=1, backoff_base=0.0)
+    with pytest.raises(asyncio.TimeoutError):
+        give_answers(["q"])
+    assert len(calls) == 2
+
+
+def test_give_answers_keeps_prompt_order():
+    async def acompletion(**kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        # Later prompts finish first
+        await asyncio.sleep(0.01 * (10 - int(prompt)))
+        return _response(f"answer {prompt}")
+
+    configure(completion_fn=lambda **kwargs: None, acompletion_fn=acompletion)
+    prompts = [str(i) for i in range(10)]
+    assert give_answers(prompts, max_concurrency=10) == [f"answer {p}" for p in prompts]
+
+
+def test_give_answers_bounds_concurrency():
+    in_flight = [0]
+    peak = [0]
+
+    async def acompletion(**kwargs):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return _response("ok")
+
+    configure(completion_fn=lambda **kwargs: None, acompletion_fn=acompletion)
+    assert give_answers(["q"] * 20, max_concurrency=3) == ["ok"] * 20
+    assert peak[0] == 3
+
+
+def test_stream_caches_only_non_empty_content(tmp_path):
+    replies = [[], ["hel", "lo"]]
+    calls = []
+
+    def completion(stream=False, **kwargs):
+        calls.append(kwargs)
+        return iter([{"choices": [{"delta": {"content": piece}}]} for piece in replies[len(calls) - 1]])
+
+    configure(completion_fn=completion, cache_path=str(tmp_path / "llm.sqlite"))
+    assert "".join(llm_client.give_answer_stream("q")) == ""
+    assert "".join(llm_client.give_answer_stream("q")) == "hello"
+    assert "".join(llm_client.give_answer_stream("q")) == "hello"
+    assert len(calls) == 2
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import main
+from main import models
+
+
+def test_import_main_loads_no_heavy_modules():
+    code = ("import sys, main, main.hybrid, main.judge_texts; "
+            "print(sorted(m for m in ('torch', 'sentence_transformers', 'litellm') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == "[]"
+
+
+def test_public_names_resolve_lazily():
+    assert main.warmup is models.warmup
+    assert "KGRegistry" in dir(main)
+    with pytest.raises(AttributeError):
+        main.not_a_name
+
+
+def test_models_load_once_on_first_use():
+    built = []
+    barrier = threading.Barrier(4)
+
+    def factory():
+        built.append(1)
+        return object()
+
+    models.register_model("probe", factory=factory)
+    assert not models.is_loaded("probe")
+
+    results = []
+
+    def load():
+        barrier.wait()
+        results.append(models.get_model("probe"))
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1 and len({id(r) for r in results}) == 1
+    assert models.is_loaded("probe")
+
+    models.warmup(["probe"])
+    assert len(built) == 1
@@ -0,0 +1,41 @@
+import pytest
+
+from main.embedding_generator import generate_embeddings_csv
+from main.rag_answer import give_query_answer_rag
+
+
+def test_embedding_csv_keyword_still_accepted(tmp_path, offline):
+    src = tmp_path / "corpus.txt"
+    src.write_text("The mill was rebuilt in 1802. The bridge opened in 1850.", encoding="utf-8")
+    csv_file = str(tmp_path / "embedding.csv")
+    generate_embeddings_csv(str(src), csv_file, chunk_size=6)
+
+    with pytest.deprecated_call():
+        result = give_query_answer_rag("When was the mill rebuilt?", embedding_csv=csv_file, k=2, m=1,
+                                       return_result=True)
+    assert result.answer
+    assert "mill" in result.context[0]
+
+
+def test_default_store_falls_back_to_legacy_csv(tmp_path, monkeypatch, offline):
+    src = tmp_path / "corpus.txt"
+    src.write_text("The mill was rebuilt in 1802. The bridge opened in 1850.", encoding="utf-8")
+    generate_embeddings_csv(str(src), str(tmp_path / "embedding.csv"), chunk_size=6)
+    monkeypatch.chdir(tmp_path)
+
+    result = give_query_answer_rag("When was the mill rebuilt?", k=2, m=1, return_result=True)
+    assert "mill" in result.context[0]
+
+
+def test_k_is_clamped_to_the_rerank_limit(tmp_path, monkeypatch, offline):
+    from main import rerank_service
+    from main.offline import OverlapReranker
+
+    src = tmp_path / "corpus.txt"
+    src.write_text(" ".join(f"word{i} mill" for i in range(40)), encoding="utf-8")
+    csv_file = str(tmp_path / "embedding.csv")
+    generate_embeddings_csv(str(src), csv_file, chunk_size=4)
+    monkeypatch.setattr(rerank_service, "_service", rerank_service.RerankService(OverlapReranker(), max_pairs=3))
+
+    result = give_query_answer_rag("mill", csv_file, k=2500, m=2, return_result=True)
+    assert len(result.context) <= 2
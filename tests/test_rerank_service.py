@@ -0,0 +1,63 @@
+import itertools
+import sqlite3
+
+from main import rerank_service
+from main.rerank_service import _ScoreTable
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(rerank_service.time, "time", lambda: float(next(clock)))
+    table = _ScoreTable(str(tmp_path / "scores.sqlite"), max_entries=2)
+
+    table.put_many([("a", 1.0), ("b", 2.0)])
+    assert table.get_many(["a"]) == {"a": 1.0}
+    table.put_many([("c", 3.0)])
+    assert table.get_many(["a", "b", "c"]) == {"a": 1.0, "c": 3.0}
+
+
+def test_disk_cache_migrates_tables_without_accessed(tmp_path):
+    path = str(tmp_path / "scores.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE scores (key TEXT PRIMARY KEY, score REAL NOT NULL, created REAL NOT NULL)")
+    conn.execute("INSERT INTO scores VALUES ('a', 1.0, 5.0)")
+    conn.commit()
+    conn.close()
+
+    table = _ScoreTable(path, max_entries=10)
+    assert table.get_many(["a"]) == {"a": 1.0}
+    table.put_many([("b", 2.0)])
+    assert table.get_many(["a", "b"]) == {"a": 1.0, "b": 2.0}
+
+
+def test_cache_keys_use_the_backend_id_before_the_model_loads(monkeypatch):
+    from main import inference, models
+    from main.models import RERANKER, RERANKER_MODEL_NAME, register_model
+    from main.offline import OverlapReranker
+
+    monkeypatch.setattr(inference, "INFERENCE_BACKEND", "int8")
+    monkeypatch.setattr(models, "get_device", lambda: "cpu")
+    quantized = OverlapReranker()
+    quantized.model_id = f"{RERANKER_MODEL_NAME}@int8"
+    register_model(RERANKER, factory=lambda: quantized)
+
+    service = rerank_service.RerankService()
+    assert service.model_id == f"{RERANKER_MODEL_NAME}@int8"
+    service.predict([("flood relief", "relief camps after the flood")])
+    expected = rerank_service._score_key(f"{RERANKER_MODEL_NAME}@int8", "flood relief",
+                                         rerank_service._text_id("relief camps after the flood"))
+    assert list(service._memory) == [expected]
+
+
+def test_stats_count_every_pair_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from main.offline import OverlapReranker
+
+    service = rerank_service.RerankService(OverlapReranker(), model_id="overlap")
+    pairs = [("flood relief", f"passage {i % 50} about flood relief") for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda start: service.predict(pairs[start:start + 20]), range(0, 200, 20)))
+    stats = service.stats()
+    assert stats["hits"] + stats["misses"] == 200
+    assert stats["memory_entries"] == 50
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from main.offline import HashingEncoder, OverlapReranker, synthetic_queries, synthetic_store
+from main.retrieval import batch_retrieve, batch_retrieve_indices, reciprocal_rank_fusion
+from main.vector_store import load_store
+
+
+class _Counting:
+    """Wraps a model and records the size of every call."""
+
+    def __init__(self, model, method):
+        self.model = model
+        self.calls = []
+        setattr(self, method, self._call(getattr(model, method)))
+
+    def _call(self, fn):
+        def wrapped(inputs, **kwargs):
+            self.calls.append(len(inputs))
+            return fn(inputs, **kwargs)
+        return wrapped
+
+
+@pytest.fixture
+def store(tmp_path):
+    encoder = HashingEncoder(dim=64)
+    synthetic_store(str(tmp_path / "store"), 200, encoder, words_per_chunk=30, n_topics=8)
+    return load_store(str(tmp_path / "store"))
+
+
+def test_queries_are_encoded_and_reranked_in_one_call(store):
+    encoder = _Counting(HashingEncoder(dim=64), "encode")
+    reranker = _Counting(OverlapReranker(), "predict")
+    queries = synthetic_queries(4, n_topics=8)
+
+    batched = batch_retrieve_indices(queries + queries[:1], store, encoder, reranker, k=10, m=3)
+    assert encoder.calls == [4]  # the repeated query is encoded once
+    assert reranker.calls == [40]  # one union rerank over every query's candidates
+    assert batched[-1] == batched[0]
+
+    for query, hits in zip(queries, batched):
+        alone = batch_retrieve_indices([query], store, HashingEncoder(dim=64), OverlapReranker(), k=10, m=3)[0]
+        assert hits == alone
+    texts = batch_retrieve(queries, store, HashingEncoder(dim=64), OverlapReranker(), k=10, m=3)
+    assert texts[0] == store.texts([chunk_id for chunk_id, _ in batched[0]])
+
+
+def test_max_pairs_caps_the_union_rerank(store):
+    reranker = _Counting(OverlapReranker(), "predict")
+    batch_retrieve_indices(synthetic_queries(4, n_topics=8), store, HashingEncoder(dim=64), reranker,
+                           k=10, m=3, max_pairs=20, fusion=False)
+    assert reranker.calls == [20]
+
+
+def test_reciprocal_rank_fusion_favours_chunks_in_both_lists():
+    fused = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1, 4])], limit=3)
+    assert fused.tolist() == [1, 3, 2]
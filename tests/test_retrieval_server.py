@@ -0,0 +1,71 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from main.offline import HashingEncoder, OverlapReranker, synthetic_queries, synthetic_store
+from main.rerank_service import RerankService
+from main.retrieval import batch_retrieve_indices
+from main.retrieval_server import RetrievalClient, RetrievalServer, _Request
+
+
+@pytest.fixture
+def server(tmp_path):
+    encoder = HashingEncoder(dim=64)
+    synthetic_store(str(tmp_path / "store"), 300, encoder, words_per_chunk=30, n_topics=8)
+    server = RetrievalServer(str(tmp_path / "store"), port=0, embedding_model=encoder,
+                             reranker=RerankService(OverlapReranker()), max_wait_ms=50,
+                             reload_interval=0, preload=False, request_timeout=10).start()
+    yield server
+    server.stop()
+
+
+def _post(server, payload):
+    request = urllib.request.Request(server.url + "/retrieve", data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.mark.parametrize("payload", [
+    {"queries": ["q"], "k": 0},
+    {"queries": ["q"], "m": 0},
+    {"queries": ["q"], "query_prompt": ["not", "a", "string"]},
+    {"queries": "q"},
+])
+def test_bad_requests_are_rejected_and_the_batcher_survives(server, payload):
+    assert _post(server, payload) == 400
+    assert _post(server, {"queries": ["q"], "k": 5, "m": 2}) == 200
+
+
+def test_failing_group_does_not_stop_the_batcher(server):
+    broken = _Request(["q"], 5, 2, ["unhashable"])
+    server._queue.put(broken)
+    with pytest.raises(TypeError):
+        broken.future.result(timeout=10)
+    store, hits = server.retrieve(["q"], k=5, m=2)
+    assert len(hits) == 1
+
+
+def test_concurrent_requests_are_batched(server):
+    queries = synthetic_queries(8, n_topics=8)
+    client = RetrievalClient(server.url)
+    results = [None] * len(queries)
+
+    def ask(i):
+        results[i], _ = client.retrieve([queries[i]], k=5, m=2)
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(queries))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = batch_retrieve_indices(queries, server.store, server.embedding_model, server.reranker, k=5, m=2)
+    assert [[c for c, _ in hits[0]] for hits in results] == [[c for c, _ in hits] for hits in expected]
+    assert server.stats["batches"] < len(queries)
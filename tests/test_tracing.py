@@ -0,0 +1,64 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from main import tracing
+from main.offline import synthetic_queries, synthetic_store
+from main.rag_rq import give_query_answer_rag_multihop
+
+
+def test_spans_nest_and_sum_counters():
+    with tracing.span("pipeline", query="q") as root:
+        tracing.add("llm_calls")
+        with tracing.span("rerank"):
+            tracing.add("pairs_reranked", 10)
+        with tracing.span("rerank"):
+            tracing.add("pairs_reranked", 5)
+        with pytest.raises(KeyError), tracing.span("synthesis"):
+            raise KeyError("boom")
+
+    assert tracing.current_span() is None
+    assert [child.name for child in root.children] == ["rerank", "rerank", "synthesis"]
+    assert root.totals() == {"llm_calls": 1, "pairs_reranked": 15}
+    assert set(root.stages()) == {"rerank", "synthesis"}
+    assert root.children[2].error == "KeyError: 'boom'"
+    assert root.wall_ms >= root.children[0].wall_ms
+    tracing.add("llm_calls")  # no open span: ignored
+
+
+def test_counters_from_worker_threads_land_in_the_current_span():
+    with tracing.span("pipeline") as root:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for _ in range(8):
+                pool.submit(contextvars.copy_context().run, tracing.add, "chunks_scored", 2).result()
+    assert root.counters == {"chunks_scored": 16}
+
+
+def test_jsonl_exporter_writes_one_record_per_span(tmp_path):
+    exporter = tracing.JSONLExporter(str(tmp_path / "trace.jsonl"))
+    tracing.add_exporter(exporter)
+    try:
+        with tracing.span("pipeline") as root:
+            with tracing.span("encode"):
+                tracing.add("chunks_scored", 3)
+    finally:
+        tracing.remove_exporter(exporter)
+
+    records = [json.loads(line) for line in open(tmp_path / "trace.jsonl", encoding="utf-8")]
+    assert [r["name"] for r in records] == ["pipeline", "encode"]
+    assert records[1]["parent_span_id"] == records[0]["span_id"] == root.span_id
+    assert records[1]["attributes"] == {"chunks_scored": 3}
+    assert {r["trace_id"] for r in records} == {root.trace_id}
+
+
+def test_pipeline_returns_a_traced_result(tmp_path, offline):
+    store = str(tmp_path / "store")
+    synthetic_store(store, 200, offline[0], words_per_chunk=30, n_topics=8)
+    result = give_query_answer_rag_multihop(synthetic_queries(1, n_topics=8)[0], store, return_result=True)
+
+    assert result.answer and result.sub_queries and result.context
+    assert result.trace.totals()["llm_calls"] >= 2
+    assert {"encode", "rerank"} <= {span.name for span in result.trace.walk()}
+    json.dumps(result.to_dict())
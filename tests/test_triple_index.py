@@ -0,0 +1,35 @@
+from main.offline import HashingEncoder
+from main.triple_index import TripleIndex, get_triple_index, tokenize
+
+FLAT_KG = {
+    "event.name": "Nepal earthquake",
+    "impact.deaths": "8,964 people died",
+    "impact.injuries": "21,952 injured",
+    "response.countries_aiding": "India, China, USA",
+    "geography.region": "Gorkha district",
+}
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("How many Deaths were there in the districts?") == ["many", "death", "there", "district"]
+
+
+def test_select_ranks_matching_triples_first():
+    index = TripleIndex(FLAT_KG)
+    selected = index.select("How many deaths?", n=2)
+    assert list(selected)[0] == "impact.deaths"
+    assert len(selected) == 2
+    assert list(index.select("Which countries sent aid?", n=1)) == ["response.countries_aiding"]
+    assert len(index.select("deaths", n=50)) == len(FLAT_KG)
+    assert TripleIndex({}).select("deaths") == {}
+
+
+def test_dense_scores_are_blended_and_indexes_are_cached():
+    encoder = HashingEncoder(dim=64)
+    index = TripleIndex(FLAT_KG, embedding_model=encoder)
+    lexical_only = index.scores("deaths", alpha=1.0)
+    assert lexical_only.max() == 1.0
+    assert (index.scores("deaths", alpha=0.5) != lexical_only).any()
+
+    assert get_triple_index(FLAT_KG) is get_triple_index(dict(FLAT_KG))
+    assert get_triple_index(FLAT_KG, encoder) is not get_triple_index(FLAT_KG)